@@ -0,0 +1,12 @@
+import os
+
+
+def use_database(path: str):
+    """
+    Направляет config на базу бенчмарка.
+    Вызывать до импорта config/database: пути читаются при импорте.
+    """
+    os.environ["DB_NAME"] = path
+    os.environ.setdefault("ADMIN_IDS", "0")
+    # Медленные запросы в бенчмарке не логируем — их видно в отчёте
+    os.environ.setdefault("SLOW_QUERY_MS", "0")
@@ -0,0 +1,203 @@
+"""
+Микробенчмарки горячих функций работы с базой.
+
+    python -m benchmarks.db_bench --scale 100k
+    python -m benchmarks.db_bench --db bench_100k.db --ops 5000 --concurrency 16 --compare benchmarks/results/prev.json
+
+База генерируется при первом запуске (benchmarks.synthetic). Пишущие сценарии
+(save_work, purchase_work) меняют базу: для честного сравнения запусков
+пересоздавайте её флагом --fresh.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import time
+
+from benchmarks import use_database
+from benchmarks.synthetic import WORDS, add_scale_arguments, generate, parse_scale
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def run_case(fn, ops: int, concurrency: int, warmup: int) -> dict:
+    """Выполняет fn() ops раз в concurrency параллельных задачах и собирает задержки."""
+    for _ in range(warmup):
+        await fn()
+
+    latencies: list[float] = []
+    remaining = ops
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await fn()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "ops": len(latencies),
+        "ops_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def build_cases(rng: random.Random, scale: dict) -> dict:
+    """Сценарии: имя -> корутина без аргументов со случайными параметрами."""
+    from database import queries
+    from services import work_service
+
+    works, users = scale["works"], scale["users"]
+    authors = max(users // 10, 1)
+    with sqlite3.connect(os.environ["DB_NAME"]) as conn:
+        category_ids = [row[0] for row in conn.execute("SELECT id FROM categories")]
+        max_work_id = conn.execute("SELECT MAX(id) FROM works").fetchone()[0] or works
+
+    async def get_works_page():
+        category_id = rng.choice(category_ids)
+        # Половина запросов — первая страница, половина — переход вглубь по курсору
+        after_id = rng.randint(1, max_work_id) if rng.random() < 0.5 else None
+        await work_service.get_works_page(category_id, 4, after_id=after_id)
+
+    async def get_work_info():
+        await work_service.get_work_info(rng.randint(1, max_work_id))
+
+    async def get_author_stats():
+        await work_service.get_author_stats(rng.randint(1, authors))
+
+    async def get_user_purchases():
+        await work_service.get_user_purchases(rng.randint(1, users))
+
+    async def search_works():
+        await work_service.search_works(" ".join(rng.sample(WORDS, 2)), 21)
+
+    async def save_work():
+        await work_service.save_work(rng.randint(1, authors), {
+            "title": "Бенчмарк: " + " ".join(rng.sample(WORDS, 3)),
+            "description": " ".join(rng.choices(WORDS, k=20)),
+            "price": 500.0,
+            "category_id": rng.choice(category_ids),
+            "files": [(f"bench_file_{rng.getrandbits(32)}", "bench.docx")],
+        })
+
+    async def purchase_work():
+        buyer_id = rng.randint(1, users)
+        await queries.update_balance(buyer_id, 5000)
+        await queries.purchase_work(buyer_id, rng.randint(1, works))
+
+    async def get_category_stats():
+        await work_service.get_category_stats()
+
+    return {
+        "get_works_page": get_works_page,
+        "get_work_info": get_work_info,
+        "get_author_stats": get_author_stats,
+        "get_user_purchases": get_user_purchases,
+        "search_works": search_works,
+        "save_work": save_work,
+        "purchase_work": purchase_work,
+        "get_category_stats": get_category_stats,
+    }
+
+
+async def run(args, scale: dict) -> dict:
+    from database.pool import init_pool, close_pool, pool
+    from database.write_queue import start_write_queue, stop_write_queue
+
+    await init_pool()
+    start_write_queue()
+    try:
+        cases = build_cases(random.Random(args.seed), scale)
+        selected = args.only or list(cases)
+        results = {}
+        for name in selected:
+            ops = max(args.ops // 10, 1) if name == "get_category_stats" else args.ops
+            results[name] = await run_case(cases[name], ops, args.concurrency, args.warmup)
+            r = results[name]
+            print(f"{name:<20}{r['ops_per_sec']:>10.1f} ops/s  p50 {r['p50_ms']:>8.3f}  p95 {r['p95_ms']:>8.3f}  "
+                  f"p99 {r['p99_ms']:>8.3f}  max {r['max_ms']:>8.3f} мс")
+        results["_pool"] = pool.stats()
+        return results
+    finally:
+        await stop_write_queue()
+        await close_pool()
+
+
+def compare(current: dict, previous_path: str):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)["results"]
+    print(f"\nСравнение с {previous_path}:")
+    for name, r in current.items():
+        old = previous.get(name)
+        if name.startswith("_") or not old:
+            continue
+        speed = (r["ops_per_sec"] / old["ops_per_sec"] - 1) * 100 if old["ops_per_sec"] else 0.0
+        p95 = (r["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+        print(f"{name:<20} ops/s {speed:+7.1f}%   p95 {p95:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки базы данных")
+    parser.add_argument("--db", default=None, help="путь к базе (по умолчанию bench_<scale>.db)")
+    parser.add_argument("--fresh", action="store_true", help="пересоздать базу перед запуском")
+    parser.add_argument("--ops", type=int, default=2000, help="операций на сценарий")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--only", nargs="*", help="запустить только указанные сценарии")
+    parser.add_argument("--out", default=None, help="файл JSON с результатами")
+    parser.add_argument("--compare", default=None, help="JSON предыдущего запуска")
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+
+    scale = parse_scale(args)
+    path = args.db or f"bench_{args.scale}.db"
+    if args.fresh:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    if not os.path.exists(path):
+        generate(path, seed=args.seed, **scale)
+    use_database(path)
+
+    results = asyncio.run(run(args, scale))
+
+    report = {
+        "meta": {
+            "db": path,
+            "scale": scale,
+            "ops": args.ops,
+            "concurrency": args.concurrency,
+            "sqlite": sqlite3.sqlite_version,
+            "python": platform.python_version(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join("benchmarks", "results", f"db_{args.scale}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Результаты: {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов.
+
+Сервер принимает те же запросы, что и api.telegram.org (/bot<token>/<method>),
+хранит «переписку» по чатам и отдаёт апдейты через getUpdates.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, defaultdict
+
+from aiohttp import web
+
+BOT_USER = {"id": 100000, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+# Каналы, указанные как @username, получают этот id в ответах
+CHANNEL_CHAT_ID = -1001000000000
+
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.updates: asyncio.Queue[dict] = asyncio.Queue()
+        self.calls: Counter[str] = Counter()
+        # chat_id -> message_id -> сообщение бота (для поиска кнопок)
+        self.chats: dict[int | str, dict[int, dict]] = defaultdict(dict)
+        # Пользователи, «заблокировавшие бота»: отправка им отвечает 403
+        self.blocked: set[int] = set()
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._runner: web.AppRunner | None = None
+
+        self.app = web.Application(client_max_size=64 * 2**20)
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+        self.methods = {
+            "getMe": self.get_me,
+            "getUpdates": self.get_updates,
+            "getChatMember": self.get_chat_member,
+            "sendMessage": self.send_message,
+            "sendPhoto": self.send_photo,
+            "sendDocument": self.send_document,
+            "sendMediaGroup": self.send_media_group,
+            "editMessageCaption": self.edit_message,
+            "editMessageText": self.edit_message,
+            "editMessageReplyMarkup": self.edit_message,
+            "editMessageMedia": self.edit_message,
+            "deleteMessage": self.delete_message,
+            "deleteMessages": self.delete_messages,
+            "copyMessage": self.copy_message,
+        }
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # ===== HTTP =====
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = {key: value for key, value in (await request.post()).items() if isinstance(value, str)}
+        if self.latency and method != "getUpdates":
+            await asyncio.sleep(self.latency)
+        if method.startswith("send") and self.chat_id(params.get("chat_id", "")) in self.blocked:
+            return web.json_response(
+                {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}, status=403
+            )
+        handler = self.methods.get(method)
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    # ===== Методы Bot API =====
+    async def get_me(self, params: dict):
+        return BOT_USER
+
+    async def get_updates(self, params: dict):
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        batch = []
+        try:
+            batch.append(await asyncio.wait_for(self.updates.get(), timeout) if timeout else self.updates.get_nowait())
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return []
+        while len(batch) < limit and not self.updates.empty():
+            batch.append(self.updates.get_nowait())
+        return batch
+
+    async def get_chat_member(self, params: dict):
+        user_id = int(params["user_id"])
+        return {"status": "member", "user": self.user(user_id)}
+
+    async def send_photo(self, params: dict):
+        return await self.send_message(params, photo=[self.photo_size()])
+
+    async def send_document(self, params: dict):
+        return await self.send_message(params, document={"file_id": self.file_id(), "file_unique_id": self.file_id(), "file_name": "file"})
+
+    async def send_message(self, params: dict, **media):
+        chat_id = self.chat_id(params["chat_id"])
+        message = self.bot_message(chat_id)
+        message.update(media)
+        for key in ("text", "caption"):
+            if key in params:
+                message[key] = params[key]
+        if "reply_markup" in params:
+            message["reply_markup"] = json.loads(params["reply_markup"])
+        self.chats[chat_id][message["message_id"]] = message
+        return message
+
+    async def send_media_group(self, params: dict):
+        chat_id = self.chat_id(params["chat_id"])
+        messages = []
+        for item in json.loads(params["media"]):
+            message = self.bot_message(chat_id)
+            message["photo"] = [self.photo_size()]
+            if item.get("caption"):
+                message["caption"] = item["caption"]
+            self.chats[chat_id][message["message_id"]] = message
+            messages.append(message)
+        return messages
+
+    async def edit_message(self, params: dict):
+        if "chat_id" not in params:
+            return True
+        chat_id, message_id = self.chat_id(params["chat_id"]), int(params["message_id"])
+        message = self.chats[chat_id].get(message_id) or self.bot_message(chat_id, message_id)
+        for key in ("text", "caption"):
+            if key in params:
+                message[key] = params[key]
+        if "reply_markup" in params:
+            message["reply_markup"] = json.loads(params["reply_markup"])
+        if "media" in params:
+            media = json.loads(params["media"])
+            if "caption" in media:
+                message["caption"] = media["caption"]
+            if media.get("type") == "photo":
+                message["photo"] = [self.photo_size()]
+        self.chats[chat_id][message_id] = message
+        return message
+
+    async def delete_message(self, params: dict):
+        self.chats[self.chat_id(params["chat_id"])].pop(int(params["message_id"]), None)
+        return True
+
+    async def delete_messages(self, params: dict):
+        chat = self.chats[self.chat_id(params["chat_id"])]
+        for message_id in json.loads(params["message_ids"]):
+            chat.pop(int(message_id), None)
+        return True
+
+    async def copy_message(self, params: dict):
+        return {"message_id": next(self._message_ids)}
+
+    # ===== Объекты =====
+    @staticmethod
+    def chat_id(value: str) -> int | str:
+        # Каналы приходят как @username
+        return int(value) if value.lstrip("-").isdigit() else value
+
+    def user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+
+    def file_id(self, prefix: str = "BQAC") -> str:
+        # Префиксы как у настоящих file_id: по ним хендлеры отличают их от локальных путей
+        return f"{prefix}fake_{next(self._file_ids)}"
+
+    def photo_size(self) -> dict:
+        return {"file_id": self.file_id("AgAC"), "file_unique_id": self.file_id(), "width": 640, "height": 480}
+
+    def bot_message(self, chat_id: int | str, message_id: int | None = None) -> dict:
+        if isinstance(chat_id, str):
+            chat = {"id": CHANNEL_CHAT_ID, "type": "channel", "username": chat_id.lstrip("@")}
+        else:
+            chat = {"id": chat_id, "type": "private"}
+        return {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": chat,
+            "from": BOT_USER,
+        }
+
+    # ===== Апдейты от «пользователей» =====
+    def message_update(self, user_id: int, text: str | None = None, photo: bool = False, document: bool = False) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self.user(user_id),
+        }
+        if text is not None:
+            message["text"] = text
+        if photo:
+            message["photo"] = [self.photo_size()]
+        if document:
+            message["document"] = {"file_id": self.file_id(), "file_unique_id": self.file_id(), "file_name": "work.docx"}
+        return {"update_id": next(self._update_ids), "message": message}
+
+    def callback_update(self, user_id: int, data: str, message: dict) -> dict:
+        update_id = next(self._update_ids)
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": f"cb{update_id}",
+                "from": self.user(user_id),
+                "chat_instance": str(user_id),
+                "message": message,
+                "data": data,
+            },
+        }
+
+    def find_buttons(self, chat_id: int, prefix: str) -> list[tuple[str, dict]]:
+        """Кнопки с callback_data, начинающимся с prefix, из последнего сообщения, где они есть."""
+        for message in sorted(self.chats[chat_id].values(), key=lambda m: m["message_id"], reverse=True):
+            markup = message.get("reply_markup") or {}
+            buttons = [
+                (button["callback_data"], message)
+                for row in markup.get("inline_keyboard", [])
+                for button in row
+                if button.get("callback_data", "").startswith(prefix)
+            ]
+            if buttons:
+                return buttons
+        return []
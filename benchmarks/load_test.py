@@ -0,0 +1,419 @@
+"""
+Сквозной нагрузочный тест бота без Telegram.
+
+    python -m benchmarks.load_test --sessions 2000 --concurrency 200 --scale 10k
+
+Поднимает локальный FakeBotAPI, направляет на него Bot и гоняет через
+настоящий Dispatcher из bot.py сценарии пользователей: просмотр каталога,
+листание, покупка, размещение работы, модерация админом.
+Запускать из корня репозитория: хендлеры отправляют файлы из image/.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+from collections import Counter, defaultdict
+
+import aiohttp
+
+from benchmarks import use_database
+from benchmarks.db_bench import percentile
+from benchmarks.fake_api import FakeBotAPI
+from benchmarks.synthetic import add_scale_arguments, generate, parse_scale
+# Не зависит от config, поэтому импортируется до настройки окружения
+from utils.webhook import SECRET_HEADER, WebhookServer
+
+# Шаг сценария, которому принадлежит текущий апдейт (для подсчёта вызовов API)
+current_step: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_step", default=None)
+
+
+def latency_summary(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+class LoadStats:
+    def __init__(self):
+        self.update_latency: list[float] = []
+        # От отправки апдейта (getUpdates или POST вебхука) до конца обработки
+        self.delivery_latency: list[float] = []
+        self.handler_latency: dict[str, list[float]] = defaultdict(list)
+        self.step_runs: Counter[str] = Counter()
+        self.step_calls: dict[str, Counter[str]] = defaultdict(Counter)
+        self.missing_buttons: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+
+    def report(self, elapsed: float, api_calls: Counter) -> dict:
+        return {
+            "updates": len(self.update_latency),
+            "updates_per_sec": round(len(self.update_latency) / elapsed, 1) if elapsed else 0.0,
+            "update_latency": latency_summary(self.update_latency),
+            "delivery_latency": latency_summary(self.delivery_latency),
+            "handlers": {
+                name: latency_summary(samples)
+                for name, samples in sorted(self.handler_latency.items(), key=lambda item: -len(item[1]))
+            },
+            "api_calls_per_step": {
+                step: {
+                    "runs": runs,
+                    "calls": round(sum(self.step_calls[step].values()) / runs, 2),
+                    "by_method": {m: round(n / runs, 2) for m, n in self.step_calls[step].most_common()},
+                }
+                for step, runs in self.step_runs.most_common()
+            },
+            "api_calls": dict(api_calls.most_common()),
+            "missing_buttons": dict(self.missing_buttons),
+            "errors": dict(self.errors),
+        }
+
+
+# ===== Middleware замеров =====
+class UpdateTimingMiddleware:
+    """Внешний middleware апдейтов: время обработки, шаг сценария, сигнал о завершении."""
+
+    def __init__(self, harness: "LoadHarness"):
+        self.harness = harness
+
+    async def __call__(self, handler, event, data):
+        step = self.harness.steps.pop(event.update_id, None)
+        token = current_step.set(step)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            self.harness.stats.errors[f"{type(e).__name__}: {e}"[:120]] += 1
+            raise
+        finally:
+            self.harness.stats.update_latency.append(time.perf_counter() - started)
+            current_step.reset(token)
+            waiter = self.harness.waiters.pop(event.update_id, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+
+class HandlerTimingMiddleware:
+    """Внутренний middleware: время конкретного хендлера."""
+
+    def __init__(self, stats: LoadStats):
+        self.stats = stats
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            name = data["handler"].callback.__name__
+            self.stats.handler_latency[name].append(time.perf_counter() - started)
+
+
+class ApiCallCounter:
+    """Middleware сессии Bot: считает вызовы API в разрезе шага сценария."""
+
+    def __init__(self, stats: LoadStats):
+        self.stats = stats
+
+    async def __call__(self, make_request, bot, method):
+        step = current_step.get()
+        if step is not None:
+            self.stats.step_calls[step][method.__api_method__] += 1
+        return await make_request(bot, method)
+
+
+# ===== Харнесс =====
+class LoadHarness:
+    def __init__(self, api: FakeBotAPI, timeout: float):
+        self.api = api
+        self.timeout = timeout
+        self.stats = LoadStats()
+        self.steps: dict[int, str] = {}
+        self.waiters: dict[int, asyncio.Future] = {}
+        self.webhook_url: str | None = None
+        self.webhook_secret: str | None = None
+        self.http: aiohttp.ClientSession | None = None
+
+    def use_webhook(self, url: str, secret: str):
+        self.webhook_url = url
+        self.webhook_secret = secret
+        self.http = aiohttp.ClientSession()
+
+    async def close(self):
+        if self.http is not None:
+            await self.http.close()
+
+    async def feed(self, step: str, update: dict):
+        """Отдаёт апдейт боту (через getUpdates или POST на вебхук) и ждёт конца обработки."""
+        update_id = update["update_id"]
+        waiter = asyncio.get_running_loop().create_future()
+        self.steps[update_id] = step
+        self.waiters[update_id] = waiter
+        self.stats.step_runs[step] += 1
+        started = time.perf_counter()
+        if self.webhook_url:
+            async with self.http.post(self.webhook_url, json=update, headers={SECRET_HEADER: self.webhook_secret}) as response:
+                if response.status != 200:
+                    self.waiters.pop(update_id, None)
+                    self.stats.errors[f"webhook {response.status}: {step}"] += 1
+                    return
+        else:
+            await self.api.updates.put(update)
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+            self.stats.delivery_latency.append(time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            self.waiters.pop(update_id, None)
+            self.stats.errors[f"timeout: {step}"] += 1
+
+
+class UserSession:
+    """Один симулированный пользователь: пишет сообщения и нажимает кнопки из ответов бота."""
+
+    def __init__(self, harness: LoadHarness, user_id: int, rng: random.Random, think: float):
+        self.harness = harness
+        self.api = harness.api
+        self.user_id = user_id
+        self.rng = rng
+        self.think = think
+
+    async def pause(self):
+        if self.think:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.think))
+
+    async def send(self, step: str, text: str | None = None, photo: bool = False, document: bool = False):
+        await self.pause()
+        await self.harness.feed(step, self.api.message_update(self.user_id, text, photo, document))
+
+    async def click(self, step: str, prefix: str, contains: str | None = None) -> bool:
+        buttons = self.api.find_buttons(self.user_id, prefix)
+        if contains is not None:
+            buttons = [b for b in buttons if contains in b[0]]
+        if not buttons:
+            self.harness.stats.missing_buttons[step] += 1
+            return False
+        data, message = self.rng.choice(buttons)
+        await self.pause()
+        await self.harness.feed(step, self.api.callback_update(self.user_id, data, message))
+        return True
+
+
+# ===== Сценарии =====
+async def scenario_browse(s: UserSession):
+    await s.send("start", "/start")
+    if not await s.click("catalog", "catalog"):
+        return
+    # Корневая категория -> подкатегория (если есть) -> следующая страница
+    if not await s.click("category", "category_", "_root"):
+        return
+    if s.api.find_buttons(s.user_id, "category_") and not s.api.find_buttons(s.user_id, "buy_work_"):
+        await s.click("subcategory", "category_")
+    if s.rng.random() < 0.5:
+        await s.click("next_page", "category_", "_a")
+
+
+async def scenario_buy(s: UserSession):
+    await scenario_browse(s)
+    await s.click("buy", "buy_work_")
+
+
+async def scenario_search(s: UserSession):
+    from benchmarks.synthetic import WORDS
+    await s.send("search", "/search " + s.rng.choice(WORDS))
+    if s.rng.random() < 0.5:
+        await s.click("search_page", "search_")
+
+
+async def scenario_submit(s: UserSession):
+    await s.send("start", "/start")
+    if not await s.click("add_work", "add_work"):
+        return
+    if not await s.click("select_category", "select_cat_"):
+        return
+    await s.send("work_title", "Нагрузочный тест: курсовая")
+    await s.send("work_description", "Описание работы для нагрузочного теста")
+    await s.send("work_price", "500")
+    await s.send("work_preview", photo=True)
+    await s.send("work_files", document=True)
+
+
+async def scenario_admin_review(s: UserSession):
+    await s.send("start", "/start")
+    if not await s.click("admin_panel", "admin_panel"):
+        return
+    if not await s.click("admin_pending", "admin_pending_works"):
+        return
+    if not await s.click("review", "review_"):
+        return
+    action = s.rng.choice(("approve", "reject"))
+    await s.click(action, f"{action}_")
+
+
+SCENARIOS = {
+    "browse": (scenario_browse, 45),
+    "buy": (scenario_buy, 20),
+    "search": (scenario_search, 15),
+    "submit": (scenario_submit, 15),
+}
+
+
+# ===== Запуск =====
+async def run(args, scale: dict) -> dict:
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from bot import create_bot, create_dispatcher, on_startup, on_shutdown
+    from database.pool import pool
+    from utils.send_scheduler import send_scheduler
+
+    api = FakeBotAPI(latency=args.api_latency / 1000)
+    base_url = await api.start()
+    harness = LoadHarness(api, timeout=args.timeout)
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(base_url))
+    session.middleware(ApiCallCounter(harness.stats))
+    bot = create_bot(session)
+
+    dp = create_dispatcher()
+    dp.update.outer_middleware(UpdateTimingMiddleware(harness))
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(HandlerTimingMiddleware(harness.stats))
+
+    await on_startup()
+    if args.webhook:
+        server = WebhookServer(bot, dp, "/webhook", "bench-secret", args.workers, queue_size=10_000)
+        port = await server.start("127.0.0.1", 0)
+        harness.use_webhook(f"http://127.0.0.1:{port}/webhook", "bench-secret")
+    else:
+        polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False, polling_timeout=1))
+
+    rng = random.Random(args.seed)
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name][1] for name in names]
+    admins = list(range(1, args.admins + 1))
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def simulate(index: int):
+        async with semaphore:
+            user_rng = random.Random(rng.random())
+            if index < args.admins:
+                user_id, scenario = admins[index], scenario_admin_review
+            else:
+                user_id = args.admins + 1 + index % (scale["users"] - args.admins)
+                scenario = SCENARIOS[user_rng.choices(names, weights)[0]][0]
+            try:
+                await scenario(UserSession(harness, user_id, user_rng, args.think / 1000))
+            except Exception as e:
+                harness.stats.errors[f"{type(e).__name__}: {e}"[:120]] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(simulate(i) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+
+    if args.webhook:
+        await harness.close()
+        await server.stop()
+    else:
+        await dp.stop_polling()
+        await polling
+    queries = [
+        dict(zip(("name", "calls", "rows", "p50_ms", "p95_ms", "p99_ms", "max_ms", "wait_ms"), row))
+        for row in pool.query_stats.table(limit=50)
+    ]
+    sends = send_scheduler.stats()
+    await on_shutdown(bot, dp)
+    await api.stop()
+    return {"elapsed_sec": round(elapsed, 2), **harness.stats.report(elapsed, api.calls), "queries": queries,
+            "send_scheduler": sends}
+
+
+def print_report(report: dict):
+    print(f"\n⏱ {report['elapsed_sec']} с, апдейтов: {report['updates']}, {report['updates_per_sec']} апдейтов/с")
+    u = report["update_latency"]
+    print(f"   апдейт: p50 {u['p50_ms']} мс, p95 {u['p95_ms']} мс, p99 {u['p99_ms']} мс, max {u['max_ms']} мс")
+    d = report["delivery_latency"]
+    print(f"   с доставкой: p50 {d['p50_ms']} мс, p95 {d['p95_ms']} мс, p99 {d['p99_ms']} мс, max {d['max_ms']} мс")
+    print("\nХендлеры:")
+    for name, h in report["handlers"].items():
+        print(f"  {name:<28}{h['count']:>7}  p50 {h['p50_ms']:>8.2f}  p95 {h['p95_ms']:>8.2f}  p99 {h['p99_ms']:>8.2f} мс")
+    print("\nВызовы API на действие:")
+    for step, s in report["api_calls_per_step"].items():
+        methods = ", ".join(f"{m}={n}" for m, n in s["by_method"].items())
+        print(f"  {step:<20}{s['runs']:>7}  {s['calls']:>6.2f}  ({methods})")
+    print("\nSQL (по суммарному времени):")
+    for q in report["queries"][:10]:
+        print(f"  {q['name']:<28}{q['calls']:>7}  p50 {q['p50_ms']:>8.2f}  p95 {q['p95_ms']:>8.2f}  ожидание {q['wait_ms']:>9.1f} мс")
+    print("\nОчереди отправки:")
+    for name, lane in report["send_scheduler"]["lanes"].items():
+        print(f"  {name:<14}отправлено {lane['sent']:>7}  макс. глубина {lane['max_depth']:>5}  ожидание ~{lane['avg_wait_ms']:>8.2f} мс")
+    if report["missing_buttons"]:
+        print(f"\n⚠️ Не найдены кнопки: {report['missing_buttons']}")
+    if report["errors"]:
+        print(f"\n❌ Ошибки: {report['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на локальном Bot API")
+    parser.add_argument("--db", default=None, help="путь к базе (по умолчанию bench_<scale>.db)")
+    parser.add_argument("--sessions", type=int, default=1000, help="число пользовательских сессий")
+    parser.add_argument("--concurrency", type=int, default=100, help="одновременно активных сессий")
+    parser.add_argument("--admins", type=int, default=2, help="сколько сессий модерируют работы")
+    parser.add_argument("--think", type=float, default=0, help="средняя пауза между действиями, мс")
+    parser.add_argument("--api-latency", type=float, default=0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--timeout", type=float, default=30, help="таймаут обработки одного апдейта, с")
+    parser.add_argument("--webhook", action="store_true", help="доставлять апдейты через вебхук вместо getUpdates")
+    parser.add_argument("--workers", type=int, default=32, help="воркеров вебхука")
+    parser.add_argument("--telegram-limits", action="store_true",
+                        help="соблюдать лимиты отправки Telegram (по умолчанию сняты: локальный API их не вводит)")
+    parser.add_argument("--out", default=None, help="файл JSON с результатами")
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+
+    scale = parse_scale(args)
+    path = args.db or f"bench_{args.scale}.db"
+    # Окружение задаётся до первого импорта config (генератор тоже его импортирует).
+    # Первые пользователи синтетической базы — админы
+    os.environ["ADMIN_IDS"] = ",".join(str(i) for i in range(1, args.admins + 1)) or "0"
+    os.environ.setdefault("API_TOKEN", "123456:bench")
+    os.environ.setdefault("CHANNEL_ID", "@bench_channel")
+    os.environ.setdefault("BOT_USERNAME", "bench_bot")
+    if not args.telegram_limits:
+        for name in ("SEND_GLOBAL_RATE", "SEND_CHAT_RATE", "SEND_GROUP_RATE"):
+            os.environ.setdefault(name, "0")
+    if not os.path.exists(path):
+        generate(path, seed=args.seed, **scale)
+    use_database(path)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+    report = asyncio.run(run(args, scale))
+    report["meta"] = {
+        "db": path,
+        "scale": scale,
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "api_latency_ms": args.api_latency,
+        "think_ms": args.think,
+        "mode": f"webhook x{args.workers}" if args.webhook else "polling",
+        "sqlite": sqlite3.sqlite_version,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    print_report(report)
+
+    out = args.out or os.path.join("benchmarks", "results", f"load_{args.scale}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Результаты: {out}")
+
+
+if __name__ == "__main__":
+    main()
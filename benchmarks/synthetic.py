@@ -0,0 +1,173 @@
+"""
+Генератор синтетической базы academic_works.db заданного масштаба.
+
+    python -m benchmarks.synthetic --scale 100k --db bench_100k.db
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import time
+import uuid
+
+from benchmarks import use_database
+
+# ===== Масштабы =====
+# works, users, purchases, корневых категорий, подкатегорий в каждой
+SCALES = {
+    "10k": dict(works=10_000, users=5_000, purchases=20_000, categories=10, subcategories=5),
+    "100k": dict(works=100_000, users=50_000, purchases=200_000, categories=20, subcategories=8),
+    "1m": dict(works=1_000_000, users=500_000, purchases=2_000_000, categories=40, subcategories=10),
+}
+
+WORDS = (
+    "анализ история экономика право менеджмент маркетинг психология педагогика физика химия "
+    "биология математика информатика программирование философия социология логистика финансы "
+    "бухгалтерский учёт статистика лингвистика литература медицина экология строительство "
+    "архитектура энергетика транспорт туризм дизайн журналистика политология культурология "
+    "исследование разработка методика проектирование моделирование оценка управление развитие"
+).split()
+WORK_KINDS = ("Курсовая", "Дипломная", "Реферат", "Отчёт по практике", "Контрольная", "Эссе")
+STATUSES = ("approved",) * 8 + ("pending", "rejected")
+
+
+def _phrase(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+async def create_schema(path: str):
+    """Схема создаётся штатными миграциями, чтобы бенчмарк мерил ту же базу, что и бот."""
+    use_database(path)
+    from database.pool import init_pool, close_pool
+    from database.migrations import run_migrations
+    await init_pool()
+    try:
+        await run_migrations()
+    finally:
+        await close_pool()
+
+
+def fill(path: str, works: int, users: int, purchases: int, categories: int, subcategories: int,
+         seed: int = 42, batch: int = 50_000):
+    """Заполняет пустую базу. Работы получают id 1..works, пользователи — 1..users."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    def insert_many(sql: str, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= batch:
+                conn.executemany(sql, chunk)
+                chunk.clear()
+        if chunk:
+            conn.executemany(sql, chunk)
+
+    with conn:
+        # Категории: корневые, затем подкатегории каждой
+        tree = {}
+        for root in range(categories):
+            cursor = conn.execute("INSERT INTO categories(name, parent_id) VALUES (?, NULL)", (f"Категория {root + 1}",))
+            root_id = cursor.lastrowid
+            tree[root_id] = [
+                conn.execute("INSERT INTO categories(name, parent_id) VALUES (?, ?)", (f"Подкатегория {root + 1}.{sub + 1}", root_id)).lastrowid
+                for sub in range(subcategories)
+            ]
+        roots = list(tree)
+
+        insert_many(
+            "INSERT INTO users(id, username, balance, is_subscribed) VALUES (?, ?, ?, 1)",
+            ((uid, f"user{uid}", round(rng.uniform(0, 5000), 2)) for uid in range(1, users + 1))
+        )
+
+        # Покупки генерируются заранее, чтобы times_sold у работ сходился с purchases
+        bought = [(rng.randint(1, works), rng.randint(1, users)) for _ in range(purchases)]
+        sold = [0] * (works + 1)
+        for work_id, _ in bought:
+            sold[work_id] += 1
+
+        authors = max(users // 10, 1)
+        prices = [0.0] * (works + 1)
+
+        def work_rows():
+            for work_id in range(1, works + 1):
+                root_id = rng.choice(roots)
+                price = float(rng.randrange(100, 3000, 50))
+                prices[work_id] = price
+                income = round(price * 0.8, 2)
+                yield (
+                    work_id,
+                    f"{rng.choice(WORK_KINDS)}: {_phrase(rng, 4)}",
+                    _phrase(rng, rng.randint(15, 40)),
+                    price, income, root_id, rng.choice(tree[root_id]) if tree[root_id] else None,
+                    rng.randint(1, authors), f"AgACbench_{work_id}", sold[work_id], income * sold[work_id],
+                    rng.choice(STATUSES), int(rng.random() < 0.02),
+                )
+
+        insert_many("""
+            INSERT INTO works(id, title, description, price, author_income, category_id, subcategory_id,
+                              author_id, preview_image_id, times_sold, total_earnings, status, is_deleted)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, work_rows())
+
+        insert_many(
+            "INSERT INTO files(work_id, file_id, file_name) VALUES (?, ?, ?)",
+            ((work_id, f"BQACbench_{work_id}_{n}", f"work_{work_id}_{n}.docx")
+             for work_id in range(1, works + 1) for n in range(rng.randint(1, 2)))
+        )
+        insert_many(
+            "INSERT INTO purchases(id, work_id, buyer_id, amount, status) VALUES (?, ?, ?, ?, 'completed')",
+            ((str(uuid.UUID(int=rng.getrandbits(128))), work_id, buyer_id, prices[work_id]) for work_id, buyer_id in bought)
+        )
+        insert_many(
+            "INSERT INTO payouts(user_id, amount, status) VALUES (?, ?, ?)",
+            ((rng.randint(1, authors), float(rng.randrange(500, 5000, 100)), rng.choice(("pending", "paid", "paid")))
+             for _ in range(max(authors // 5, 1)))
+        )
+
+        # Триггер считает только число работ, продажи — как в миграции 3
+        conn.execute("""
+            INSERT OR REPLACE INTO author_stats(author_id, works_count, sales_count, earnings)
+            SELECT author_id, SUM(COALESCE(is_deleted, 0) = 0), SUM(times_sold), SUM(COALESCE(author_income, 0) * times_sold)
+            FROM works WHERE author_id IS NOT NULL GROUP BY author_id
+        """)
+
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+
+def generate(path: str, seed: int = 42, **scale):
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} уже существует")
+    started = time.perf_counter()
+    asyncio.run(create_schema(path))
+    fill(path, seed=seed, **scale)
+    print(f"🗄 {path}: {scale} за {time.perf_counter() - started:.1f} с, {os.path.getsize(path) / 2**20:.1f} МБ")
+
+
+def parse_scale(args) -> dict:
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        value = getattr(args, key, None)
+        if value is not None:
+            scale[key] = value
+    return scale
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--seed", type=int, default=42)
+    for key in SCALES["10k"]:
+        parser.add_argument(f"--{key}", type=int, help="переопределяет значение масштаба")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Синтетическая база для бенчмарков")
+    parser.add_argument("--db", default=None, help="путь к базе (по умолчанию bench_<scale>.db)")
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    generate(args.db or f"bench_{args.scale}.db", seed=args.seed, **parse_scale(args))
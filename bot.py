@@ -1,35 +1,92 @@
 import os
 import asyncio
+import signal
 import logging
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from config import API_TOKEN
+from config import (
+    API_TOKEN,
+    FSM_STORAGE,
+    FSM_FLUSH_INTERVAL,
+    BOT_MODE,
+    BOT_PROCESSES,
+    DB_PATH,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_WORKERS,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_MAX_CONNECTIONS,
+)
 from database.db import init_db
-from handlers import combined_handlers, admin_handlers, ai_handlers, payment_handlers
-from utils.middleware import SubscriptionMiddleware
+from database.fsm_storage import SQLiteStorage
+from database.pool import init_pool, close_pool, pool
+from database.write_queue import start_write_queue, stop_write_queue, write_queue
+from services.category_tree import load_category_tree
+from services.assets import load_assets, AssetMiddleware, asset_registry
+from services.broadcast import resume_broadcasts, stop_broadcasts
+from handlers import combined_handlers, admin_handlers, ai_handlers, payment_handlers, inline_handlers
+from utils.delete_queue import start_delete_queue, stop_delete_queue, delete_queue
+from utils.send_scheduler import send_scheduler, stop_send_scheduler
+from utils.middleware import SubscriptionMiddleware, FSMBufferMiddleware, user_serial
+from utils.subscription import subscription_cache
+from utils.webhook import WebhookServer
+from utils.supervisor import run_supervisor
+from utils.instance_lock import lock_instance
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # ===== Startup / Shutdown =====
 async def on_startup():
+    await init_pool()
     await init_db()
+    start_write_queue()
+    start_delete_queue()
+    await load_category_tree()
+    await load_assets()
     logger.info("✅ Бот запущен!")
 
-async def on_shutdown(bot: Bot):
+async def on_shutdown(bot: Bot, dp: Dispatcher | None = None):
+    # Рассылки дописывают текущую порцию и продолжатся после перезапуска
+    await stop_broadcasts()
+    # Отложенные удаления идут через сессию бота — дожидаемся их до закрытия
+    await stop_delete_queue()
+    logger.info(f"📊 Очередь удаления: {delete_queue.metrics}")
+    logger.info(f"📊 Картинки: {asset_registry.metrics}")
+    logger.info(f"📊 Подписки: {subscription_cache.metrics}")
+    logger.info(f"📊 Очередь пользователей: {user_serial.metrics}")
+    await stop_send_scheduler()
+    logger.info(f"📊 Очередь отправки: {send_scheduler.stats()}")
     await bot.session.close()
+    if dp is not None:
+        # Сбрасываем отложенные состояния FSM, пока пул ещё открыт
+        await dp.storage.close()
+        if isinstance(dp.storage, SQLiteStorage):
+            logger.info(f"📊 FSM: {dp.storage.metrics}")
+    await stop_write_queue()
+    logger.info(f"📊 Пул соединений: {pool.stats()}")
+    logger.info(f"📊 Очередь записи: {write_queue.metrics}")
+    await close_pool()
     logger.info("🛑 Бот остановлен.")
 
-# ===== Main =====
-async def main():
-    bot = Bot(
-        token=API_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
-    dp = Dispatcher(storage=MemoryStorage())
+# ===== Диспетчер =====
+def create_storage():
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return SQLiteStorage(flush_interval=FSM_FLUSH_INTERVAL)
+
+def create_dispatcher() -> Dispatcher:
+    dp = Dispatcher(storage=create_storage())
+    # Апдейты одного пользователя — по очереди, разных — параллельно
+    dp.update.outer_middleware(user_serial)
+    # Данные FSM читаются и пишутся один раз за апдейт
+    dp.update.outer_middleware(FSMBufferMiddleware())
 
     # Подключаем middleware отдельно для сообщений и callback
     dp.message.middleware(SubscriptionMiddleware())
@@ -40,27 +97,95 @@ async def main():
     admin_handlers.register_admin_handlers(dp)
     ai_handlers.register_handlers(dp)
     payment_handlers.register_handlers(dp)
+    inline_handlers.register_handlers(dp)
+    return dp
 
-    await on_startup()
+# ===== Бот =====
+def create_bot(session=None) -> Bot:
+    bot = Bot(
+        token=API_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    # Лимиты Telegram на отправку; middleware внешний, чтобы повторы считались заново
+    bot.session.middleware(send_scheduler)
+    # Картинки из image/ отправляются по сохранённому file_id
+    bot.session.middleware(AssetMiddleware())
+    return bot
 
-    # Поллинг
+# ===== Поллинг =====
+async def run_polling(bot: Bot, dp: Dispatcher):
     while True:
         try:
             logger.info("▶️ Запуск поллинга...")
-            await dp.start_polling(bot)
+            # getUpdates не работает, пока установлен вебхук
+            await bot.delete_webhook()
+            # chat_member не приходит без явного запроса в allowed_updates
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types(), close_bot_session=False)
+            break  # штатная остановка по сигналу
         except asyncio.CancelledError:
             logger.info("⚠️ Поллинг был отменён.")
             break
-        except KeyboardInterrupt:
-            logger.info("🛑 Остановка бота по Ctrl+C")
-            break
         except Exception as e:
             logger.error(f"❌ Ошибка сети: {e}")
             await asyncio.sleep(5)
             logger.info("♻️ Перезапуск бота...")
-        finally:
-            await on_shutdown(bot)
-            break
+
+# ===== Вебхук =====
+async def wait_for_stop_signal():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    await stop.wait()
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    server = WebhookServer(bot, dp, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE)
+    await server.start(WEBHOOK_HOST, WEBHOOK_PORT)
+    # Экземпляр на базу один (lock_instance); больше процессов — через BOT_PROCESSES
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+        logger.info(f"🌐 Вебхук зарегистрирован: {WEBHOOK_URL}")
+    try:
+        await wait_for_stop_signal()
+    finally:
+        logger.info("⏳ Дообработка очереди вебхука...")
+        await server.stop()
+        logger.info(f"📊 Вебхук: {server.metrics}")
+
+# ===== Main =====
+async def main():
+    instance_lock = lock_instance(DB_PATH)
+    if instance_lock is None:
+        logger.error(f"❌ База {DB_PATH} уже используется другим экземпляром бота. "
+                     f"Несколько экземпляров отдают устаревшие состояния FSM — масштабируйте через BOT_PROCESSES")
+        return
+
+    if BOT_PROCESSES > 1:
+        # Хендлеры работают в воркерах, этот процесс только принимает апдейты
+        await run_supervisor(BOT_PROCESSES)
+        return
+
+    bot = create_bot()
+    dp = create_dispatcher()
+
+    await on_startup()
+    await resume_broadcasts(bot)
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            await run_polling(bot, dp)
+    finally:
+        await on_shutdown(bot, dp)
 
 if __name__ == "__main__":
     try:
@@ -12,4 +12,71 @@ BOT_USERNAME = os.getenv("BOT_USERNAME")
 AI_API_KEY = os.getenv("AI_API_KEY")
 AI_API_URL = os.getenv("AI_API_URL")
 DB_PATH = os.getenv("DB_NAME", "academic_works.db")
-CHANNEL_ID = os.getenv("CHANNEL_ID")
\ No newline at end of file
+CHANNEL_ID = os.getenv("CHANNEL_ID")
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+# Окно группового коммита мелких записей (мс) и максимальный размер пачки
+WRITE_BATCH_WINDOW_MS = float(os.getenv("WRITE_BATCH_WINDOW_MS", "5"))
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", "256"))
+
+# Доля автора от цены работы и сервисный аккаунт, получающий комиссию
+AUTHOR_SHARE = float(os.getenv("AUTHOR_SHARE", "0.8"))
+SERVICE_USER_ID = int(os.getenv("SERVICE_USER_ID", "1"))
+# Время жизни снимка админ-статистики (сек)
+ADMIN_STATS_TTL = float(os.getenv("ADMIN_STATS_TTL", "60"))
+# Inline-режим: размер страницы результатов и время жизни кэша (сек)
+INLINE_PAGE_SIZE = int(os.getenv("INLINE_PAGE_SIZE", "20"))
+INLINE_CACHE_TTL = float(os.getenv("INLINE_CACHE_TTL", "30"))
+# Порог медленного запроса (мс): такие запросы пишутся в лог с EXPLAIN QUERY PLAN
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# Хранилище FSM: sqlite (таблица fsm_state, переживает перезапуск) или memory
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+# Период отложенной записи состояний FSM (сек)
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))
+# Окно группировки фонового удаления сообщений (мс)
+DELETE_BATCH_WINDOW_MS = float(os.getenv("DELETE_BATCH_WINDOW_MS", "50"))
+# Сколько лучших совпадений FTS5 поиск берёт до соединения с works (не меньше конца страницы)
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "200"))
+# Отображение страницы каталога и поиска: album (альбом + одно сообщение с кнопками),
+# single (одно сообщение, при листании меняется картинка) или cards (карточка на работу)
+CATALOG_MODE = os.getenv("CATALOG_MODE", "album")
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "3"))
+# Лимиты отправки Telegram: сообщений/с всего и в личный чат, сообщений/мин в группу или канал.
+# Значение 0 снимает ограничение
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", "20"))
+# Сколько сообщений подряд можно отправить в чат без ожидания и сколько раз повторять после RetryAfter
+SEND_BURST = int(os.getenv("SEND_BURST", "3"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+# Рассылки: сколько получателей читать из базы за раз и сколько отправок держать в полёте
+BROADCAST_CHUNK = int(os.getenv("BROADCAST_CHUNK", "100"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+# Кэш проверки подписки на канал (сек): сколько помнить подписку и её отсутствие,
+# и сколько пропускать пользователя, если Telegram не ответил
+SUBSCRIPTION_TTL = float(os.getenv("SUBSCRIPTION_TTL", "600"))
+SUBSCRIPTION_NEGATIVE_TTL = float(os.getenv("SUBSCRIPTION_NEGATIVE_TTL", "30"))
+SUBSCRIPTION_GRACE = float(os.getenv("SUBSCRIPTION_GRACE", "300"))
+# Получение апдейтов: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Публичный адрес, на который Telegram шлёт апдейты (без пути). Пусто — setWebhook не вызывается
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Секрет из заголовка X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+# Воркеры, обрабатывающие апдейты, и размер очереди перед ними
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "32"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+# Число процессов-обработчиков. Больше 1 — супервизор: один процесс принимает апдейты
+# (BOT_MODE) и раздаёт их воркерам по id пользователя. Это единственный способ
+# масштабирования: кэш FSM и очередь апдейтов пользователя живут в памяти процесса,
+# поэтому второй экземпляр бота на той же базе не запускается (файл <DB_NAME>.lock)
+BOT_PROCESSES = int(os.getenv("BOT_PROCESSES", "1"))
+# Сколько апдейтов может ждать в очереди одного воркера
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "1000"))
+# Как часто перечитывать дерево категорий (сек): его могут менять другие процессы. 0 — никогда
+CATEGORY_TREE_TTL = float(os.getenv("CATEGORY_TREE_TTL", "60"))
+# Сколько апдейтов одного пользователя может обрабатываться и ждать очереди; остальные отбрасываются
+USER_QUEUE_LIMIT = int(os.getenv("USER_QUEUE_LIMIT", "3"))
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from database.pool import reader, writer
+
+logger = logging.getLogger(__name__)
+
+
+class _Record:
+    __slots__ = ("state", "data")
+
+    def __init__(self, state: str | None, data: dict):
+        self.state = state
+        self.data = data
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище в таблице fsm_state с кэшем в памяти и отложенной записью.
+    Чтение и запись идут в кэш; изменённые ключи раз в flush_interval
+    сохраняются одной транзакцией. Чистые записи вытесняются сверх max_cached.
+    """
+
+    def __init__(self, flush_interval: float = 1.0, max_cached: int = 10_000):
+        self.flush_interval = flush_interval
+        self.max_cached = max_cached
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._cache: OrderedDict[str, _Record] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._flusher: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        self.metrics = {"hits": 0, "loads": 0, "flushes": 0, "rows_flushed": 0}
+
+    # ===== Кэш =====
+    async def _get(self, key: StorageKey) -> _Record:
+        name = self.key_builder.build(key)
+        record = self._cache.get(name)
+        if record is not None:
+            self._cache.move_to_end(name)
+            self.metrics["hits"] += 1
+            return record
+
+        self.metrics["loads"] += 1
+        async with reader("fsm_load") as db:
+            cursor = await db.execute("SELECT state, data FROM fsm_state WHERE key = ?", (name,))
+            row = await cursor.fetchone()
+        loaded = _Record(row[0], json.loads(row[1])) if row else _Record(None, {})
+        # Пока шла загрузка, запись могла появиться и измениться — её не затираем
+        record = self._cache.setdefault(name, loaded)
+        self._evict()
+        return record
+
+    def _touch(self, key: StorageKey):
+        self._dirty.add(self.key_builder.build(key))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    def _evict(self):
+        if len(self._cache) <= self.max_cached:
+            return
+        for name in list(self._cache):
+            if len(self._cache) <= self.max_cached:
+                break
+            if name not in self._dirty:
+                del self._cache[name]
+
+    # ===== BaseStorage =====
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._get(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        record = await self._get(key)
+        record.data = dict(data)
+        self._touch(key)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self._get(key)).data)
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    # ===== Отложенная запись =====
+    async def _flush_loop(self):
+        while self._dirty:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Ошибка сохранения FSM: {e}")
+
+    async def flush(self):
+        """Сохраняет изменённые ключи одной транзакцией."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            names, self._dirty = self._dirty, set()
+            upserts, deletes = [], []
+            for name in names:
+                record = self._cache.get(name)
+                if record is None:
+                    continue
+                if record.state is None and not record.data:
+                    deletes.append((name,))
+                else:
+                    try:
+                        data = json.dumps(record.data, ensure_ascii=False)
+                    except TypeError as e:
+                        logger.error(f"❌ FSM {name}: данные не сериализуются в JSON и не сохранены: {e}")
+                        continue
+                    upserts.append((name, record.state, data))
+            try:
+                async with writer("fsm_flush") as db:
+                    if upserts:
+                        await db.executemany("""
+                            INSERT INTO fsm_state(key, state, data, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                            ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data,
+                                                           updated_at = excluded.updated_at
+                        """, upserts)
+                    if deletes:
+                        await db.executemany("DELETE FROM fsm_state WHERE key = ?", deletes)
+            except BaseException:
+                # Не сохранённые ключи вернутся в следующую попытку
+                self._dirty |= names
+                raise
+            self.metrics["flushes"] += 1
+            self.metrics["rows_flushed"] += len(upserts) + len(deletes)
+        self._evict()
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import re
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Инструкции, которые не нужно объяснять в логе медленных запросов
+_SERVICE_PREFIXES = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "PRAGMA", "CREATE", "ALTER", "DROP")
+_LEADING_COMMENTS = re.compile(r"^(\s*--[^\n]*\n)*\s*")
+
+
+class InstrumentedCursor:
+    """Обёртка над курсором aiosqlite, считающая выбранные строки."""
+
+    __slots__ = ("_cursor", "_owner")
+
+    def __init__(self, cursor, owner: "InstrumentedConnection"):
+        self._cursor = cursor
+        self._owner = owner
+
+    @property
+    def row_factory(self):
+        return self._cursor.row_factory
+
+    @row_factory.setter
+    def row_factory(self, factory):
+        self._cursor.row_factory = factory
+
+    async def fetchone(self):
+        row = await self._cursor.fetchone()
+        if row is not None:
+            self._owner.rows += 1
+        return row
+
+    async def fetchmany(self, size: int | None = None):
+        rows = await (self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany())
+        self._owner.rows += len(rows)
+        return rows
+
+    async def fetchall(self):
+        rows = await self._cursor.fetchall()
+        self._owner.rows += len(rows)
+        return rows
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for row in self._cursor:
+            self._owner.rows += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """
+    Соединение, выданное пулом под именем запроса.
+    Запоминает выполненные инструкции и число строк для QueryStats.
+    """
+
+    __slots__ = ("_conn", "rows", "statements")
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.rows = 0
+        self.statements = []
+
+    def _remember(self, sql: str, params):
+        head = _LEADING_COMMENTS.sub("", sql).upper()
+        if not head.startswith(_SERVICE_PREFIXES):
+            self.statements.append((sql, params))
+
+    async def execute(self, sql: str, params=()):
+        self._remember(sql, params)
+        return InstrumentedCursor(await self._conn.execute(sql, params), self)
+
+    async def executemany(self, sql: str, params_seq):
+        params_seq = list(params_seq)
+        if params_seq:
+            self._remember(sql, params_seq[0])
+        return InstrumentedCursor(await self._conn.executemany(sql, params_seq), self)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SyncConnection:
+    """
+    Синхронный аналог InstrumentedConnection для функций, которые пул выполняет
+    целиком в потоке соединения записи (ConnectionPool.run_write).
+    """
+
+    __slots__ = ("_conn", "rows", "statements")
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.rows = 0
+        self.statements = []
+
+    _remember = InstrumentedConnection._remember
+
+    def execute(self, sql: str, params=()):
+        self._remember(sql, params)
+        return self._conn.execute(sql, params)
+
+    def executemany(self, sql: str, params_seq):
+        params_seq = list(params_seq)
+        if params_seq:
+            self._remember(sql, params_seq[0])
+        return self._conn.executemany(sql, params_seq)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+
+class StatementStats:
+    __slots__ = ("calls", "rows", "total_time", "lock_wait", "max_time", "samples")
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.lock_wait = 0.0
+        self.max_time = 0.0
+        self.samples = deque(maxlen=window)
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class QueryStats:
+    """
+    Статистика по именованным запросам: вызовы, строки, время выполнения,
+    ожидание соединения и скользящие p50/p95/p99 по последним window замерам.
+    """
+
+    def __init__(self, slow_threshold: float, window: int = 1024):
+        self.slow_threshold = slow_threshold
+        self.window = window
+        self.statements: dict[str, StatementStats] = {}
+        self._plans: dict[str, str] = {}
+        self._explain = None
+        # Ссылки на задачи лога медленных запросов, чтобы их не собрал сборщик мусора
+        self._slow_logs: set[asyncio.Task] = set()
+
+    def set_explainer(self, explain):
+        """explain(sql, params) -> str; используется для лога медленных запросов."""
+        self._explain = explain
+
+    def record(self, name: str, elapsed: float, lock_wait: float, conn: InstrumentedConnection):
+        stats = self.statements.get(name)
+        if stats is None:
+            stats = self.statements[name] = StatementStats(self.window)
+        stats.calls += 1
+        stats.rows += conn.rows
+        stats.total_time += elapsed
+        stats.lock_wait += lock_wait
+        stats.max_time = max(stats.max_time, elapsed)
+        stats.samples.append(elapsed)
+
+        if self.slow_threshold and elapsed >= self.slow_threshold and conn.statements:
+            task = asyncio.get_running_loop().create_task(self._log_slow(name, elapsed, lock_wait, conn.statements[:3]))
+            self._slow_logs.add(task)
+            task.add_done_callback(self._slow_logs.discard)
+
+    async def _log_slow(self, name: str, elapsed: float, lock_wait: float, statements: list):
+        lines = [f"🐢 Медленный запрос {name}: {elapsed * 1000:.1f} мс (ожидание соединения {lock_wait * 1000:.1f} мс)"]
+        for sql, params in statements:
+            sql_text = " ".join(sql.split())
+            plan = self._plans.get(sql_text)
+            if plan is None and self._explain is not None:
+                try:
+                    plan = self._plans[sql_text] = await self._explain(sql, params)
+                except Exception as e:
+                    plan = f"EXPLAIN не удался: {e}"
+            lines.append(f"  SQL: {sql_text}")
+            if plan:
+                lines.append(f"  PLAN: {plan}")
+        logger.warning("\n".join(lines))
+
+    def table(self, limit: int = 20) -> list[tuple]:
+        """Строки (имя, вызовы, строки, p50, p95, p99, max, ожидание) в мс, по суммарному времени."""
+        ordered = sorted(self.statements.items(), key=lambda item: item[1].total_time, reverse=True)
+        return [
+            (
+                name, s.calls, s.rows,
+                s.percentile(0.50) * 1000, s.percentile(0.95) * 1000, s.percentile(0.99) * 1000,
+                s.max_time * 1000, s.lock_wait * 1000,
+            )
+            for name, s in ordered[:limit]
+        ]
+
+    def reset(self):
+        self.statements.clear()
+        self._plans.clear()
@@ -0,0 +1,351 @@
+import logging
+from database.pool import writer
+
+logger = logging.getLogger(__name__)
+
+# ===== Миграция 1: базовая схема =====
+BASELINE_SCHEMA = """
+    -- Пользователи
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username TEXT,
+        balance REAL DEFAULT 0,
+        is_subscribed INTEGER DEFAULT 0
+    );
+
+    -- Категории (курсовые, дипломы, рефераты и т.д.)
+    CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        parent_id INTEGER
+    );
+
+    -- Работы
+    CREATE TABLE IF NOT EXISTS works (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        description TEXT,
+        price REAL NOT NULL,
+        author_income REAL,
+        category_id INTEGER,
+        subcategory_id INTEGER,
+        author_id INTEGER,
+        preview_image_id TEXT,
+        times_sold INTEGER DEFAULT 0,
+        total_earnings REAL DEFAULT 0,
+        status TEXT DEFAULT 'pending', -- 'pending', 'approved', 'rejected'
+        is_deleted INTEGER DEFAULT 0,
+        FOREIGN KEY (category_id) REFERENCES categories (id),
+        FOREIGN KEY (author_id) REFERENCES users (id)
+    );
+
+    -- Файлы работы
+    CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        work_id INTEGER,
+        file_id TEXT,
+        file_name TEXT,
+        FOREIGN KEY (work_id) REFERENCES works (id)
+    );
+
+    -- Покупки
+    CREATE TABLE IF NOT EXISTS purchases (
+        id TEXT PRIMARY KEY,
+        work_id INTEGER,
+        buyer_id INTEGER,
+        amount REAL,
+        status TEXT,
+        payment_proof TEXT,
+        FOREIGN KEY (work_id) REFERENCES works (id),
+        FOREIGN KEY (buyer_id) REFERENCES users (id)
+    );
+    -- Транзакции
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        from_user INTEGER,
+        to_user INTEGER,
+        work_id INTEGER,
+        amount REAL,
+        type TEXT, -- 'purchase', 'payout', 'deposit'
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (from_user) REFERENCES users(id),
+        FOREIGN KEY (to_user) REFERENCES users(id),
+        FOREIGN KEY (work_id) REFERENCES works(id)
+    );
+
+    -- Выплаты авторам
+    CREATE TABLE IF NOT EXISTS payouts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        amount REAL,
+        status TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+
+    -- Посты (для публикации в канал, если понадобится)
+    CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        work_id INTEGER,
+        content TEXT,
+        FOREIGN KEY (work_id) REFERENCES works (id)
+    );
+
+    -- Настройки нейросети
+    CREATE TABLE IF NOT EXISTS ai_settings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ai_provider TEXT,
+        model_name TEXT,
+        api_key TEXT,
+        api_url TEXT,
+        temperature REAL,
+        max_tokens INTEGER,
+        is_active INTEGER DEFAULT 0,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT
+    );
+"""
+
+async def _split_and_execute(db, script: str):
+    """Выполняет DDL-скрипт по одной инструкции внутри текущей транзакции."""
+    for statement in script.split(";"):
+        if statement.strip():
+            await db.execute(statement)
+
+async def _add_column_if_missing(db, table: str, column: str, definition: str):
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    columns = {row[1] for row in await cursor.fetchall()}
+    if column not in columns:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+async def migration_001_baseline(db):
+    await _split_and_execute(db, BASELINE_SCHEMA)
+    # В старых базах эти колонки добавлялись вручную
+    await _add_column_if_missing(db, "works", "status", "TEXT DEFAULT 'pending'")
+    await _add_column_if_missing(db, "works", "is_deleted", "INTEGER DEFAULT 0")
+
+# ===== Миграция 2: индексы для горячих запросов =====
+async def migration_002_indexes(db):
+    await _split_and_execute(db, """
+    CREATE INDEX IF NOT EXISTS idx_works_category ON works(category_id, status, is_deleted, id);
+    CREATE INDEX IF NOT EXISTS idx_works_subcategory ON works(subcategory_id, status, is_deleted, id);
+    CREATE INDEX IF NOT EXISTS idx_works_author ON works(author_id);
+    CREATE INDEX IF NOT EXISTS idx_files_work ON files(work_id);
+    CREATE INDEX IF NOT EXISTS idx_purchases_buyer ON purchases(buyer_id);
+    CREATE INDEX IF NOT EXISTS idx_payouts_status ON payouts(status);
+    CREATE INDEX IF NOT EXISTS idx_transactions_to_user ON transactions(to_user, created_at);
+    """)
+
+# ===== Миграция 3: сводка по авторам =====
+async def migration_003_author_stats(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS author_stats (
+            author_id INTEGER PRIMARY KEY,
+            works_count INTEGER DEFAULT 0,
+            sales_count INTEGER DEFAULT 0,
+            earnings REAL DEFAULT 0
+        )
+    """)
+    await db.execute("""
+        INSERT OR REPLACE INTO author_stats(author_id, works_count, sales_count, earnings)
+        SELECT author_id,
+               SUM(COALESCE(is_deleted, 0) = 0),
+               SUM(times_sold),
+               SUM(COALESCE(author_income, 0) * times_sold)
+        FROM works
+        WHERE author_id IS NOT NULL
+        GROUP BY author_id
+    """)
+    # Продажи учитываются в _settle_purchase, число работ — триггерами
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_author_stats_work_insert
+        AFTER INSERT ON works WHEN NEW.author_id IS NOT NULL AND COALESCE(NEW.is_deleted, 0) = 0
+        BEGIN
+            INSERT INTO author_stats(author_id, works_count) VALUES(NEW.author_id, 1)
+            ON CONFLICT(author_id) DO UPDATE SET works_count = works_count + 1;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_author_stats_work_delete
+        AFTER DELETE ON works WHEN OLD.author_id IS NOT NULL AND COALESCE(OLD.is_deleted, 0) = 0
+        BEGIN
+            UPDATE author_stats SET works_count = works_count - 1 WHERE author_id = OLD.author_id;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_author_stats_work_soft_delete
+        AFTER UPDATE OF is_deleted ON works
+        WHEN NEW.author_id IS NOT NULL AND COALESCE(OLD.is_deleted, 0) != COALESCE(NEW.is_deleted, 0)
+        BEGIN
+            UPDATE author_stats
+            SET works_count = works_count + CASE WHEN COALESCE(NEW.is_deleted, 0) = 0 THEN 1 ELSE -1 END
+            WHERE author_id = NEW.author_id;
+        END
+    """)
+
+# ===== Миграция 4: полнотекстовый поиск по работам =====
+async def migration_004_works_fts(db):
+    await db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS works_fts USING fts5(
+            title, description,
+            content='works', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_works_fts_insert AFTER INSERT ON works
+        BEGIN
+            INSERT INTO works_fts(rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_works_fts_delete AFTER DELETE ON works
+        BEGIN
+            INSERT INTO works_fts(works_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_works_fts_update AFTER UPDATE OF title, description ON works
+        BEGIN
+            INSERT INTO works_fts(works_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+            INSERT INTO works_fts(rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+        END
+    """)
+    await db.execute("INSERT INTO works_fts(works_fts) VALUES ('rebuild')")
+
+# ===== Миграция 5: состояния FSM =====
+async def migration_005_fsm_state(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_state (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+# ===== Миграция 6: file_id статичных картинок =====
+async def migration_006_assets(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS assets (
+            path TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+# ===== Миграция 7: рассылки =====
+async def migration_007_broadcasts(db):
+    # Пользователи, заблокировавшие бота, пропускаются следующими рассылками
+    await _add_column_if_missing(db, "users", "is_blocked", "INTEGER DEFAULT 0")
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT,
+            photo TEXT,
+            status TEXT NOT NULL DEFAULT 'running', -- 'running', 'done', 'cancelled'
+            created_by INTEGER,
+            last_user_id INTEGER NOT NULL DEFAULT 0, -- контрольная точка: до него включительно уже отправлено
+            total INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            blocked INTEGER DEFAULT 0,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            finished_at TEXT
+        )
+    """)
+
+# ===== Миграция 8: владелец рассылки =====
+async def migration_008_broadcast_owner(db):
+    # Номер воркера супервизора, который ведёт рассылку и продолжает её после перезапуска
+    await _add_column_if_missing(db, "broadcasts", "owner", "INTEGER NOT NULL DEFAULT 0")
+
+# ===== Миграция 9: в поиске только видимые работы =====
+_FTS_VISIBLE = "{row}.status = 'approved' AND COALESCE({row}.is_deleted, 0) = 0"
+
+async def migration_009_fts_visible_only(db):
+    # Индекс содержит только одобренные неудалённые работы, поэтому поиску
+    # не нужно соединяться с works ради фильтра. Индекс больше не совпадает
+    # с works целиком: 'rebuild' и 'integrity-check' к нему не применять
+    for name in ("insert", "delete", "update"):
+        await db.execute(f"DROP TRIGGER IF EXISTS trg_works_fts_{name}")
+    await db.execute(f"""
+        CREATE TRIGGER trg_works_fts_insert AFTER INSERT ON works
+        WHEN {_FTS_VISIBLE.format(row="NEW")}
+        BEGIN
+            INSERT INTO works_fts(rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER trg_works_fts_delete AFTER DELETE ON works
+        WHEN {_FTS_VISIBLE.format(row="OLD")}
+        BEGIN
+            INSERT INTO works_fts(works_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        END
+    """)
+    # Одобрение, отклонение и удаление работы добавляют её в индекс или убирают из него
+    await db.execute(f"""
+        CREATE TRIGGER trg_works_fts_update AFTER UPDATE OF title, description, status, is_deleted ON works
+        BEGIN
+            INSERT INTO works_fts(works_fts, rowid, title, description)
+            SELECT 'delete', OLD.id, OLD.title, OLD.description WHERE {_FTS_VISIBLE.format(row="OLD")};
+            INSERT INTO works_fts(rowid, title, description)
+            SELECT NEW.id, NEW.title, NEW.description WHERE {_FTS_VISIBLE.format(row="NEW")};
+        END
+    """)
+    await db.execute("INSERT INTO works_fts(works_fts) VALUES ('delete-all')")
+    await db.execute(f"""
+        INSERT INTO works_fts(rowid, title, description)
+        SELECT id, title, description FROM works WHERE {_FTS_VISIBLE.format(row="works")}
+    """)
+    # ORDER BY rank: заголовок весит больше описания
+    await db.execute("INSERT INTO works_fts(works_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+
+# Порядок важен: номер версии = позиция в списке
+MIGRATIONS = [
+    (1, "baseline", migration_001_baseline),
+    (2, "indexes", migration_002_indexes),
+    (3, "author_stats", migration_003_author_stats),
+    (4, "works_fts", migration_004_works_fts),
+    (5, "fsm_state", migration_005_fsm_state),
+    (6, "assets", migration_006_assets),
+    (7, "broadcasts", migration_007_broadcasts),
+    (8, "broadcast_owner", migration_008_broadcast_owner),
+    (9, "fts_visible_only", migration_009_fts_visible_only),
+]
+
+# ===== Запуск миграций =====
+async def get_schema_version(db) -> int:
+    cursor = await db.execute("SELECT MAX(version) FROM schema_version")
+    row = await cursor.fetchone()
+    return row[0] if row and row[0] is not None else 0
+
+async def run_migrations():
+    """
+    Приводит базу к последней версии схемы.
+    Каждая миграция выполняется в своей транзакции вместе с записью в schema_version.
+    """
+    async with writer("migrations") as db:
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        current = await get_schema_version(db)
+
+    applied = 0
+    for version, name, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        async with writer("migrations") as db:
+            await migrate(db)
+            await db.execute("INSERT INTO schema_version(version, name) VALUES(?, ?)", (version, name))
+        logger.info(f"🗄 Применена миграция {version}: {name}")
+        applied += 1
+
+    if applied:
+        async with writer("migrations") as db:
+            await db.execute("PRAGMA optimize")
+    return applied
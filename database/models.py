@@ -0,0 +1,96 @@
+from dataclasses import dataclass, fields
+
+
+# ===== Записи строк таблиц =====
+# Поля, не попавшие в SELECT, остаются None: запросы выбирают только нужные колонки.
+
+@dataclass(slots=True)
+class Work:
+    id: int
+    title: str | None = None
+    description: str | None = None
+    price: float | None = None
+    author_income: float | None = None
+    category_id: int | None = None
+    subcategory_id: int | None = None
+    author_id: int | None = None
+    preview_image_id: str | None = None
+    times_sold: int | None = None
+    total_earnings: float | None = None
+    status: str | None = None
+    is_deleted: int | None = None
+
+
+@dataclass(slots=True)
+class User:
+    id: int
+    username: str | None = None
+    balance: float | None = None
+    is_subscribed: int | None = None
+    is_blocked: int | None = None
+
+
+@dataclass(slots=True)
+class Purchase:
+    id: str
+    work_id: int | None = None
+    buyer_id: int | None = None
+    amount: float | None = None
+    status: str | None = None
+    payment_proof: str | None = None
+
+
+@dataclass(slots=True)
+class FileRef:
+    file_id: str
+    file_name: str | None = None
+    work_id: int | None = None
+
+
+@dataclass(slots=True)
+class Broadcast:
+    id: int
+    text: str | None = None
+    photo: str | None = None
+    status: str | None = None
+    created_by: int | None = None
+    last_user_id: int | None = None
+    total: int | None = None
+    sent: int | None = None
+    failed: int | None = None
+    blocked: int | None = None
+    created_at: str | None = None
+    finished_at: str | None = None
+    owner: int | None = None
+
+
+def columns_of(cls) -> tuple[str, ...]:
+    return tuple(f.name for f in fields(cls))
+
+
+def record_factory(cls):
+    """
+    row_factory для курсора: собирает запись cls по именам колонок.
+    Имена колонок читаются из cursor.description один раз: фабрика создаётся на каждый курсор.
+    """
+    names = None
+
+    def factory(cursor, row):
+        nonlocal names
+        if names is None:
+            names = tuple(d[0] for d in cursor.description)
+        return cls(**dict(zip(names, row)))
+
+    return factory
+
+
+async def fetch_one(db, cls, sql: str, params: tuple = ()):
+    cursor = await db.execute(sql, params)
+    cursor.row_factory = record_factory(cls)
+    return await cursor.fetchone()
+
+
+async def fetch_all(db, cls, sql: str, params: tuple = ()):
+    cursor = await db.execute(sql, params)
+    cursor.row_factory = record_factory(cls)
+    return await cursor.fetchall()
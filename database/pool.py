@@ -0,0 +1,210 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import aiosqlite
+from config import DB_PATH, DB_READERS, SLOW_QUERY_MS
+from database.metrics import InstrumentedConnection, SyncConnection, QueryStats
+
+
+class ConnectionPool:
+    """
+    Пул соединений с SQLite: одно долгоживущее соединение на запись
+    и несколько соединений на чтение (WAL позволяет читать параллельно).
+    Запись в процессе сериализуется замком; его ожидание и удержание
+    считаются отдельно (metrics["writer_lock"]).
+    """
+
+    def __init__(self, path: str, readers: int = 4, slow_query_ms: float = 0):
+        self.path = path
+        self.readers_count = max(readers, 1)
+        self._writer: aiosqlite.Connection | None = None
+        self._writer_lock = asyncio.Lock()
+        # Свободные соединения и ждущие их задачи. Освободившееся соединение
+        # отдаётся первому ждущему напрямую, иначе его перехватывает задача,
+        # которая только что его вернула, и остальные ждут до конца нагрузки
+        self._idle: deque[aiosqlite.Connection] = deque()
+        self._waiters: deque[asyncio.Future] = deque()
+        self._all_readers: list[aiosqlite.Connection] = []
+        self.metrics = {
+            "reader": {"acquired": 0, "hits": 0, "waits": 0, "wait_time": 0.0, "max_wait": 0.0},
+            "writer_lock": {"acquired": 0, "contended": 0, "wait_time": 0.0, "max_wait": 0.0, "held_time": 0.0},
+        }
+        self.query_stats = QueryStats(slow_query_ms / 1000)
+        self.query_stats.set_explainer(self.explain)
+
+    async def open(self):
+        self._writer = await aiosqlite.connect(self.path)
+        await self._writer.execute("PRAGMA journal_mode=WAL;")
+        await self._writer.execute("PRAGMA synchronous=NORMAL;")
+        await self._writer.execute("PRAGMA busy_timeout=5000;")
+
+        for _ in range(self.readers_count):
+            conn = await aiosqlite.connect(self.path)
+            await conn.execute("PRAGMA busy_timeout=5000;")
+            await conn.execute("PRAGMA query_only=ON;")
+            self._all_readers.append(conn)
+            self._idle.append(conn)
+
+    async def close(self):
+        # Дожидаемся завершения текущей записи
+        async with self._writer_lock:
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers.clear()
+        self._idle.clear()
+
+    def _record(self, kind: str, waited: float, hit: bool):
+        m = self.metrics[kind]
+        m["acquired"] += 1
+        if hit:
+            m["hits"] += 1
+        else:
+            m["waits"] += 1
+            m["wait_time"] += waited
+            m["max_wait"] = max(m["max_wait"], waited)
+
+    def _record_writer(self, waited: float, held: float, contended: bool):
+        m = self.metrics["writer_lock"]
+        m["acquired"] += 1
+        m["held_time"] += held
+        if contended:
+            m["contended"] += 1
+            m["wait_time"] += waited
+            m["max_wait"] = max(m["max_wait"], waited)
+
+    async def _acquire_reader(self) -> aiosqlite.Connection:
+        if self._idle and not self._waiters:
+            return self._idle.popleft()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            # Соединение могли отдать уже после отмены — возвращаем его в пул
+            if waiter.done() and not waiter.cancelled():
+                self._release_reader(waiter.result())
+            raise
+
+    def _release_reader(self, conn: aiosqlite.Connection):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(conn)
+                return
+        self._idle.append(conn)
+
+    @asynccontextmanager
+    async def reader(self, name: str = "reader"):
+        """
+        Выдаёт соединение на чтение и возвращает его в пул после использования.
+        name — имя запроса для статистики (query_stats).
+        """
+        started = time.perf_counter()
+        hit = bool(self._idle) and not self._waiters
+        conn = await self._acquire_reader()
+        acquired = time.perf_counter()
+        self._record("reader", acquired - started, hit)
+        db = InstrumentedConnection(conn)
+        try:
+            yield db
+        finally:
+            self._release_reader(conn)
+            self.query_stats.record(name, time.perf_counter() - acquired, acquired - started, db)
+
+    @asynccontextmanager
+    async def writer(self, name: str = "writer"):
+        """
+        Выдаёт соединение на запись внутри транзакции BEGIN IMMEDIATE.
+        При выходе без ошибок — commit, иначе rollback.
+        Замок держится, пока длится блок, вместе со всеми переходами в поток
+        aiosqlite, — многошаговые транзакции лучше выполнять через run_write.
+        """
+        started = time.perf_counter()
+        contended = self._writer_lock.locked()
+        async with self._writer_lock:
+            acquired = time.perf_counter()
+            db = InstrumentedConnection(self._writer)
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                await db.rollback()
+                raise
+            else:
+                await db.commit()
+            finally:
+                held = time.perf_counter() - acquired
+                self._record_writer(acquired - started, held, contended)
+                self.query_stats.record(name, held, acquired - started, db)
+
+    async def run_write(self, fn, name: str = "writer"):
+        """
+        Выполняет fn(conn) одной транзакцией BEGIN IMMEDIATE целиком в потоке
+        соединения записи и возвращает её результат. conn — SyncConnection
+        (синхронные execute/executemany). Замок записи держится один переход
+        в поток, а не по переходу на каждую инструкцию.
+        """
+        started = time.perf_counter()
+        contended = self._writer_lock.locked()
+        async with self._writer_lock:
+            acquired = time.perf_counter()
+            db = SyncConnection(self._writer._conn)
+            try:
+                # aiosqlite выполняет функции в потоке соединения через _execute
+                return await self._writer._execute(_in_transaction, db, fn)
+            finally:
+                held = time.perf_counter() - acquired
+                self._record_writer(acquired - started, held, contended)
+                self.query_stats.record(name, held, acquired - started, db)
+
+    async def explain(self, sql: str, params=()) -> str:
+        """EXPLAIN QUERY PLAN на свободном соединении для чтения."""
+        conn = await self._acquire_reader()
+        try:
+            cursor = await conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return " | ".join(row[3] for row in await cursor.fetchall())
+        finally:
+            self._release_reader(conn)
+
+    def stats(self) -> dict:
+        return {
+            "readers": self.readers_count,
+            "readers_idle": len(self._idle),
+            "writer_busy": self._writer_lock.locked(),
+            **{kind: dict(values) for kind, values in self.metrics.items()},
+        }
+
+
+def _in_transaction(db: SyncConnection, fn):
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        result = fn(db)
+    except BaseException:
+        db.rollback()
+        raise
+    db.commit()
+    return result
+
+
+# ===== Глобальный пул процесса =====
+pool = ConnectionPool(DB_PATH, DB_READERS, SLOW_QUERY_MS)
+
+async def init_pool():
+    await pool.open()
+
+async def close_pool():
+    await pool.close()
+
+def reader(name: str = "reader"):
+    return pool.reader(name)
+
+def writer(name: str = "writer"):
+    return pool.writer(name)
+
+def run_write(fn, name: str = "writer"):
+    return pool.run_write(fn, name)
@@ -1,30 +1,42 @@
-import aiosqlite
-from config import DB_NAME
+import uuid
+from config import AUTHOR_SHARE, SERVICE_USER_ID
+from database.pool import reader, writer
+from database.models import User, Purchase, fetch_one
+from database.write_queue import enqueue_write, enqueue_write_nowait, enqueue_transaction
 
 # -------------------- Users --------------------
-async def get_user(user_id: int):
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute("SELECT * FROM users WHERE id=?", (user_id,))
-        return await cursor.fetchone()
+async def get_user(user_id: int) -> User | None:
+    async with reader("get_user") as db:
+        return await fetch_one(db, User, "SELECT id, username, balance FROM users WHERE id=?", (user_id,))
+
+_UPSERT_USER = """
+    INSERT INTO users(id, username) VALUES(?,?)
+    ON CONFLICT(id) DO UPDATE SET username = excluded.username, is_blocked = 0
+"""
 
 async def add_user(user_id: int, username: str):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("INSERT OR IGNORE INTO users(id, username) VALUES(?,?)", (user_id, username))
-        await db.commit()
+    # /start после блокировки бота снова делает пользователя получателем рассылок
+    async with reader("user_exists") as db:
+        cursor = await db.execute("SELECT 1 FROM users WHERE id=?", (user_id,))
+        exists = await cursor.fetchone() is not None
+    if exists:
+        # Существующему пользователю коммит ждать незачем
+        enqueue_write_nowait(_UPSERT_USER, (user_id, username))
+    else:
+        # Новый пользователь: покупка или профиль сразу после /start должны видеть строку
+        await enqueue_write(_UPSERT_USER, (user_id, username))
 
 async def update_balance(user_id: int, amount: float):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("UPDATE users SET balance = balance + ? WHERE id=?", (amount, user_id))
-        await db.commit()
+    await enqueue_write("UPDATE users SET balance = balance + ? WHERE id=?", (amount, user_id))
 
 # -------------------- Categories --------------------
 async def get_category_info(category_id: int):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with reader("get_category_info") as db:
         cursor = await db.execute("SELECT id, name, parent_id FROM categories WHERE id=?", (category_id,))
         return await cursor.fetchone()
 
 async def get_categories(parent_id=None):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with reader("get_categories") as db:
         if parent_id:
             cursor = await db.execute("SELECT id, name FROM categories WHERE parent_id=?", (parent_id,))
         else:
@@ -32,110 +44,170 @@ async def get_categories(parent_id=None):
         return await cursor.fetchall()
 
 # -------------------- Works --------------------
-async def get_works(category_id):
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute("SELECT * FROM works WHERE category_id=? OR subcategory_id=?", (category_id, category_id))
-        return await cursor.fetchall()
-
-async def get_work_info(work_id):
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute("SELECT * FROM works WHERE id=?", (work_id,))
-        return await cursor.fetchone()
-
+# Чтение работ и файлов — services.work_service (get_work_info, get_work_files)
 async def update_work_preview(work_id: int, new_preview_id: str):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "UPDATE works SET preview_image_id=? WHERE id=?",
-            (new_preview_id, work_id)
-        )
-        await db.commit()
-
-# -------------------- Files --------------------
-async def get_work_files(work_id):
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute("SELECT file_id, file_name FROM files WHERE work_id=?", (work_id,))
-        return await cursor.fetchall()
+    await enqueue_write(
+        "UPDATE works SET preview_image_id=? WHERE id=?",
+        (new_preview_id, work_id)
+    )
 
 # -------------------- Purchases --------------------
 async def create_purchase(work_id, buyer_id, amount):
-    import uuid
     purchase_id = str(uuid.uuid4())
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with writer("create_purchase") as db:
         await db.execute("INSERT INTO purchases(id, work_id, buyer_id, amount, status) VALUES(?,?,?,?,?)",
                          (purchase_id, work_id, buyer_id, amount, 'pending'))
-        await db.commit()
     return purchase_id
 
-async def get_purchase_info(purchase_id):
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute("SELECT * FROM purchases WHERE id=?", (purchase_id,))
-        return await cursor.fetchone()
+async def get_purchase_info(purchase_id) -> Purchase | None:
+    async with reader("get_purchase_info") as db:
+        return await fetch_one(db, Purchase, "SELECT id, work_id, buyer_id, amount, status FROM purchases WHERE id=?", (purchase_id,))
 
 async def update_purchase_status(purchase_id, status, proof=None):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("UPDATE purchases SET status=?, payment_proof=? WHERE id=?", (status, proof, purchase_id))
-        await db.commit()
+    await enqueue_write("UPDATE purchases SET status=?, payment_proof=? WHERE id=?", (status, proof, purchase_id))
 
 # -------------------- AI Settings --------------------
 async def get_ai_settings():
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with reader("get_ai_settings") as db:
         cursor = await db.execute("SELECT * FROM ai_settings ORDER BY id DESC LIMIT 1")
         return await cursor.fetchone()
 
 async def save_ai_settings(provider, model, api_key, api_url, temperature, max_tokens, is_active):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with writer("save_ai_settings") as db:
         await db.execute("""
         INSERT INTO ai_settings(ai_provider, model_name, api_key, api_url, temperature, max_tokens, is_active)
         VALUES(?,?,?,?,?,?,?)""", (provider, model, api_key, api_url, temperature, max_tokens, int(is_active)))
-        await db.commit()
 
 async def reset_ai_settings():
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with writer("reset_ai_settings") as db:
         await db.execute("DELETE FROM ai_settings")
-        await db.commit()
 
 # -------------------- Transactions --------------------
-async def complete_purchase(purchase_id, service_user_id=1, author_percent=0.7):
+def _settle_purchase(db, work_id, buyer_id, author_id, price, author_income, service_user_id):
+    """
+    Зачисляет доли автору и сервису, обновляет статистику работы и автора, пишет проводки.
+    Вызывается внутри уже открытой транзакции (синхронно, в потоке соединения записи).
+    """
+    author_share = author_income if author_income is not None else round(price * AUTHOR_SHARE, 2)
+    service_share = round(price - author_share, 2)
+
+    db.execute("UPDATE users SET balance = balance + ? WHERE id=?", (author_share, author_id))
+    db.execute("UPDATE users SET balance = balance + ? WHERE id=?", (service_share, service_user_id))
+    db.execute("UPDATE works SET times_sold = times_sold + 1, total_earnings = total_earnings + ? WHERE id=?", (price, work_id))
+    db.executemany(
+        "INSERT INTO transactions(from_user, to_user, work_id, amount, type) VALUES(?,?,?,?,?)",
+        [(buyer_id, author_id, work_id, author_share, 'purchase'),
+         (buyer_id, service_user_id, work_id, service_share, 'purchase')]
+    )
+    db.execute("""
+        INSERT INTO author_stats(author_id, sales_count, earnings) VALUES(?, 1, ?)
+        ON CONFLICT(author_id) DO UPDATE SET
+            sales_count = sales_count + 1,
+            earnings = earnings + excluded.earnings
+    """, (author_id, author_share))
+    return author_share, service_share
+
+async def purchase_work(buyer_id: int, work_id: int, service_user_id: int = SERVICE_USER_ID) -> dict:
+    """
+    Покупка работы с баланса одной операцией очереди записи: все шаги
+    выполняются в потоке соединения записи под общим коммитом пакета.
+    Списание условное (balance >= price), поэтому повторное нажатие «Купить»
+    не уводит баланс в минус.
+    status: 'ok' | 'no_work' | 'no_user' | 'no_funds' | 'already_bought'
+    """
+    def purchase(db):
+        work = db.execute("""
+            SELECT title, price, author_income, author_id FROM works
+            WHERE id=? AND status='approved' AND is_deleted = 0
+        """, (work_id,)).fetchone()
+        if not work:
+            return {"status": "no_work"}
+        title, price, author_income, author_id = work
+
+        bought = db.execute(
+            "SELECT 1 FROM purchases WHERE buyer_id=? AND work_id=? AND status='completed' LIMIT 1",
+            (buyer_id, work_id)
+        ).fetchone()
+        if bought:
+            return {"status": "already_bought", "title": title}
+
+        cursor = db.execute(
+            "UPDATE users SET balance = balance - ? WHERE id=? AND balance >= ?",
+            (price, buyer_id, price)
+        )
+        if cursor.rowcount == 0:
+            user = db.execute("SELECT 1 FROM users WHERE id=?", (buyer_id,)).fetchone()
+            return {"status": "no_funds" if user else "no_user", "title": title, "price": price}
+
+        purchase_id = str(uuid.uuid4())
+        db.execute(
+            "INSERT INTO purchases(id, work_id, buyer_id, amount, status) VALUES(?,?,?,?,?)",
+            (purchase_id, work_id, buyer_id, price, 'completed')
+        )
+        author_share, service_share = _settle_purchase(
+            db, work_id, buyer_id, author_id, price, author_income, service_user_id
+        )
+        return {
+            "status": "ok",
+            "purchase_id": purchase_id,
+            "title": title,
+            "price": price,
+            "author_id": author_id,
+            "author_share": author_share,
+            "service_share": service_share,
+        }
+
+    return await enqueue_transaction(purchase, "purchase_work")
+
+async def complete_purchase(purchase_id, service_user_id=SERVICE_USER_ID, proof: str | None = None) -> dict:
     """
     Завершение покупки: распределение оплаты между автором и сервисом.
     Работа остаётся доступной для других покупателей.
+    proof — подтверждение оплаты вне бота (SMS): баланс покупателя тогда не списывается.
+    Работа могла быть удалена после оплаты — покупка всё равно завершается;
+    если строки работы уже нет, зачислять некому (work_missing).
+    status: 'ok' | 'not_found' | 'already_completed' | 'no_funds'
     """
-    async with aiosqlite.connect(DB_NAME) as db:
-        # Получаем информацию о покупке
-        cursor = await db.execute("SELECT work_id, buyer_id, amount FROM purchases WHERE id=?", (purchase_id,))
-        purchase = await cursor.fetchone()
+    def complete(db):
+        purchase = db.execute("""
+            SELECT p.status, p.work_id, p.buyer_id, p.amount, w.author_id, w.author_income, w.title
+            FROM purchases p LEFT JOIN works w ON w.id = p.work_id
+            WHERE p.id=?
+        """, (purchase_id,)).fetchone()
         if not purchase:
-            return False
-        
-        work_id, buyer_id, amount = purchase
-        
-        # Получаем автора работы
-        cursor = await db.execute("SELECT author_id FROM works WHERE id=?", (work_id,))
-        author = await cursor.fetchone()
-        if not author:
-            return False
-        author_id = author[0]
-        
-        # Рассчитываем доли
-        author_share = amount * author_percent
-        service_share = amount - author_share
-        
-        # Обновляем балансы
-        await db.execute("UPDATE users SET balance = balance + ? WHERE id=?", (author_share, author_id))
-        await db.execute("UPDATE users SET balance = balance + ? WHERE id=?", (service_share, service_user_id))
-        await db.execute("UPDATE users SET balance = balance - ? WHERE id=?", (amount, buyer_id))
-        
-        # Обновляем purchase
-        await db.execute("UPDATE purchases SET status='completed' WHERE id=?", (purchase_id,))
-        
-        # Увеличиваем количество продаж и доходы у работы
-        await db.execute("UPDATE works SET times_sold = times_sold + 1, total_earnings = total_earnings + ? WHERE id=?", (amount, work_id))
-        
-        # Добавляем транзакции
-        await db.execute("INSERT INTO transactions(from_user, to_user, work_id, amount, type) VALUES(?,?,?,?,?)",
-                         (buyer_id, author_id, work_id, author_share, 'purchase'))
-        await db.execute("INSERT INTO transactions(from_user, to_user, work_id, amount, type) VALUES(?,?,?,?,?)",
-                         (buyer_id, service_user_id, work_id, service_share, 'purchase'))
-        
-        await db.commit()
-        return True
\ No newline at end of file
+            return {"status": "not_found"}
+
+        status, work_id, buyer_id, amount, author_id, author_income, title = purchase
+        if status == 'completed':
+            return {"status": "already_completed"}
+        if proof is None:
+            cursor = db.execute(
+                "UPDATE users SET balance = balance - ? WHERE id=? AND balance >= ?",
+                (amount, buyer_id, amount)
+            )
+            if cursor.rowcount == 0:
+                return {"status": "no_funds"}
+
+        db.execute(
+            "UPDATE purchases SET status='completed', payment_proof=COALESCE(?, payment_proof) WHERE id=?",
+            (proof, purchase_id)
+        )
+        work_missing = author_id is None
+        author_share = service_share = 0
+        if not work_missing:
+            author_share, service_share = _settle_purchase(
+                db, work_id, buyer_id, author_id, amount, author_income, service_user_id
+            )
+        return {
+            "status": "ok",
+            "work_id": work_id,
+            "buyer_id": buyer_id,
+            "title": title,
+            "price": amount,
+            "author_id": author_id,
+            "author_share": author_share,
+            "service_share": service_share,
+            "work_missing": work_missing,
+        }
+
+    return await enqueue_transaction(complete, "complete_purchase")
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+
+from config import WRITE_BATCH_WINDOW_MS, WRITE_BATCH_MAX
+from database.metrics import SyncConnection
+from database.pool import pool, run_write
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """
+    Фоновая очередь мелких записей с групповым коммитом.
+    Всё, что пришло в пределах окна window, выполняется в одной транзакции;
+    каждая операция изолирована SAVEPOINT'ом, так что ошибка одной
+    не откатывает остальные. Операция — SQL-инструкция или функция
+    fn(conn) над SyncConnection (многошаговая транзакция вроде покупки);
+    пакет выполняется целиком в потоке соединения записи за один переход.
+    """
+
+    def __init__(self, window: float = 0.005, max_batch: int = 256):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._detached: set[asyncio.Task] = set()
+        self.metrics = {"operations": 0, "batches": 0, "failed": 0, "max_batch": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="write-queue")
+
+    async def stop(self):
+        """Дожидается записи всего, что уже стоит в очереди, и останавливает задачу."""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, sql: str, params: tuple = ()) -> int:
+        """Ставит запись в очередь и ждёт общего коммита. Возвращает rowcount."""
+        return await self._submit(sql, params, "write_queue")
+
+    async def submit_transaction(self, fn, name: str):
+        """
+        Ставит в очередь fn(conn) — синхронную функцию над SyncConnection —
+        и ждёт общего коммита. Возвращает результат fn; если fn бросила
+        исключение, её изменения откатываются, а исключение пробрасывается.
+        """
+        return await self._submit(fn, None, name)
+
+    async def _submit(self, op, params, name: str):
+        if not self.running:
+            # Очередь не запущена (скрипты, бенчмарки) — пишем напрямую
+            return await run_write(lambda db: _apply(db, op, params), name)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, params, future, name, time.perf_counter()))
+        return await future
+
+    def submit_nowait(self, sql: str, params: tuple = ()):
+        """Ставит запись в очередь, не дожидаясь коммита; ошибка только пишется в лог."""
+        if not self.running:
+            task = asyncio.create_task(self.submit(sql, params))
+            self._detached.add(task)
+            task.add_done_callback(self._detached_done)
+            return
+        self._queue.put_nowait((sql, params, None, "write_queue", time.perf_counter()))
+
+    def _detached_done(self, task: asyncio.Task):
+        self._detached.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"❌ Ошибка отложенной записи: {task.exception()}")
+
+    async def _collect(self, first) -> tuple[list, bool]:
+        batch = [first]
+        stopping = False
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+        return batch, stopping
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch, stopping = await self._collect(first)
+            await self._flush(batch)
+        # Остаток очереди после сигнала остановки
+        rest = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                rest.append(item)
+        if rest:
+            await self._flush(rest)
+
+    async def _flush(self, batch: list):
+        started = time.perf_counter()
+        try:
+            results = await run_write(lambda db: _apply_batch(db, batch), "write_queue")
+        except Exception as e:
+            logger.error(f"❌ Ошибка группового коммита ({len(batch)} операций): {e}")
+            results = [(None, e, 0.0)] * len(batch)
+
+        self.metrics["operations"] += len(batch)
+        self.metrics["batches"] += 1
+        self.metrics["max_batch"] = max(self.metrics["max_batch"], len(batch))
+        for (op, _, future, name, queued_at), (result, error, elapsed) in zip(batch, results):
+            if callable(op):
+                # Транзакции из очереди видны в статистике под своими именами
+                pool.query_stats.record(name, elapsed, started - queued_at, SyncConnection(None))
+            if future is None:
+                # Запись без ожидания результата
+                if error is not None:
+                    self.metrics["failed"] += 1
+                    logger.error(f"❌ Ошибка отложенной записи: {error}")
+                continue
+            if future.done():
+                continue
+            if error is not None:
+                self.metrics["failed"] += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+def _apply(db: SyncConnection, op, params):
+    if callable(op):
+        return op(db)
+    return db.execute(op, params).rowcount
+
+def _apply_batch(db: SyncConnection, batch: list) -> list[tuple]:
+    """Выполняется в потоке соединения записи: (результат, ошибка, время) на каждую операцию."""
+    results = []
+    for op, params, _, _, _ in batch:
+        started = time.perf_counter()
+        db.execute("SAVEPOINT write_queue")
+        try:
+            results.append((_apply(db, op, params), None, time.perf_counter() - started))
+        except Exception as e:
+            db.execute("ROLLBACK TO write_queue")
+            results.append((None, e, time.perf_counter() - started))
+        db.execute("RELEASE write_queue")
+    return results
+
+
+# ===== Глобальная очередь процесса =====
+write_queue = WriteQueue(WRITE_BATCH_WINDOW_MS / 1000, WRITE_BATCH_MAX)
+
+def start_write_queue():
+    write_queue.start()
+
+async def stop_write_queue():
+    await write_queue.stop()
+
+async def enqueue_write(sql: str, params: tuple = ()) -> int:
+    return await write_queue.submit(sql, params)
+
+def enqueue_write_nowait(sql: str, params: tuple = ()):
+    write_queue.submit_nowait(sql, params)
+
+async def enqueue_transaction(fn, name: str):
+    return await write_queue.submit_transaction(fn, name)
@@ -6,11 +6,15 @@ from config import ADMIN_IDS, CHANNEL_ID
 from services.work_service import (
     add_category, get_categories, delete_category, get_pending_works, get_work_info,
     approve_work, reject_work, get_work_files, update_work_title, update_work_description,
-    get_users_count, get_works_count, get_payout_requests, get_total_users_count,
-    get_category_sales_count, update_work_category, admin_delete_work
+    get_payout_requests, update_work_category, admin_delete_work
 )
+from services.admin_stats import get_stats_snapshot
+from database.pool import pool
 from handlers.combined_handlers import get_main_menu, add_message_id, delete_previous_messages
 from database import queries
+from utils.delete_queue import enqueue_delete
+from utils.send_scheduler import send_scheduler, send_lane, Lane
+from services.broadcast import broadcaster, get_recent_broadcasts
 
 # ===== FSM =====
 class CategoryForm(StatesGroup):
@@ -24,27 +28,23 @@ class EditWorkForm(StatesGroup):
 class EditPreviewForm(StatesGroup):
     waiting_for_photo = State()
 
+class BroadcastForm(StatesGroup):
+    message = State()
+
 # ===== Проверка админа =====
 def is_admin(user_id: int):
     return user_id in ADMIN_IDS
 
 # ===== Вспомогательная функция удаления сообщений =====
 async def delete_bot_messages(chat: types.Chat, msg_ids: list[int]):
-    for msg_id in msg_ids:
-        try:
-            await chat.delete_message(msg_id)
-        except:
-            pass
+    enqueue_delete(chat.bot, chat.id, msg_ids)
             
 # ===== Удаление success-сообщения =====
 async def delete_success_message(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     success_msg_id = data.get("success_msg_id")
     if success_msg_id:
-        try:
-            await callback.message.chat.delete_message(success_msg_id)
-        except:
-            pass
+        enqueue_delete(callback.bot, callback.message.chat.id, [success_msg_id])
         await state.update_data(success_msg_id=None)
 
 # ===== Админ-панель =====
@@ -60,6 +60,8 @@ async def admin_panel_handler(callback: types.CallbackQuery, state: FSMContext):
         [InlineKeyboardButton(text="📂 Категории", callback_data="admin_categories")],
         [InlineKeyboardButton(text="📝 Проверка работ", callback_data="admin_pending_works")],
         [InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")],
+        [InlineKeyboardButton(text="⏱ Запросы", callback_data="admin_queries")],
+        [InlineKeyboardButton(text="📢 Рассылка", callback_data="admin_broadcasts")],
         [InlineKeyboardButton(text="🦧 Заявки на выплату", callback_data="admin_payouts")],
         [InlineKeyboardButton(text="🏠 Главное меню", callback_data="to_main_menu")]
     ])
@@ -140,10 +142,7 @@ async def add_category_parent(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     temp_msg_id = data.get("temp_msg_id")
     if temp_msg_id:
-        try:
-            await callback.message.chat.delete_message(temp_msg_id)
-        except:
-            pass
+        enqueue_delete(callback.bot, callback.message.chat.id, [temp_msg_id])
     await state.update_data(temp_msg_id=msg.message_id)
     await state.set_state(CategoryForm.name)
 
@@ -155,10 +154,7 @@ async def add_category_save(message: types.Message, state: FSMContext):
 
     temp_msg_id = data.get("temp_msg_id")
     if temp_msg_id:
-        try:
-            await message.chat.delete_message(temp_msg_id)
-        except:
-            pass
+        enqueue_delete(message.bot, message.chat.id, [temp_msg_id])
 
     last_msg_ids = data.get("last_msg_ids", [])
     await delete_bot_messages(message.chat, last_msg_ids)
@@ -189,8 +185,8 @@ async def admin_pending_works(callback: types.CallbackQuery, state: FSMContext):
         return
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    for work_id, title, author_id in works:
-        keyboard.inline_keyboard.append([InlineKeyboardButton(text=f"{title}", callback_data=f"review_{work_id}")])
+    for work in works:
+        keyboard.inline_keyboard.append([InlineKeyboardButton(text=f"{work.title}", callback_data=f"review_{work.id}")])
     keyboard.inline_keyboard.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="to_main_menu")])
 
     msg = await callback.message.answer("📝 Работы на проверку:", reply_markup=keyboard)
@@ -236,12 +232,13 @@ async def review_work(callback: types.CallbackQuery, state: FSMContext, page: in
             await callback.answer("❌ Ошибка данных, попробуйте снова", show_alert=True)
             return
 
-    work_info = await get_work_info(work_id)
+    work_info = await get_work_info(work_id, "title", "description", "price", "preview_image_id", "status")
     if not work_info:
         await callback.answer("❌ Работа не найдена", show_alert=True)
         return
 
-    _, title, description, price, _, _, _, author_id, preview_image_id, _, _, status = work_info
+    title, description, price = work_info.title, work_info.description, work_info.price
+    preview_image_id, status = work_info.preview_image_id, work_info.status
     admin_keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="❌ Удалить работу", callback_data=f"admin_delete_{work_id}")],
         [InlineKeyboardButton(text="✏️ Изменить название", callback_data=f"edit_title_{work_id}")],
@@ -272,12 +269,10 @@ async def review_work(callback: types.CallbackQuery, state: FSMContext, page: in
 
     try:
         files = await get_work_files(work_id)
-        for file_id, _ in files:
-            if file_id.startswith(("AgAC", "BQAC")):
-                file_msg = await callback.message.answer_document(file_id)
-                last_ids = (await state.get_data()).get("last_msg_ids", [])
-                last_ids.append(file_msg.message_id)
-                await state.update_data(last_msg_ids=last_ids)
+        for file in files:
+            if file.file_id.startswith(("AgAC", "BQAC")):
+                file_msg = await callback.message.answer_document(file.file_id)
+                await add_message_id(file_msg, state)
     except Exception as e:
         await callback.message.answer(f"❌ Ошибка при отправке файлов работы: {e}")
 
@@ -285,9 +280,7 @@ async def review_work(callback: types.CallbackQuery, state: FSMContext, page: in
     category_keyboard = generate_all_category_buttons(categories, work_id)
     try:
         category_msg = await callback.message.answer("📂 Выберите категорию для работы:", reply_markup=category_keyboard)
-        last_ids = (await state.get_data()).get("last_msg_ids", [])
-        last_ids.append(category_msg.message_id)
-        await state.update_data(last_msg_ids=last_ids)
+        await add_message_id(category_msg, state)
     except Exception as e:
         await callback.message.answer(f"❌ Ошибка при отправке клавиатуры категорий: {e}")
 
@@ -331,9 +324,7 @@ async def start_edit_title(callback: types.CallbackQuery, state: FSMContext):
     work_id = int(callback.data.split("_")[-1])
     await state.update_data(work_id=work_id)
     msg = await callback.message.answer("✏️ Введите новое название для работы:")
-    last_ids = (await state.get_data()).get("last_msg_ids", [])
-    last_ids.append(msg.message_id)
-    await state.update_data(last_msg_ids=last_ids)
+    await add_message_id(msg, state)
     await state.set_state(EditWorkForm.new_title)
 
 async def save_new_title(message: types.Message, state: FSMContext):
@@ -349,9 +340,7 @@ async def start_edit_description(callback: types.CallbackQuery, state: FSMContex
     work_id = int(callback.data.split("_")[-1])
     await state.update_data(work_id=work_id)
     msg = await callback.message.answer("📝 Введите новое описание работы:")
-    last_ids = (await state.get_data()).get("last_msg_ids", [])
-    last_ids.append(msg.message_id)
-    await state.update_data(last_msg_ids=last_ids)
+    await add_message_id(msg, state)
     await state.set_state(EditWorkForm.new_description)
 
 async def save_new_description(message: types.Message, state: FSMContext):
@@ -370,16 +359,16 @@ from config import CHANNEL_ID  # импортируем из конфига
 # ===== Одобрение / отклонение =====
 async def approve_work_handler(callback: types.CallbackQuery, state: FSMContext):
     work_id = int(callback.data.split("_")[-1])
-    work_info = await get_work_info(work_id)
+    # Берём только нужные поля
+    work_info = await get_work_info(work_id, "title", "description", "price", "preview_image_id")
     if not work_info:
         await callback.answer("❌ Работа не найдена", show_alert=True)
         return
 
-    # Берём только нужные поля
-    title = work_info[1]
-    description = work_info[2]
-    price = work_info[3]
-    photo_file_id = work_info[8]
+    title = work_info.title
+    description = work_info.description
+    price = work_info.price
+    photo_file_id = work_info.preview_image_id
 
     # Одобряем работу
     await approve_work(work_id)
@@ -401,13 +390,15 @@ async def approve_work_handler(callback: types.CallbackQuery, state: FSMContext)
 
 async def reject_work_handler(callback: types.CallbackQuery, state: FSMContext):
     work_id = int(callback.data.split("_")[-1])
-    work_info = await get_work_info(work_id)
+    work_info = await get_work_info(work_id, "title", "author_id")
     if not work_info:
         await callback.answer("❌ Работа не найдена", show_alert=True)
         return
-    _, title, *_ , author_id, _, _ = work_info
+    title, author_id = work_info.title, work_info.author_id
     await reject_work(work_id)
-    try: await callback.message.bot.send_message(author_id, f"❌ Ваша работа '{title}' отклонена администратором.")
+    try:
+        with send_lane(Lane.NOTIFICATION):
+            await callback.message.bot.send_message(author_id, f"❌ Ваша работа '{title}' отклонена администратором.")
     except: pass
     last_ids = (await state.get_data()).get("last_msg_ids", [])
     await delete_bot_messages(callback.message.chat, last_ids)
@@ -477,17 +468,129 @@ async def admin_stats_handler(callback: types.CallbackQuery, state: FSMContext):
         return
     await delete_previous_messages(callback, state)
     categories = await get_categories()
+    snapshot = await get_stats_snapshot()
     text = "📊 <b>Статистика по категориям</b>\n\n"
     for cat_id, cat_name, _ in categories:
-        users_count = await get_users_count(cat_id)
-        works_count = await get_works_count(cat_id)
-        sales_count = await get_category_sales_count(cat_id)
+        users_count, works_count, sales_count = snapshot.per_category.get(cat_id, (0, 0, 0))
         text += f"📂 <b>{cat_name}</b>\n 👥 Пользователи: {users_count}\n 📝 Всего работ: {works_count}\n 🛒 Куплено работ: {sales_count}\n\n"
-    text += f"👤 <b>Всего пользователей бота:</b> {await get_total_users_count()}\n"
+    text += f"👤 <b>Всего пользователей бота:</b> {snapshot.total_users}\n"
+    text += f"🕒 Обновлено {int(snapshot.age)} сек. назад\n"
     keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_panel")]])
     msg = await callback.message.answer(text, reply_markup=keyboard)
     await state.update_data(last_msg_ids=[msg.message_id])
 
+# ===== Статистика SQL-запросов =====
+async def admin_queries_handler(callback: types.CallbackQuery, state: FSMContext):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Нет доступа", show_alert=True)
+        return
+    if callback.data == "admin_queries_reset":
+        pool.query_stats.reset()
+    await delete_previous_messages(callback, state)
+    rows = pool.query_stats.table(limit=25)
+    if rows:
+        lines = [f"{'запрос':<24}{'n':>6}{'rows':>7}{'p50':>7}{'p95':>7}{'p99':>7}{'max':>7}{'wait':>8}"]
+        for name, calls, row_count, p50, p95, p99, max_ms, wait in rows:
+            lines.append(f"{name[:23]:<24}{calls:>6}{row_count:>7}{p50:>7.1f}{p95:>7.1f}{p99:>7.1f}{max_ms:>7.1f}{wait:>8.1f}")
+        table = "\n".join(lines)
+        text = f"⏱ <b>SQL-запросы</b> (мс, последние {pool.query_stats.window} замеров)\n\n<pre>{table}</pre>"
+    else:
+        text = "⏱ Запросов пока не было"
+    stats = pool.stats()
+    lock = stats["writer_lock"]
+    text += f"\n🗄 Читателей свободно: {stats['readers_idle']}/{stats['readers']}"
+    text += f"\n✍️ Ожидание замка записи: {lock['contended']} из {lock['acquired']}, всего {lock['wait_time'] * 1000:.0f} мс"
+    lanes = send_scheduler.stats()["lanes"]
+    text += "\n📤 Очередь отправки: " + ", ".join(
+        f"{name} {lane['depth']} (макс. {lane['max_depth']}, ~{lane['avg_wait_ms']:.0f} мс)" for name, lane in lanes.items()
+    )
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔄 Сбросить", callback_data="admin_queries_reset")],
+        [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_panel")]
+    ])
+    msg = await callback.message.answer(text, reply_markup=keyboard)
+    await state.update_data(last_msg_ids=[msg.message_id])
+    await callback.answer()
+
+# ===== Рассылки =====
+BROADCAST_STATUSES = {"running": "⏳ идёт", "done": "✅ завершена", "cancelled": "⏹ остановлена"}
+
+async def admin_broadcasts_handler(callback: types.CallbackQuery, state: FSMContext):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Нет доступа", show_alert=True)
+        return
+    await state.set_state(None)
+    await delete_previous_messages(callback, state)
+    broadcasts = await get_recent_broadcasts()
+    text = "📢 <b>Рассылки</b>\n\n"
+    buttons = [[InlineKeyboardButton(text="✏️ Новая рассылка", callback_data="broadcast_new")]]
+    for b in broadcasts:
+        text += (f"#{b.id} {BROADCAST_STATUSES.get(b.status, b.status)} — {b.created_at}\n"
+                 f"  ✅ {b.sent} из {b.total}, 🚫 {b.blocked}, ⚠️ {b.failed}\n")
+        if b.status == "running":
+            buttons.append([InlineKeyboardButton(text=f"⏹ Остановить #{b.id}", callback_data=f"broadcast_cancel_{b.id}")])
+    if not broadcasts:
+        text += "Рассылок ещё не было."
+    buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_panel")])
+    msg = await callback.message.answer(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+    await state.update_data(last_msg_ids=[msg.message_id])
+    await callback.answer()
+
+async def broadcast_new_handler(callback: types.CallbackQuery, state: FSMContext):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Нет доступа", show_alert=True)
+        return
+    await delete_previous_messages(callback, state)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="❌ Отмена", callback_data="admin_broadcasts")]])
+    msg = await callback.message.answer("✏️ Отправьте текст рассылки или фото с подписью:", reply_markup=keyboard)
+    await state.update_data(last_msg_ids=[msg.message_id])
+    await state.set_state(BroadcastForm.message)
+    await callback.answer()
+
+async def broadcast_message_handler(message: types.Message, state: FSMContext):
+    photo = message.photo[-1].file_id if message.photo else None
+    text = message.html_text if (message.text or message.caption) else None
+    if not (text or photo):
+        await message.answer("❌ Нужен текст или фото с подписью.")
+        return
+    await delete_previous_messages(message, state)
+    await state.update_data(broadcast_text=text, broadcast_photo=photo)
+    await state.set_state(None)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Запустить", callback_data="broadcast_confirm")],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_broadcasts")]
+    ])
+    if photo:
+        msg = await message.answer_photo(photo=photo, caption=text, reply_markup=keyboard)
+    else:
+        msg = await message.answer(text, reply_markup=keyboard)
+    await state.update_data(last_msg_ids=[msg.message_id])
+
+async def broadcast_confirm_handler(callback: types.CallbackQuery, state: FSMContext):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Нет доступа", show_alert=True)
+        return
+    data = await state.get_data()
+    text, photo = data.get("broadcast_text"), data.get("broadcast_photo")
+    if not (text or photo):
+        await callback.answer("❌ Рассылка устарела, создайте заново", show_alert=True)
+        return
+    await state.update_data(broadcast_text=None, broadcast_photo=None)
+    broadcast_id = await broadcaster.start(callback.bot, text, photo, callback.from_user.id)
+    await callback.answer(f"📢 Рассылка #{broadcast_id} запущена")
+    await admin_broadcasts_handler(callback, state)
+
+async def broadcast_cancel_handler(callback: types.CallbackQuery, state: FSMContext):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Нет доступа", show_alert=True)
+        return
+    broadcast_id = int(callback.data.split("_")[-1])
+    if await broadcaster.cancel(broadcast_id):
+        await callback.answer(f"⏹ Рассылка #{broadcast_id} остановлена")
+    else:
+        await callback.answer("Рассылка уже завершена")
+    await admin_broadcasts_handler(callback, state)
+
 async def admin_payouts_handler(callback: types.CallbackQuery, state: FSMContext):
     if not is_admin(callback.from_user.id):
         await callback.answer("⛔ Нет доступа", show_alert=True)
@@ -546,4 +649,10 @@ def register_admin_handlers(dp: Dispatcher):
     dp.callback_query.register(add_category_parent, F.data.startswith("parent_"))
     dp.callback_query.register(admin_stats_handler, F.data == "admin_stats")
     dp.callback_query.register(admin_payouts_handler, F.data == "admin_payouts")
+    dp.callback_query.register(admin_queries_handler, F.data.in_({"admin_queries", "admin_queries_reset"}))
     dp.callback_query.register(show_subcategories, F.data.startswith("show_subcats_"))
+    dp.callback_query.register(admin_broadcasts_handler, F.data == "admin_broadcasts")
+    dp.callback_query.register(broadcast_new_handler, F.data == "broadcast_new")
+    dp.message.register(broadcast_message_handler, BroadcastForm.message)
+    dp.callback_query.register(broadcast_confirm_handler, F.data == "broadcast_confirm")
+    dp.callback_query.register(broadcast_cancel_handler, F.data.startswith("broadcast_cancel_"))
@@ -1,18 +1,24 @@
+import html
 from aiogram import Dispatcher, F, types
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, Message
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, Message, InputMediaPhoto
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
-from aiogram.filters import Command
-from config import ADMIN_IDS, DB_NAME
-from utils.subscription import check_subscription
+from aiogram.filters import Command, CommandObject
+from config import ADMIN_IDS, CATALOG_MODE, CATALOG_PAGE_SIZE
+from utils.subscription import check_subscription, subscription_cache, is_subscription_channel, is_member
+from utils.delete_queue import enqueue_delete
+from utils.middleware import BufferedFSMContext
 from services.work_service import (
     get_categories,
     get_subcategories,
-    get_works,
+    get_works_page,
+    search_works,
+    count_works,
     delete_work,
-    get_user_balance,
     save_work,
     get_author_stats,
+    get_author_works,
     get_user_purchases,
     add_category,
     delete_category,
@@ -25,13 +31,13 @@ from services.work_service import (
     get_categories_with_subcategories,
     update_work_description
 )
+from database.models import Work
 from database.queries import (
     get_user,
-    create_purchase,
+    add_user,
     update_balance,
-    complete_purchase
+    purchase_work
 )
-from aiosqlite import connect
 
 # ===== Состояния =====
 class WorkForm(StatesGroup):
@@ -58,42 +64,33 @@ def is_admin(user_id: int):
     return user_id in ADMIN_IDS
 
 async def add_message_id(msg, state: FSMContext):
-    data = await state.get_data()
-    last_msg_ids = data.get("last_msg_ids", [])
-    last_msg_ids.append(msg.message_id)
-    await state.update_data(last_msg_ids=last_msg_ids)
+    if isinstance(state, BufferedFSMContext):
+        data = await state.view()
+        data.setdefault("last_msg_ids", []).append(msg.message_id)
+        return
+    # Без FSMBufferMiddleware — обычные чтение и запись данных
+    last_msg_ids = await state.get_value("last_msg_ids", [])
+    await state.update_data(last_msg_ids=[*last_msg_ids, msg.message_id])
 
 async def delete_previous_messages(callback_or_message, state: FSMContext):
-    data = await state.get_data()
-    last_msg_ids = data.get("last_msg_ids", [])
-    bot = callback_or_message.bot
-    chat_id = callback_or_message.from_user.id
-    for msg_id in last_msg_ids:
-        try:
-            await bot.delete_message(chat_id, msg_id)
-        except:
-            pass
-    await state.update_data(last_msg_ids=[])
+    if isinstance(state, BufferedFSMContext):
+        data = await state.view()
+        last_msg_ids = data.get("last_msg_ids", [])
+        data["last_msg_ids"] = []
+    else:
+        last_msg_ids = await state.get_value("last_msg_ids", [])
+        await state.update_data(last_msg_ids=[])
+    enqueue_delete(callback_or_message.bot, callback_or_message.from_user.id, last_msg_ids)
 
 async def delete_bot_messages(chat: types.Chat, msg_ids: list[int]):
-    for msg_id in msg_ids:
-        try:
-            await chat.delete_message(msg_id)
-        except:
-            pass
+    enqueue_delete(chat.bot, chat.id, msg_ids)
 
 async def go_main_from_success(callback: types.CallbackQuery, state: FSMContext):
-    try:
-        await callback.message.delete()
-    except:
-        pass
+    enqueue_delete(callback.bot, callback.message.chat.id, [callback.message.message_id])
     await main_menu(callback, state)
 
 async def go_main_from_error(callback: types.CallbackQuery, state: FSMContext):
-    try:
-        await callback.message.delete()
-    except:
-        pass
+    enqueue_delete(callback.bot, callback.message.chat.id, [callback.message.message_id])
     await main_menu(callback, state)
 
 async def subscribed_callback_handler(callback: types.CallbackQuery, state: FSMContext):
@@ -104,16 +101,18 @@ async def subscribed_callback_handler(callback: types.CallbackQuery, state: FSMC
     is_subscribed = await check_subscription(user_id, bot)
     if is_subscribed:
         # Удаляем сообщение с кнопкой подписки
-        try:
-            await callback.message.delete()
-        except:
-            pass
+        enqueue_delete(callback.bot, callback.message.chat.id, [callback.message.message_id])
         # Показываем главное меню
         await main_menu(callback, state)
     else:
         # Пользователь нажал "Я подписан", но реально не подписан
         await callback.answer("❌ Вы ещё не подписались на канал!", show_alert=True)
 
+async def channel_member_handler(event: types.ChatMemberUpdated):
+    # Бот — админ канала: подписки и отписки приходят апдейтами, без запросов к API
+    subscription_cache.metrics["updates"] += 1
+    subscription_cache.set(event.new_chat_member.user.id, is_member(event.new_chat_member))
+
 # ===== Меню =====
 def get_main_menu(user_id: int):
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -137,9 +136,10 @@ def get_profile_menu():
     ])
 
 # ===== Главное меню =====
-async def start(message: types.Message, state: FSMContext):
+async def start(message: types.Message, state: FSMContext, command: CommandObject | None = None):
     await delete_previous_messages(message, state)
     await state.clear()
+    await add_user(message.from_user.id, message.from_user.username)
     menu = get_main_menu(message.from_user.id)
     photo = FSInputFile("image/welcome.jpg")
     msg = await message.answer_photo(
@@ -149,6 +149,13 @@ async def start(message: types.Message, state: FSMContext):
     )
     await add_message_id(msg, state)
 
+    # Диплинк из inline-режима: /start buy_<id>
+    args = command.args if command else None
+    if args and args.startswith("buy_") and args[4:].isdigit():
+        work = await get_work_info(int(args[4:]), "title", "description", "price", "preview_image_id", "status")
+        if work and work.status == "approved":
+            await send_work_card(message, work, state)
+
 async def main_menu(callback_or_message, state: FSMContext):
     await delete_previous_messages(callback_or_message, state)
     await state.clear()
@@ -237,12 +244,20 @@ async def catalog_handler(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 async def category_handler(callback: types.CallbackQuery, state: FSMContext):
-    await delete_previous_messages(callback, state)
-
     parts = callback.data.split("_")
     category_id = int(parts[1])
     page = int(parts[2]) if len(parts) > 2 else 1
-    is_root = len(parts) > 3 and parts[3] == "root"
+    # Курсор страницы: a{id} — работы старше id, b{id} — работы новее id
+    page_cursor = parts[3] if len(parts) > 3 else ""
+    after_id = int(page_cursor[1:]) if page_cursor.startswith("a") else None
+    before_id = int(page_cursor[1:]) if page_cursor.startswith("b") else None
+    if after_id is None and before_id is None:
+        # Старая кнопка category_{id}_{page} без курсора показывает первую страницу
+        page = 1
+    # В режиме single листание меняет текущее сообщение, а не присылает новые
+    edit = CATALOG_MODE == "single" and (after_id or before_id) is not None
+    if not edit:
+        await delete_previous_messages(callback, state)
 
     # Получаем подкатегории
     subcategories = await get_subcategories(category_id)
@@ -262,7 +277,8 @@ async def category_handler(callback: types.CallbackQuery, state: FSMContext):
         return
 
     # Если подкатегорий нет — показываем работы
-    works = await get_works(category_id)
+    page_size = min(CATALOG_PAGE_SIZE, MEDIA_GROUP_MAX)
+    works = await get_works_page(category_id, page_size, after_id=after_id, before_id=before_id)
     if not works:
         keyboard = InlineKeyboardMarkup(
             inline_keyboard=[[InlineKeyboardButton(text="⬅️ Назад", callback_data="catalog")],
@@ -277,84 +293,173 @@ async def category_handler(callback: types.CallbackQuery, state: FSMContext):
         await add_message_id(msg, state)
         return
 
-    # Постраничный вывод — оставляем как есть
-    page_size = 3
-    total_pages = max((len(works) + page_size - 1) // page_size, 1)
-    start_idx = (page - 1) * page_size
-    end_idx = start_idx + page_size
-    current_works = works[start_idx:end_idx]
-
-    for work in current_works:
-        work_id, title, description, price, author_income, cat_id, subcategory_id, author_id, preview_image_id = work
-        if not preview_image_id:
-            continue
-        caption = f"🔹 <b>{title}</b>\n📄 {description}\n💰 Цена: {price} RUB\n"
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🛒 Купить", callback_data=f"buy_work_{work_id}")]])
-        msg = await callback.message.answer_photo(photo=preview_image_id, caption=caption, reply_markup=keyboard)
-        await add_message_id(msg, state)
+    total_pages = max((await count_works(category_id) + page_size - 1) // page_size, 1)
 
     # Навигация между страницами
     nav_buttons = []
     if page > 1:
-        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"category_{category_id}_{page-1}"))
+        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"category_{category_id}_{page-1}_b{works[0].id}"))
     if page < total_pages:
-        nav_buttons.append(InlineKeyboardButton(text="➡️ Вперед", callback_data=f"category_{category_id}_{page+1}"))
+        nav_buttons.append(InlineKeyboardButton(text="➡️ Вперед", callback_data=f"category_{category_id}_{page+1}_a{works[-1].id}"))
     nav_buttons.append(InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu"))
-    nav_keyboard = InlineKeyboardMarkup(inline_keyboard=[nav_buttons])
-    nav_msg = await callback.message.answer(f"📑 Страница {page} из {total_pages}", reply_markup=nav_keyboard)
-    await add_message_id(nav_msg, state)
+    # без превью карточку не показываем
+    shown = [work for work in works if work.preview_image_id]
+    await send_works_page(callback.message, state, shown, f"📑 Страница {page} из {total_pages}", nav_buttons, edit=edit)
     await callback.answer()
 
-# ===== Покупка работы =====
-SERVICE_USER_ID = 1  # Сервисный аккаунт
+# ===== Карточка работы =====
+def work_caption(work: Work, number: int | None = None) -> str:
+    prefix = f"{number}. " if number is not None else ""
+    return f"🔹 {prefix}<b>{work.title}</b>\n📄 {work.description}\n💰 Цена: {work.price} RUB\n"
 
-async def buy_work_handler(callback: types.CallbackQuery):
-    work_id = int(callback.data.split("_")[-1])
-    buyer_id = callback.from_user.id
+async def send_work_card(message: types.Message, work: Work, state: FSMContext):
+    caption = work_caption(work)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🛒 Купить", callback_data=f"buy_work_{work.id}")]])
+    if work.preview_image_id:
+        msg = await message.answer_photo(photo=work.preview_image_id, caption=caption, reply_markup=keyboard)
+    else:
+        msg = await message.answer(caption, reply_markup=keyboard)
+    await add_message_id(msg, state)
 
-    # Получаем покупателя
-    buyer = await get_user(buyer_id)
-    if not buyer:
-        await callback.answer("❌ Пользователь не найден.", show_alert=True)
+# ===== Страница работ =====
+# Ограничение Bot API на число элементов в sendMediaGroup
+MEDIA_GROUP_MAX = 10
+
+def page_keyboard(works: list[Work], nav_buttons: list[InlineKeyboardButton]) -> InlineKeyboardMarkup:
+    rows = [
+        [InlineKeyboardButton(text=f"🛒 {number}. {work.title} — {work.price} RUB", callback_data=f"buy_work_{work.id}")]
+        for number, work in enumerate(works, 1)
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=rows + [nav_buttons])
+
+async def send_works_page(message: types.Message, state: FSMContext, works: list[Work], header: str,
+                          nav_buttons: list[InlineKeyboardButton], edit: bool = False):
+    """
+    Показывает страницу работ в режиме CATALOG_MODE:
+    album — превью одним sendMediaGroup и одно сообщение с кнопками покупки и навигацией;
+    single — одно сообщение, edit=True меняет в нём картинку и подпись;
+    cards — отдельная карточка на каждую работу и сообщение с навигацией.
+    """
+    if CATALOG_MODE == "single":
+        await send_single_page(message, state, works, header, nav_buttons, edit)
         return
 
-    # Получаем работу
-    work = await get_work_info(work_id)
-    if not work:
-        await callback.answer("❌ Работа не найдена.", show_alert=True)
+    if CATALOG_MODE == "cards":
+        for work in works:
+            await send_work_card(message, work, state)
+        nav_msg = await message.answer(header, reply_markup=InlineKeyboardMarkup(inline_keyboard=[nav_buttons]))
+        await add_message_id(nav_msg, state)
         return
 
-    price = work['price'] if isinstance(work, dict) else work[3]
-    author_id = work['author_id'] if isinstance(work, dict) else work[7]
+    keyboard = page_keyboard(works, nav_buttons)
+    numbered = list(enumerate(works, 1))
+    with_preview = [(number, work) for number, work in numbered if work.preview_image_id]
+    if len(with_preview) == 1 and len(works) == 1:
+        # Альбом из одного фото не отправить — кнопки идут прямо под ним
+        msg = await message.answer_photo(photo=works[0].preview_image_id, caption=f"{work_caption(works[0], 1)}\n{header}",
+                                         reply_markup=keyboard)
+        await add_message_id(msg, state)
+        return
+    if len(with_preview) == 1:
+        number, work = with_preview[0]
+        msg = await message.answer_photo(photo=work.preview_image_id, caption=work_caption(work, number))
+        await add_message_id(msg, state)
+    elif with_preview:
+        album = await message.answer_media_group([
+            InputMediaPhoto(media=work.preview_image_id, caption=work_caption(work, number))
+            for number, work in with_preview
+        ])
+        for msg in album:
+            await add_message_id(msg, state)
+
+    # Работы без превью описываются в сообщении с кнопками
+    text = "\n".join([header] + [work_caption(work, number) for number, work in numbered if not work.preview_image_id])
+    msg = await message.answer(text, reply_markup=keyboard)
+    await add_message_id(msg, state)
 
-    # Проверка баланса покупателя
-    buyer_balance = buyer[2]  # balance — третий столбец
-    if buyer_balance < price:
-        await callback.answer("❌ Недостаточно средств на балансе.", show_alert=True)
+async def send_single_page(message: types.Message, state: FSMContext, works: list[Work], header: str,
+                           nav_buttons: list[InlineKeyboardButton], edit: bool):
+    keyboard = page_keyboard(works, nav_buttons)
+    caption = "\n".join([header, ""] + [
+        f"{number}. <b>{work.title}</b> — {work.price} RUB" for number, work in enumerate(works, 1)
+    ])
+    preview = next((work.preview_image_id for work in works if work.preview_image_id), None)
+    photo = preview or FSInputFile("image/catalog.jpg")
+
+    if edit and message.photo:
+        try:
+            await message.edit_media(InputMediaPhoto(media=photo, caption=caption), reply_markup=keyboard)
+            return
+        except TelegramBadRequest:
+            # Сообщение слишком старое или уже удалено — присылаем новое
+            pass
+    msg = await message.answer_photo(photo=photo, caption=caption, reply_markup=keyboard)
+    await add_message_id(msg, state)
+
+# ===== Поиск =====
+SEARCH_PAGE_SIZE = min(CATALOG_PAGE_SIZE, MEDIA_GROUP_MAX)
+
+async def show_search_page(message: types.Message, state: FSMContext, query: str, page: int, edit: bool = False):
+    works = await search_works(query, SEARCH_PAGE_SIZE + 1, (page - 1) * SEARCH_PAGE_SIZE)
+    has_next = len(works) > SEARCH_PAGE_SIZE
+    works = works[:SEARCH_PAGE_SIZE]
+
+    if not works:
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]])
+        msg = await message.answer(f"🔎 По запросу «{html.escape(query)}» ничего не найдено.", reply_markup=keyboard)
+        await add_message_id(msg, state)
         return
 
-    # Создаем запись о покупке
-    purchase_id = await create_purchase(work_id, buyer_id, price)
+    nav_buttons = []
+    if page > 1:
+        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"search_{page-1}"))
+    if has_next:
+        nav_buttons.append(InlineKeyboardButton(text="➡️ Вперед", callback_data=f"search_{page+1}"))
+    nav_buttons.append(InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu"))
+    await send_works_page(message, state, works, f"🔎 «{html.escape(query)}» — страница {page}", nav_buttons, edit=edit)
+
+async def search_handler(message: types.Message, state: FSMContext, command: CommandObject):
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("🔎 Использование: /search <тема работы>")
+        return
+    await delete_previous_messages(message, state)
+    await state.update_data(search_query=query)
+    await show_search_page(message, state, query, 1)
+
+async def search_page_handler(callback: types.CallbackQuery, state: FSMContext):
+    page = int(callback.data.split("_")[1])
+    query = (await state.get_data()).get("search_query")
+    if not query:
+        await callback.answer("❌ Поиск устарел, повторите /search", show_alert=True)
+        return
+    edit = CATALOG_MODE == "single"
+    if not edit:
+        await delete_previous_messages(callback, state)
+    await show_search_page(callback.message, state, query, page, edit=edit)
+    await callback.answer()
 
-    # Распределяем оплату между автором и сервисом
-    author_share = price * 0.7
-    service_share = price - author_share
+# ===== Покупка работы =====
+async def buy_work_handler(callback: types.CallbackQuery):
+    work_id = int(callback.data.split("_")[-1])
+    buyer_id = callback.from_user.id
 
-    async with connect(DB_NAME) as db:
-        await db.execute("UPDATE users SET balance = balance + ? WHERE id=?", (author_share, author_id))
-        await db.execute("UPDATE users SET balance = balance + ? WHERE id=?", (service_share, SERVICE_USER_ID))
-        await db.execute("UPDATE users SET balance = balance - ? WHERE id=?", (price, buyer_id))
+    result = await purchase_work(buyer_id, work_id)
+    status = result["status"]
 
-        # Обновляем статистику работы
-        await db.execute(
-            "UPDATE works SET times_sold = times_sold + 1, total_earnings = total_earnings + ? WHERE id=?",
-            (price, work_id)
+    if status == "no_user":
+        await callback.answer("❌ Пользователь не найден.", show_alert=True)
+    elif status == "no_work":
+        await callback.answer("❌ Работа не найдена.", show_alert=True)
+    elif status == "already_bought":
+        await callback.answer("✅ Вы уже купили эту работу.", show_alert=True)
+    elif status == "no_funds":
+        await callback.answer("❌ Недостаточно средств на балансе.", show_alert=True)
+    else:
+        await callback.answer(
+            f"✅ Покупка успешна!\n💰 Автор получил {result['author_share']} RUB\n🛠 Сервис: {result['service_share']} RUB",
+            show_alert=True
         )
-        # Отмечаем покупку как завершённую
-        await db.execute("UPDATE purchases SET status='completed' WHERE id=?", (purchase_id,))
-        await db.commit()
-
-    await callback.answer(f"✅ Покупка успешна!\n💰 Автор получил {author_share} RUB\n🛠 Сервис: {service_share} RUB", show_alert=True)
 
 # ===== Заявка на выплату  =====
 async def withdraw_request_handler(callback: types.CallbackQuery, state: FSMContext):
@@ -374,27 +479,25 @@ async def profile_handler(callback: types.CallbackQuery, state: FSMContext):
 
     elif callback.data == "profile_balance":
         # Показ баланса и статистики
-        balance = await get_user_balance(user_id)
         stats = await get_author_stats(user_id)
-        total_earnings = sum(work['author_income'] * work['times_sold'] for work in stats['works'])
         text = (
-            f"💰 Ваш текущий баланс: {balance} RUB\n\n"
+            f"💰 Ваш текущий баланс: {stats['balance']} RUB\n\n"
             f"📊 Общая статистика:\n"
-            f"Всего доход от работ: {total_earnings} RUB\n"
+            f"Всего доход от работ: {stats['total_earnings']} RUB\n"
             f"Всего продаж: {stats['total_times_sold']}\n"
         )
         keyboard = get_profile_menu()
 
     elif callback.data == "profile_works":
-        stats = await get_author_stats(user_id)
-        if not stats['works']:
+        works = await get_author_works(user_id)
+        if not works:
             text = "❌ Пока нет размещённых работ."
             keyboard = get_profile_menu()
         else:
             text = "📝 Ваши работы:\n"
             buttons = []
-            for work in stats['works']:
-                text += f"🔹 {work['title']} — {work['author_income']*work['times_sold']} RUB доход\n"
+            for work in works:
+                text += f"🔹 {work['title']} — продаж: {work['times_sold']}\n"
                 buttons.append([InlineKeyboardButton(
                     text=f"❌ Удалить '{work['title']}'",
                     callback_data=f"delete:{work['id']}"
@@ -457,8 +560,7 @@ async def delete_work_handler(callback: types.CallbackQuery, state: FSMContext):
         return
 
     # Обновляем меню "Мои работы"
-    stats = await get_author_stats(user_id)
-    works = stats['works']
+    works = await get_author_works(user_id)
 
     if not works:
         text = "❌ Пока нет размещённых работ."
@@ -469,7 +571,7 @@ async def delete_work_handler(callback: types.CallbackQuery, state: FSMContext):
         text = "📝 Ваши работы:\n"
         keyboard_buttons = []
         for work in works:
-            text += f"🔹 {work['title']} — {work['author_income']*work['times_sold']} RUB доход\n"
+            text += f"🔹 {work['title']} — продаж: {work['times_sold']}\n"
             keyboard_buttons.append([InlineKeyboardButton(
                 text=f"❌ Удалить '{work['title']}'",
                 callback_data=f"delete:{work['id']}"
@@ -612,6 +714,9 @@ async def work_files(message: types.Message, state: FSMContext):
 # ===== Регистрация хендлеров =====
 def register_handlers(dp: Dispatcher):
     dp.message.register(start, Command("start"))
+    dp.chat_member.register(channel_member_handler, lambda e: is_subscription_channel(e.chat))
+    dp.message.register(search_handler, Command("search"))
+    dp.callback_query.register(search_page_handler, lambda c: c.data.startswith("search_"))
     dp.callback_query.register(main_menu, lambda c: c.data == "main_menu")
     dp.callback_query.register(catalog_handler, lambda c: c.data == "catalog")
     dp.callback_query.register(category_handler, lambda c: c.data.startswith("category_"))
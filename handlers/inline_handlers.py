@@ -0,0 +1,70 @@
+import re
+from aiogram import Dispatcher
+from aiogram.types import (
+    InlineQuery, InlineQueryResultCachedPhoto, InlineQueryResultArticle,
+    InputTextMessageContent, InlineKeyboardMarkup, InlineKeyboardButton
+)
+from config import BOT_USERNAME, INLINE_PAGE_SIZE, INLINE_CACHE_TTL
+from database.models import Work
+from services.work_service import search_works, get_latest_works
+from utils.cache import TTLCache
+
+# (нормализованный запрос, offset) -> (результаты, next_offset)
+inline_cache = TTLCache(ttl=INLINE_CACHE_TTL, maxsize=2048)
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def buy_link(work_id: int) -> str:
+    return f"https://t.me/{BOT_USERNAME}?start=buy_{work_id}"
+
+def build_inline_result(work: Work):
+    short_description = (work.description or "")[:200]
+    caption = f"🔹 <b>{work.title}</b>\n📄 {short_description}\n💰 Цена: {work.price} RUB"
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🛒 Купить", url=buy_link(work.id))]])
+    if work.preview_image_id:
+        return InlineQueryResultCachedPhoto(
+            id=str(work.id),
+            photo_file_id=work.preview_image_id,
+            title=work.title,
+            description=f"{work.price} RUB",
+            caption=caption,
+            reply_markup=keyboard
+        )
+    return InlineQueryResultArticle(
+        id=str(work.id),
+        title=work.title,
+        description=f"💰 {work.price} RUB · {short_description[:60]}",
+        input_message_content=InputTextMessageContent(message_text=caption),
+        reply_markup=keyboard
+    )
+
+async def load_inline_page(query: str, offset: int):
+    if query:
+        works = await search_works(query, INLINE_PAGE_SIZE + 1, offset)
+    else:
+        works = await get_latest_works(INLINE_PAGE_SIZE + 1, offset)
+    next_offset = str(offset + INLINE_PAGE_SIZE) if len(works) > INLINE_PAGE_SIZE else ""
+    return [build_inline_result(work) for work in works[:INLINE_PAGE_SIZE]], next_offset
+
+# ===== Inline-каталог: @bot <запрос> =====
+async def inline_catalog(inline_query: InlineQuery):
+    query = normalize_query(inline_query.query)
+    try:
+        offset = int(inline_query.offset or 0)
+    except ValueError:
+        offset = 0
+
+    results, next_offset = await inline_cache.get_or_load(
+        (query, offset), lambda: load_inline_page(query, offset)
+    )
+    await inline_query.answer(
+        results,
+        cache_time=int(INLINE_CACHE_TTL),
+        is_personal=False,
+        next_offset=next_offset
+    )
+
+# ===== Регистрация хендлеров =====
+def register_handlers(dp: Dispatcher):
+    dp.inline_query.register(inline_catalog)
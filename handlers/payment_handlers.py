@@ -1,9 +1,11 @@
 from aiogram import types, F, Router, Dispatcher
 import re
 from config import ADMIN_IDS
-from database.queries import get_purchase_info, update_purchase_status, get_work_info, get_work_files, update_balance
+from database.queries import get_purchase_info, complete_purchase
+from services.work_service import get_work_files
 from aiogram.types import Message
 from aiogram import Bot
+from utils.send_scheduler import send_lane, Lane
 
 router = Router()
 
@@ -23,18 +25,27 @@ async def process_payment_sms(message: Message, bot: Bot):
     if not purchase_info:
         await message.answer("❌ Покупка с указанным ID не найдена.")
         return
-    purchase_id, work_id, buyer_id, amount, status, payment_proof = purchase_info
-    if status == 'completed':
+    if purchase_info.status == 'completed':
         await message.answer("✅ Эта покупка уже была обработана ранее.")
         return
-    await update_purchase_status(purchase_id, 'completed', message.text)
-    work_info = await get_work_info(work_id)
-    if work_info:
-        work_id, title, description, price, author_income, category, subcategory, username, user_id, preview_image_id, times_sold, total_earnings = work_info
-        await update_balance(user_id, author_income)
-        files = await get_work_files(work_id)
-        for file_id, file_name in files:
-            await bot.send_document(buyer_id, file_id, caption=f"📎 {file_name}")
-        await bot.send_message(buyer_id, f"✅ Оплата получена! Работа \"{title}\" теперь доступна для вас.")
-        await bot.send_message(user_id, f"✅ Ваша работа \"{title}\" была продана за {price} руб. На ваш баланс зачислено {author_income} руб.")
+    # Статус, зачисление автору, проводки и статистика — одной транзакцией
+    sale = await complete_purchase(purchase_id, proof=message.text)
+    if sale["status"] == "not_found":
+        await message.answer("❌ Покупка с указанным ID не найдена.")
+        return
+    if sale["status"] == "already_completed":
+        await message.answer("✅ Эта покупка уже была обработана ранее.")
+        return
+    buyer_id = sale["buyer_id"]
+    if sale["work_missing"]:
+        await message.answer(f"⚠️ Покупка {purchase_id} отмечена оплаченной, но работа удалена из базы: "
+                             f"файлы отправить нельзя, автору ничего не зачислено.")
+        return
+    files = await get_work_files(sale["work_id"])
+    # Покупателю и автору — уведомления, они пропускают вперёд ответы на действия
+    with send_lane(Lane.NOTIFICATION):
+        for file in files:
+            await bot.send_document(buyer_id, file.file_id, caption=f"📎 {file.file_name}")
+        await bot.send_message(buyer_id, f"✅ Оплата получена! Работа \"{sale['title']}\" теперь доступна для вас.")
+        await bot.send_message(sale["author_id"], f"✅ Ваша работа \"{sale['title']}\" была продана за {sale['price']} руб. На ваш баланс зачислено {sale['author_share']} руб.")
     await message.answer(f"✅ Покупка {purchase_id} обработана. Файлы отправлены покупателю.")
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import time
+
+from config import ADMIN_STATS_TTL
+from services.work_service import get_category_stats
+
+logger = logging.getLogger(__name__)
+
+
+class StatsSnapshot:
+    """
+    Снимок админ-статистики с коротким TTL.
+    Устаревший снимок отдаётся сразу, а обновление идёт в фоне.
+    """
+
+    __slots__ = ("per_category", "total_users", "created_at")
+
+    def __init__(self, per_category: dict, total_users: int):
+        self.per_category = per_category
+        self.total_users = total_users
+        self.created_at = time.time()
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+
+_snapshot: StatsSnapshot | None = None
+_refresh_task: asyncio.Task | None = None
+
+async def refresh_stats_snapshot() -> StatsSnapshot:
+    global _snapshot
+    per_category, total_users = await get_category_stats()
+    _snapshot = StatsSnapshot(per_category, total_users)
+    return _snapshot
+
+def _schedule_refresh():
+    global _refresh_task
+    if _refresh_task is not None and not _refresh_task.done():
+        return
+    _refresh_task = asyncio.create_task(refresh_stats_snapshot())
+    _refresh_task.add_done_callback(_log_refresh_error)
+
+def _log_refresh_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logger.error(f"❌ Ошибка обновления статистики: {task.exception()}")
+
+async def get_stats_snapshot() -> StatsSnapshot:
+    if _snapshot is None:
+        return await refresh_stats_snapshot()
+    if _snapshot.age > ADMIN_STATS_TTL:
+        _schedule_refresh()
+    return _snapshot
@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import logging
+import os
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendPhoto, EditMessageMedia
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+
+from database.pool import reader
+from database.write_queue import enqueue_write
+
+logger = logging.getLogger(__name__)
+
+ASSETS_DIR = "image"
+# Ответы Telegram, означающие, что сохранённый file_id больше не действует
+STALE_FILE_ID_ERRORS = ("wrong file identifier", "wrong remote file identifier", "file reference expired", "file_reference_")
+
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _is_stale_file_id(error: TelegramBadRequest) -> bool:
+    message = error.message.lower()
+    return any(marker in message for marker in STALE_FILE_ID_ERRORS)
+
+
+class AssetRegistry:
+    """
+    file_id статичных картинок из image/.
+    Каждая картинка загружается в Telegram один раз; file_id хранится в таблице
+    assets вместе с sha256 содержимого, так что замена файла сбрасывает запись.
+    """
+
+    def __init__(self, directory: str = ASSETS_DIR):
+        self.directory = directory
+        self.hashes: dict[str, str] = {}
+        self.file_ids: dict[str, str] = {}
+        self._upload_locks: dict[str, asyncio.Lock] = {}
+        self.metrics = {"cached": 0, "uploads": 0, "stale": 0}
+
+    @staticmethod
+    def key(path: str) -> str:
+        return os.path.normpath(path)
+
+    async def load(self):
+        self.hashes = {
+            self.key(os.path.join(self.directory, name)): _file_hash(os.path.join(self.directory, name))
+            for name in sorted(os.listdir(self.directory))
+            if os.path.isfile(os.path.join(self.directory, name))
+        } if os.path.isdir(self.directory) else {}
+        async with reader("load_assets") as db:
+            cursor = await db.execute("SELECT path, sha256, file_id FROM assets")
+            rows = await cursor.fetchall()
+        self.file_ids = {path: file_id for path, sha256, file_id in rows if self.hashes.get(path) == sha256}
+        logger.info(f"🖼 Картинок: {len(self.hashes)}, с file_id: {len(self.file_ids)}")
+
+    def known(self, path: str) -> bool:
+        return self.key(path) in self.hashes
+
+    def get(self, path: str) -> str | None:
+        return self.file_ids.get(self.key(path))
+
+    def upload_lock(self, path: str) -> asyncio.Lock:
+        return self._upload_locks.setdefault(self.key(path), asyncio.Lock())
+
+    async def store(self, path: str, file_id: str):
+        key = self.key(path)
+        self.file_ids[key] = file_id
+        await enqueue_write(
+            """
+            INSERT INTO assets(path, sha256, file_id, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(path) DO UPDATE SET sha256 = excluded.sha256, file_id = excluded.file_id,
+                                            updated_at = excluded.updated_at
+            """,
+            (key, self.hashes[key], file_id)
+        )
+
+    def forget(self, path: str):
+        self.file_ids.pop(self.key(path), None)
+
+
+asset_registry = AssetRegistry()
+
+async def load_assets():
+    await asset_registry.load()
+
+
+class AssetMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии Bot: sendPhoto и editMessageMedia с FSInputFile из image/
+    отправляются по сохранённому file_id, а при первой загрузке file_id запоминается.
+    Хендлеры по-прежнему передают FSInputFile("image/...").
+    """
+
+    def __init__(self, registry: AssetRegistry = asset_registry):
+        self.registry = registry
+
+    async def __call__(self, make_request, bot, method):
+        path = self._asset_path(method)
+        if path is None:
+            return await make_request(bot, method)
+
+        file_id = self.registry.get(path)
+        if file_id is None:
+            # Одна загрузка на картинку: остальные ждут и берут готовый file_id
+            async with self.registry.upload_lock(path):
+                file_id = self.registry.get(path)
+                if file_id is None:
+                    return await self._upload(make_request, bot, method, path)
+
+        try:
+            result = await make_request(bot, self._with_file_id(method, file_id))
+            self.registry.metrics["cached"] += 1
+            return result
+        except TelegramBadRequest as e:
+            # Загружаем заново, только если file_id больше не действует (например, сменился
+            # токен бота); остальные ошибки (чат, подпись, клавиатура) повторная загрузка не исправит
+            if not _is_stale_file_id(e):
+                raise
+            self.registry.metrics["stale"] += 1
+            self.registry.forget(path)
+            return await self._upload(make_request, bot, method, path)
+
+    def _asset_path(self, method) -> str | None:
+        if isinstance(method, SendPhoto):
+            file = method.photo
+        elif isinstance(method, EditMessageMedia) and isinstance(method.media, InputMediaPhoto):
+            file = method.media.media
+        else:
+            return None
+        if isinstance(file, FSInputFile) and self.registry.known(str(file.path)):
+            return str(file.path)
+        return None
+
+    @staticmethod
+    def _with_file_id(method, file_id: str):
+        if isinstance(method, SendPhoto):
+            return method.model_copy(update={"photo": file_id})
+        return method.model_copy(update={"media": method.media.model_copy(update={"media": file_id})})
+
+    async def _upload(self, make_request, bot, method, path: str):
+        result = await make_request(bot, method)
+        self.registry.metrics["uploads"] += 1
+        # Правка inline-сообщения возвращает True, а не сообщение
+        if isinstance(result, Message) and result.photo:
+            await self.registry.store(path, result.photo[-1].file_id)
+        return result
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+from config import BROADCAST_CHUNK, BROADCAST_CONCURRENCY
+from database.models import Broadcast, fetch_one, fetch_all
+from database.pool import reader, writer
+from utils.send_scheduler import send_lane, Lane
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcaster:
+    """
+    Рассылка по всем пользователям, не заблокировавшим бота.
+    Получатели читаются порциями по chunk_size по возрастанию id, начиная
+    с контрольной точки broadcasts.last_user_id, так что в памяти не больше
+    одной порции. После каждой порции контрольная точка и счётчики
+    сохраняются одной транзакцией: после перезапуска рассылка продолжается
+    со следующей порции. Темп задаёт планировщик отправки (очередь BROADCAST).
+    Перед каждой порцией статус перечитывается: рассылку может отменить другой
+    процесс бота. owner — номер воркера супервизора, который ведёт рассылку.
+    """
+
+    def __init__(self, chunk_size: int = 100, concurrency: int = 10):
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.owner = 0
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._stopping = False
+
+    async def start(self, bot: Bot, text: str | None, photo: str | None, created_by: int) -> int:
+        async with reader("count_broadcast_recipients") as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM users WHERE COALESCE(is_blocked, 0) = 0")
+            total = (await cursor.fetchone())[0]
+        async with writer("create_broadcast") as db:
+            cursor = await db.execute(
+                "INSERT INTO broadcasts(text, photo, created_by, total, owner) VALUES (?, ?, ?, ?, ?)",
+                (text, photo, created_by, total, self.owner)
+            )
+            broadcast_id = cursor.lastrowid
+        self._launch(bot, broadcast_id)
+        return broadcast_id
+
+    async def resume(self, bot: Bot, owner: int = 0, owners: int = 1):
+        """
+        Продолжает рассылки, прерванные остановкой бота или падением воркера owner
+        из owners. Рассылки воркеров, которых больше нет, достаются воркеру owner % owners.
+        """
+        self.owner = owner
+        async with reader("resume_broadcasts") as db:
+            cursor = await db.execute(
+                "SELECT id FROM broadcasts WHERE status = 'running' AND owner % ? = ?", (owners, owner)
+            )
+            ids = [row[0] for row in await cursor.fetchall()]
+        for broadcast_id in ids:
+            logger.info(f"📢 Продолжаем рассылку #{broadcast_id}")
+            self._launch(bot, broadcast_id)
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        async with writer("cancel_broadcast") as db:
+            cursor = await db.execute(
+                "UPDATE broadcasts SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+                (broadcast_id,)
+            )
+            cancelled = cursor.rowcount > 0
+        task = self._tasks.get(broadcast_id)
+        if task is not None:
+            task.cancel()
+        return cancelled
+
+    async def stop(self, timeout: float = 10):
+        """
+        Останавливает рассылки при остановке бота: текущая порция дописывается
+        (не дольше timeout), статус running остаётся для resume.
+        """
+        self._stopping = True
+        tasks = list(self._tasks.values())
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _launch(self, bot: Bot, broadcast_id: int):
+        if broadcast_id in self._tasks:
+            return
+        self._stopping = False
+        task = asyncio.create_task(self._run(bot, broadcast_id), name=f"broadcast-{broadcast_id}")
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda t: self._done(broadcast_id, t))
+
+    def _done(self, broadcast_id: int, task: asyncio.Task):
+        self._tasks.pop(broadcast_id, None)
+        if not task.cancelled() and task.exception():
+            logger.error(f"❌ Рассылка #{broadcast_id} прервана: {task.exception()}")
+
+    # ===== Отправка =====
+    async def _run(self, bot: Bot, broadcast_id: int):
+        async with reader("load_broadcast") as db:
+            broadcast = await fetch_one(
+                db, Broadcast, "SELECT id, text, photo, created_by, last_user_id FROM broadcasts WHERE id = ?",
+                (broadcast_id,)
+            )
+        last_user_id = broadcast.last_user_id
+        semaphore = asyncio.Semaphore(self.concurrency)
+        cancelled = False
+
+        async def deliver(user_id: int) -> str:
+            async with semaphore:
+                return await self._send(bot, broadcast, user_id)
+
+        with send_lane(Lane.BROADCAST):
+            while not self._stopping:
+                async with reader("broadcast_recipients") as db:
+                    cursor = await db.execute("SELECT status FROM broadcasts WHERE id = ?", (broadcast_id,))
+                    if (await cursor.fetchone())[0] != "running":
+                        cancelled = True
+                        break
+                    cursor = await db.execute(
+                        "SELECT id FROM users WHERE id > ? AND COALESCE(is_blocked, 0) = 0 ORDER BY id LIMIT ?",
+                        (last_user_id, self.chunk_size)
+                    )
+                    user_ids = [row[0] for row in await cursor.fetchall()]
+                if not user_ids:
+                    break
+
+                results = await asyncio.gather(*(deliver(user_id) for user_id in user_ids))
+                blocked = [(user_id,) for user_id, result in zip(user_ids, results) if result == "blocked"]
+                last_user_id = user_ids[-1]
+                async with writer("broadcast_checkpoint") as db:
+                    if blocked:
+                        await db.executemany("UPDATE users SET is_blocked = 1 WHERE id = ?", blocked)
+                    cursor = await db.execute("""
+                        UPDATE broadcasts
+                        SET last_user_id = ?, sent = sent + ?, failed = failed + ?, blocked = blocked + ?
+                        WHERE id = ? AND status = 'running'
+                    """, (last_user_id, results.count("sent"), results.count("failed"), len(blocked), broadcast_id))
+                    if cursor.rowcount == 0:
+                        # Отменена во время отправки порции
+                        cancelled = True
+                        break
+
+        if self._stopping or cancelled:
+            return
+        async with writer("finish_broadcast") as db:
+            await db.execute(
+                "UPDATE broadcasts SET status = 'done', finished_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+                (broadcast_id,)
+            )
+        done = await get_broadcast(broadcast_id)
+        logger.info(f"📢 Рассылка #{broadcast_id} завершена: {done.sent} отправлено, {done.blocked} заблокировали бота, {done.failed} ошибок")
+        if broadcast.created_by:
+            try:
+                with send_lane(Lane.NOTIFICATION):
+                    await bot.send_message(
+                        broadcast.created_by,
+                        f"📢 Рассылка #{broadcast_id} завершена\n✅ Отправлено: {done.sent}\n"
+                        f"🚫 Заблокировали бота: {done.blocked}\n⚠️ Ошибок: {done.failed}"
+                    )
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось сообщить об окончании рассылки #{broadcast_id}: {e}")
+
+    async def _send(self, bot: Bot, broadcast: Broadcast, user_id: int) -> str:
+        try:
+            if broadcast.photo:
+                await bot.send_photo(user_id, photo=broadcast.photo, caption=broadcast.text)
+            else:
+                await bot.send_message(user_id, broadcast.text)
+            return "sent"
+        except TelegramForbiddenError:
+            # Бот заблокирован или аккаунт удалён
+            return "blocked"
+        except Exception as e:
+            logger.debug(f"Рассылка #{broadcast.id}: не удалось отправить {user_id}: {e}")
+            return "failed"
+
+
+# ===== Глобальный рассыльщик процесса =====
+broadcaster = Broadcaster(BROADCAST_CHUNK, BROADCAST_CONCURRENCY)
+
+async def resume_broadcasts(bot: Bot, owner: int = 0, owners: int = 1):
+    await broadcaster.resume(bot, owner, owners)
+
+async def stop_broadcasts():
+    await broadcaster.stop()
+
+async def get_broadcast(broadcast_id: int) -> Broadcast | None:
+    async with reader("get_broadcast") as db:
+        return await fetch_one(db, Broadcast, "SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+
+async def get_recent_broadcasts(limit: int = 5) -> list[Broadcast]:
+    async with reader("get_recent_broadcasts") as db:
+        return await fetch_all(db, Broadcast, "SELECT * FROM broadcasts ORDER BY id DESC LIMIT ?", (limit,))
@@ -0,0 +1,62 @@
+import asyncio
+import time
+from types import MappingProxyType
+
+from config import CATEGORY_TREE_TTL
+from database.pool import reader
+
+
+class CategoryTree:
+    """
+    Неизменяемый снимок дерева категорий.
+    nodes: id -> (id, name, parent_id)
+    children: parent_id -> ((id, name), ...)
+    """
+
+    __slots__ = ("rows", "nodes", "children", "roots")
+
+    def __init__(self, rows: list[tuple]):
+        self.rows = tuple(rows)
+        self.nodes = MappingProxyType({row[0]: row for row in self.rows})
+        children = {}
+        for cat_id, name, parent_id in self.rows:
+            if parent_id:
+                children.setdefault(parent_id, []).append((cat_id, name))
+        self.children = MappingProxyType({parent: tuple(subs) for parent, subs in children.items()})
+        self.roots = tuple(row for row in self.rows if row[2] is None)
+
+    def get(self, category_id: int):
+        return self.nodes.get(category_id)
+
+    def subcategories(self, parent_id: int) -> tuple:
+        return self.children.get(parent_id, ())
+
+
+_tree: CategoryTree | None = None
+_loaded_at = 0.0
+_reload_lock = asyncio.Lock()
+_refresh: asyncio.Task | None = None
+
+async def load_category_tree() -> CategoryTree:
+    """Перечитывает категории из базы и атомарно подменяет снимок."""
+    global _tree, _loaded_at
+    async with _reload_lock:
+        async with reader("load_category_tree") as db:
+            cursor = await db.execute("SELECT id, name, parent_id FROM categories ORDER BY id")
+            rows = await cursor.fetchall()
+        _tree = CategoryTree(rows)
+        _loaded_at = time.monotonic()
+        return _tree
+
+async def get_category_tree() -> CategoryTree:
+    """
+    Текущий снимок. Раз в CATEGORY_TREE_TTL секунд он перечитывается в фоне:
+    категории могли поменять другие процессы бота.
+    """
+    global _refresh
+    if _tree is None:
+        return await load_category_tree()
+    stale = CATEGORY_TREE_TTL > 0 and time.monotonic() - _loaded_at > CATEGORY_TREE_TTL
+    if stale and (_refresh is None or _refresh.done()):
+        _refresh = asyncio.create_task(load_category_tree())
+    return _tree
@@ -1,194 +1,281 @@
-import aiosqlite
-import asyncio
+import re
 from aiogram import Bot
 from aiogram.types import FSInputFile
-from config import DB_PATH, CHANNEL_ID, DB_NAME
+from config import CHANNEL_ID, AUTHOR_SHARE, SEARCH_CANDIDATES
+from database.pool import reader, writer
+from database.models import Work, FileRef, columns_of, fetch_one, fetch_all
+from database.write_queue import enqueue_write, enqueue_transaction
+from services.category_tree import get_category_tree, load_category_tree
 
-# ===== Инициализация базы (PRAGMA WAL и foreign keys) =====
-async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("PRAGMA journal_mode=WAL;")
-        await db.execute("PRAGMA foreign_keys=ON;")
-        await db.commit()
-
-# ===== Получение списка категорий =====
+# ===== Получение списка категорий (из кэша дерева) =====
 async def get_categories():
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id, name, parent_id FROM categories")
-        return await cursor.fetchall()
+    tree = await get_category_tree()
+    return list(tree.rows)  # [(id, name, parent_id)]
 
 # ===== Получение категорий с вложенными подкатегориями =====
 async def get_categories_with_subcategories():
-    categories = await get_categories()  # [(id, name, parent_id)]
-    
-    # Словарь: parent_id -> список подкатегорий
-    subcats_dict = {}
-    for cat_id, name, parent_id in categories:
-        if parent_id:
-            subcats_dict.setdefault(parent_id, []).append((cat_id, name))
-    
-    # Список только верхних категорий с вложенными подкатегориями
-    result = []
-    for cat_id, name, parent_id in categories:
-        if parent_id is None:
-            subs = subcats_dict.get(cat_id, [])
-            result.append((cat_id, name, subs))  # (id, name, [подкатегории])
-    return result
+    tree = await get_category_tree()
+    # (id, name, [подкатегории]) только для верхних категорий
+    return [(cat_id, name, list(tree.subcategories(cat_id))) for cat_id, name, _ in tree.roots]
 
 # ===== Добавление категории =====
 async def add_category(name: str, parent_id: int = None):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with writer("add_category") as db:
         await db.execute(
             "INSERT INTO categories (name, parent_id) VALUES (?, ?)",
             (name, parent_id)
         )
-        await db.commit()
+    await load_category_tree()
 
 # ===== Удаление категории =====
 async def delete_category(category_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with writer("delete_category") as db:
         await db.execute("DELETE FROM categories WHERE id = ?", (category_id,))
-        await db.commit()
+    await load_category_tree()
+
+# Колонки карточки каталога: без автора, счётчиков и статуса
+WORK_CARD_COLUMNS = "id, title, description, price, preview_image_id"
+WORK_COLUMNS = columns_of(Work)
 
-# ===== Получение списка работ по категории =====
-async def get_works(category_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
+# ===== Постраничный список работ категории (keyset по id DESC) =====
+_WORKS_PAGE_ARM = """
+    SELECT id FROM works
+    WHERE {column} = ? AND status='approved' AND is_deleted = 0 AND id {op} ?
+    ORDER BY id {order} LIMIT ?
+"""
+
+async def get_works_page(category_id: int, limit: int, after_id: int | None = None, before_id: int | None = None):
+    """
+    Возвращает одну страницу одобренных работ категории (новые сверху).
+    after_id — последний id предыдущей страницы (листаем вперёд),
+    before_id — первый id следующей страницы (листаем назад).
+    """
+    if before_id is not None:
+        op, order, cursor_id = ">", "ASC", before_id
+    else:
+        op, order, cursor_id = "<", "DESC", after_id if after_id is not None else 2**63 - 1
+
+    category_arm = _WORKS_PAGE_ARM.format(column="category_id", op=op, order=order)
+    subcategory_arm = _WORKS_PAGE_ARM.format(column="subcategory_id", op=op, order=order)
+    async with reader("get_works_page") as db:
+        rows = await fetch_all(db, Work, f"""
+            SELECT {WORK_CARD_COLUMNS}
+            FROM works
+            WHERE id IN (
+                SELECT id FROM ({category_arm})
+                UNION
+                SELECT id FROM ({subcategory_arm})
+            )
+            ORDER BY id {order} LIMIT ?
+        """, (category_id, cursor_id, limit, category_id, cursor_id, limit, limit))
+    if before_id is not None:
+        rows.reverse()
+    return rows
+
+async def count_works(category_id: int) -> int:
+    async with reader("count_works") as db:
         cursor = await db.execute("""
-            SELECT id, title, description, price, author_income, category_id, subcategory_id, author_id, preview_image_id
-            FROM works 
+            SELECT COUNT(*) FROM works
             WHERE (category_id = ? OR subcategory_id = ?) AND status='approved' AND is_deleted = 0
-            ORDER BY id DESC
         """, (category_id, category_id))
-        return await cursor.fetchall()
-    
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
+# ===== Последние одобренные работы =====
+async def get_latest_works(limit: int, offset: int = 0):
+    async with reader("get_latest_works") as db:
+        return await fetch_all(db, Work, f"""
+            SELECT {WORK_CARD_COLUMNS}
+            FROM works
+            WHERE status='approved' AND is_deleted = 0
+            ORDER BY id DESC
+            LIMIT ? OFFSET ?
+        """, (limit, offset))
+
+# ===== Полнотекстовый поиск (FTS5) =====
+# Окончания русских слов, от длинных к коротким
+_ENDINGS = sorted("""
+    ями ами ого его ому ему ыми ими ых их ой ей ий ый ая яя ое ее ие ые ую юю ия ию ью
+    ам ям ах ях ом ем ов ев ы и а я о е у ю ь
+""".split(), key=len, reverse=True)
+# Короче основу не режем: «право» не должно находить «правительство»
+_MIN_STEM = 5
+
+def _stem(word: str) -> str:
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+def build_search_query(text: str, max_terms: int = 8) -> str:
+    """
+    Превращает ввод пользователя в FTS5-запрос: каждое слово ищется по префиксу,
+    у длинных слов отрезается известное окончание, чтобы «курсовая» находила «курсовые».
+    """
+    terms = [f'"{_stem(word)}"*' for word in re.findall(r"\w+", text.lower())[:max_terms]]
+    return " ".join(terms)
+
+async def search_works(text: str, limit: int, offset: int = 0):
+    """
+    Одобренные работы по релевантности BM25 (заголовок весит больше описания).
+    В works_fts только видимые работы; с works соединяются лишь лучшие кандидаты.
+    """
+    match = build_search_query(text)
+    if not match:
+        return []
+    candidates = max(SEARCH_CANDIDATES, offset + limit)
+    async with reader("search_works") as db:
+        return await fetch_all(db, Work, """
+            SELECT w.id, w.title, w.description, w.price, w.preview_image_id
+            FROM (
+                SELECT rowid, rank FROM works_fts
+                WHERE works_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            ) AS found
+            JOIN works w ON w.id = found.rowid
+            ORDER BY found.rank
+            LIMIT ? OFFSET ?
+        """, (match, candidates, limit, offset))
+
 # ===== Получение информации о работе =====
-async def get_work_info(work_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("""
-            SELECT id, title, description, price, author_income, category_id, subcategory_id, author_id, preview_image_id, times_sold, total_earnings, status
+async def get_work_info(work_id: int, *fields: str) -> Work | None:
+    """
+    Работа по id с выборкой только нужных колонок:
+    get_work_info(work_id, "title", "author_id"). Без fields — все колонки.
+    """
+    columns = fields or WORK_COLUMNS
+    unknown = set(columns) - set(WORK_COLUMNS)
+    if unknown:
+        raise ValueError(f"Неизвестные колонки works: {unknown}")
+    if "id" not in columns:
+        columns = ("id", *columns)
+    async with reader("get_work_info") as db:
+        return await fetch_one(db, Work, f"""
+            SELECT {", ".join(columns)}
             FROM works 
             WHERE id = ? AND is_deleted = 0
         """, (work_id,))
-        return await cursor.fetchone()
 
 # ===== Получение файлов работы =====
-async def get_work_files(work_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT file_id, file_name FROM files WHERE work_id = ?", (work_id,))
-        return await cursor.fetchall()
+async def get_work_files(work_id: int) -> list[FileRef]:
+    async with reader("get_work_files") as db:
+        return await fetch_all(db, FileRef, "SELECT file_id, file_name FROM files WHERE work_id = ?", (work_id,))
 
 # ===== Сохранение работы =====
 async def save_work(author_id: int, data: dict):
-    retries = 5
-    for attempt in range(retries):
-        try:
-            async with aiosqlite.connect(DB_PATH) as db:
-                cursor = await db.execute("""
-                    INSERT INTO works 
-                    (title, description, price, author_income, category_id, subcategory_id, author_id, preview_image_id, times_sold, total_earnings, status)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    data['title'],
-                    data['description'],
-                    data['price'],
-                    round(data['price'] * 0.8, 2),
-                    data.get('category_id'),
-                    data.get('subcategory_id'),
-                    author_id,
-                    data.get('preview'),
-                    0,
-                    0,
-                    'pending'
-                ))
-                work_id = cursor.lastrowid
-
-                for file_id, file_name in data.get('files', []):
-                    await db.execute(
-                        "INSERT INTO files (work_id, file_id, file_name) VALUES (?, ?, ?)",
-                        (work_id, file_id, file_name)
-                    )
-
-                await db.commit()
-                return work_id
-
-        except aiosqlite.OperationalError as e:
-            if "database is locked" in str(e) and attempt < retries - 1:
-                await asyncio.sleep(0.1)
-                continue
-            else:
-                raise
+    """Работа и её файлы пишутся одной операцией очереди записи."""
+    def save(db):
+        cursor = db.execute("""
+            INSERT INTO works 
+            (title, description, price, author_income, category_id, subcategory_id, author_id, preview_image_id, times_sold, total_earnings, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            data['title'],
+            data['description'],
+            data['price'],
+            round(data['price'] * AUTHOR_SHARE, 2),
+            data.get('category_id'),
+            data.get('subcategory_id'),
+            author_id,
+            data.get('preview'),
+            0,
+            0,
+            'pending'
+        ))
+        work_id = cursor.lastrowid
+        db.executemany(
+            "INSERT INTO files (work_id, file_id, file_name) VALUES (?, ?, ?)",
+            [(work_id, file_id, file_name) for file_id, file_name in data.get('files', [])]
+        )
+        return work_id
+
+    return await enqueue_transaction(save, "save_work")
 
 # ===== Получение баланса пользователя =====
 async def get_user_balance(user_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with reader("get_user_balance") as db:
         cursor = await db.execute("SELECT balance FROM users WHERE id = ?", (user_id,))
         row = await cursor.fetchone()
-        if row:
-            return row[0]
-        else:
-            await db.execute("INSERT INTO users (id, balance) VALUES (?, ?)", (user_id, 0))
-            await db.commit()
-            return 0
+    if row:
+        return row[0]
+    await enqueue_write("INSERT OR IGNORE INTO users (id, balance) VALUES (?, ?)", (user_id, 0))
+    return 0
 
 # ===== Получение статистики автора =====
 async def get_author_stats(user_id: int):
-    async with aiosqlite.connect(DB_NAME) as db:
+    """
+    Баланс и сводка автора одним поиском по первичному ключу.
+    Сводка author_stats обновляется в тех же транзакциях, что и продажи/работы.
+    """
+    async with reader("get_author_stats") as db:
         cursor = await db.execute("""
-            SELECT id, title, author_income, times_sold 
-            FROM works 
+            SELECT u.balance, s.works_count, s.sales_count, s.earnings
+            FROM users u
+            LEFT JOIN author_stats s ON s.author_id = u.id
+            WHERE u.id = ?
+        """, (user_id,))
+        row = await cursor.fetchone()
+    if not row:
+        await enqueue_write("INSERT OR IGNORE INTO users (id, balance) VALUES (?, ?)", (user_id, 0))
+        row = (0, 0, 0, 0)
+    balance, works_count, sales_count, earnings = row
+    return {
+        "balance": balance or 0,
+        "works_count": works_count or 0,
+        "total_times_sold": sales_count or 0,
+        "total_earnings": round(earnings or 0, 2),
+    }
+
+# ===== Работы автора с числом продаж =====
+async def get_author_works(user_id: int):
+    async with reader("get_author_works") as db:
+        cursor = await db.execute("""
+            SELECT id, title, times_sold
+            FROM works
             WHERE author_id=? AND is_deleted = 0
+            ORDER BY id DESC
         """, (user_id,))
         rows = await cursor.fetchall()
-        works = [{"id": r[0], "title": r[1], "author_income": r[2], "times_sold": r[3]} for r in rows]
-        total_times_sold = sum(r[3] for r in rows)
-        return {"works": works, "total_times_sold": total_times_sold}
+        return [{"id": r[0], "title": r[1], "times_sold": r[2]} for r in rows]
 
 # ===== Модерация работ =====
-async def get_pending_works():
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id, title, author_id FROM works WHERE status='pending' AND is_deleted = 0 ORDER BY id DESC")
-        return await cursor.fetchall()
+async def get_pending_works() -> list[Work]:
+    async with reader("get_pending_works") as db:
+        return await fetch_all(db, Work, "SELECT id, title, author_id FROM works WHERE status='pending' AND is_deleted = 0 ORDER BY id DESC")
 
 async def approve_work(work_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE works SET status='approved' WHERE id = ?", (work_id,))
-        await db.commit()
+    await enqueue_write("UPDATE works SET status='approved' WHERE id = ?", (work_id,))
 
 async def reject_work(work_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE works SET status='rejected' WHERE id = ?", (work_id,))
-        await db.commit()
+    await enqueue_write("UPDATE works SET status='rejected' WHERE id = ?", (work_id,))
 
 # ===== Обновление полей работы =====
 async def update_work_title(work_id: int, new_title: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE works SET title = ? WHERE id = ?", (new_title, work_id))
-        await db.commit()
+    await enqueue_write("UPDATE works SET title = ? WHERE id = ?", (new_title, work_id))
 
 async def update_work_description(work_id: int, new_description: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE works SET description = ? WHERE id = ?", (new_description, work_id))
-        await db.commit()
+    await enqueue_write("UPDATE works SET description = ? WHERE id = ?", (new_description, work_id))
 # ===== Статистика =====
-async def get_users_count(category_id: int) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("""
-            SELECT COUNT(DISTINCT author_id) FROM works WHERE category_id = ?
-        """, (category_id,))
-        row = await cursor.fetchone()
-        return row[0] if row else 0
-
-async def get_works_count(category_id: int) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+async def get_category_stats() -> tuple[dict[int, tuple[int, int, int]], int]:
+    """
+    Все цифры админ-статистики одним проходом по works:
+    {category_id: (авторов, работ, продаж)} и общее число пользователей.
+    """
+    async with reader("get_category_stats") as db:
         cursor = await db.execute("""
-            SELECT COUNT(*) FROM works WHERE category_id = ?
-        """, (category_id,))
+            SELECT category_id, COUNT(DISTINCT author_id), COUNT(*), COALESCE(SUM(times_sold), 0)
+            FROM works
+            GROUP BY category_id
+        """)
+        per_category = {row[0]: tuple(row[1:]) for row in await cursor.fetchall()}
+        cursor = await db.execute("SELECT COUNT(*) FROM users")
         row = await cursor.fetchone()
-        return row[0] if row else 0
+    return per_category, row[0] if row else 0
 
 # ===== Заявки на выплату =====
 async def get_payout_requests() -> list[tuple[int, int]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with reader("get_payout_requests") as db:
         cursor = await db.execute("""
             SELECT user_id, amount FROM payouts WHERE status='pending'
         """)
@@ -197,7 +284,7 @@ async def get_payout_requests() -> list[tuple[int, int]]:
 
 # ===== Получение купленных работ пользователя =====
 async def get_user_purchases(user_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with reader("get_user_purchases") as db:
         cursor = await db.execute("""
             SELECT w.id, w.title, w.price, w.author_id, u.username AS author_name, p.amount, p.status
             FROM purchases p
@@ -222,29 +309,20 @@ async def get_user_purchases(user_id: int):
 
 # ===== Получение всех пользователей =====
 async def get_all_users():
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with reader("get_all_users") as db:
         cursor = await db.execute("SELECT id, username, balance FROM users")
         users = await cursor.fetchall()
         return users
 
 async def get_total_users_count() -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with reader("get_total_users_count") as db:
         cursor = await db.execute("SELECT COUNT(*) FROM users")
         row = await cursor.fetchone()
         return row[0] if row else 0
 
-# ===== Подсчёт количества продаж по категории =====
-async def get_category_sales_count(category_id: int) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("""
-            SELECT SUM(times_sold) FROM works WHERE category_id = ?
-        """, (category_id,))
-        row = await cursor.fetchone()
-        return row[0] if row and row[0] is not None else 0
-
 # ===== Получение работ конкретного пользователя =====
 async def get_user_works(user_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with reader("get_user_works") as db:
         cursor = await db.execute("""
             SELECT id, title, status 
             FROM works 
@@ -256,50 +334,41 @@ async def get_user_works(user_id: int):
 
 # ===== Удаление работы =====
 async def delete_work(work_id: int, user_id: int) -> bool:
-    import aiosqlite
-    from config import DB_NAME
-
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with writer("delete_work") as db:
         cursor = await db.execute(
             "SELECT id FROM works WHERE id=? AND author_id=?", (work_id, user_id)
         )
         work = await cursor.fetchone()
         if not work:
             return False
-        await db.execute("DELETE FROM works WHERE id=?", (work_id,))
-        await db.commit()
+        # Логическое удаление: оплаченные покупки должны завершаться и после него
+        await db.execute("UPDATE works SET is_deleted = 1 WHERE id=?", (work_id,))
         return True
 
 
 # ===== Логическое удаление работы =====
 async def admin_delete_work(work_id: int):
-    async with aiosqlite.connect(DB_NAME) as db:
-        # Удаляем файлы работы
-        await db.execute("DELETE FROM files WHERE work_id = ?", (work_id,))
-        # Удаляем саму работу
-        await db.execute("DELETE FROM works WHERE id = ?", (work_id,))
-        await db.commit()
+    # Файлы остаются: их получат покупатели, оплатившие работу до удаления
+    async with writer("admin_delete_work") as db:
+        await db.execute("UPDATE works SET is_deleted = 1 WHERE id = ?", (work_id,))
         return True
 
 # ===== Получение подкатегорий =====
 async def get_subcategories(parent_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id, name FROM categories WHERE parent_id = ?", (parent_id,))
-        return await cursor.fetchall()
+    tree = await get_category_tree()
+    return list(tree.subcategories(parent_id))
 
 # ===== Обновление категории работы =====
 async def update_work_category(work_id: int, category_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT parent_id FROM categories WHERE id=?", (category_id,))
-        row = await cursor.fetchone()
-        if row and row[0]:  # Если есть родитель
-            await db.execute("UPDATE works SET subcategory_id=? WHERE id=?", (category_id, work_id))
-        else:
-            await db.execute("UPDATE works SET category_id=?, subcategory_id=NULL WHERE id=?", (category_id, work_id))
-        await db.commit()
+    tree = await get_category_tree()
+    category = tree.get(category_id)
+    if category and category[2]:  # Если есть родитель
+        await enqueue_write("UPDATE works SET subcategory_id=? WHERE id=?", (category_id, work_id))
+    else:
+        await enqueue_write("UPDATE works SET category_id=?, subcategory_id=NULL WHERE id=?", (category_id, work_id))
 
 #===== Публикация работы в канал =====
-async def post_work_to_channel(bot: Bot, work_info: dict, files: list[tuple]):
+async def post_work_to_channel(bot: Bot, work_info: dict, files: list[FileRef]):
     """
     Публикует работу в канал.
     work_info: {
@@ -307,7 +376,7 @@ async def post_work_to_channel(bot: Bot, work_info: dict, files: list[tuple]):
         "description": str,
         "preview_image_id": str | None
     }
-    files: [(file_id, file_name), ...] 
+    files: get_work_files(work_id)
     """
     caption = f"🔹 <b>{work_info['title']}</b>\n📄 {work_info['description']}"
 
@@ -325,8 +394,8 @@ async def post_work_to_channel(bot: Bot, work_info: dict, files: list[tuple]):
         await bot.send_message(chat_id=CHANNEL_ID, text=caption)
 
     # Отправка файлов
-    for file_id, file_name in files:
+    for file in files:
         try:
-            await bot.send_document(chat_id=CHANNEL_ID, document=file_id, caption=file_name)
+            await bot.send_document(chat_id=CHANNEL_ID, document=file.file_id, caption=file.file_name)
         except:
             pass
\ No newline at end of file
@@ -0,0 +1,44 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# config читает окружение при импорте
+os.environ.setdefault("ADMIN_IDS", "1")
+os.environ.setdefault("API_TOKEN", "1:test")
+os.environ["SLOW_QUERY_MS"] = "0"
+os.environ["DB_NAME"] = str(ROOT / "tests" / "unused.db")
+
+
+@pytest.fixture
+def run_db(tmp_path, monkeypatch):
+    """
+    Выполняет корутину на чистой базе со всеми миграциями и запущенной очередью записи:
+    run_db(lambda: some_coroutine()).
+    """
+    import database.pool as pool_module
+    import database.write_queue as write_queue_module
+    from database.migrations import run_migrations
+
+    test_pool = pool_module.ConnectionPool(str(tmp_path / "test.db"), readers=2)
+    monkeypatch.setattr(pool_module, "pool", test_pool)
+    monkeypatch.setattr(write_queue_module, "pool", test_pool)
+
+    def run(body):
+        async def main():
+            await test_pool.open()
+            write_queue_module.start_write_queue()
+            try:
+                await run_migrations()
+                return await body()
+            finally:
+                await write_queue_module.stop_write_queue()
+                await test_pool.close()
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,126 @@
+import asyncio
+
+from database.pool import reader, writer
+from database.queries import purchase_work, create_purchase, complete_purchase
+
+AUTHOR, BUYER, SERVICE = 10, 20, 99
+
+
+async def seed(balance: float, works=((1, 100.0),)):
+    async with writer() as db:
+        await db.executemany("INSERT INTO users(id, balance) VALUES(?, ?)",
+                             [(AUTHOR, 0), (BUYER, balance), (SERVICE, 0)])
+        await db.executemany(
+            "INSERT INTO works(id, title, price, author_income, author_id, status) VALUES(?, ?, ?, ?, ?, 'approved')",
+            [(work_id, f"Работа {work_id}", price, round(price * 0.7, 2), AUTHOR) for work_id, price in works],
+        )
+
+
+async def balance(user_id: int) -> float:
+    async with reader() as db:
+        cursor = await db.execute("SELECT balance FROM users WHERE id=?", (user_id,))
+        return (await cursor.fetchone())[0]
+
+
+async def scalar(sql: str, params=()):
+    async with reader() as db:
+        cursor = await db.execute(sql, params)
+        return (await cursor.fetchone())[0]
+
+
+def test_double_click_buys_once(run_db):
+    async def body():
+        await seed(500)
+        results = await asyncio.gather(*(purchase_work(BUYER, 1, SERVICE) for _ in range(5)))
+        statuses = sorted(r["status"] for r in results)
+        assert statuses == ["already_bought"] * 4 + ["ok"]
+        assert await balance(BUYER) == 400
+        assert await scalar("SELECT COUNT(*) FROM purchases WHERE buyer_id=?", (BUYER,)) == 1
+        assert await scalar("SELECT times_sold FROM works WHERE id=1") == 1
+
+    run_db(body)
+
+
+def test_concurrent_purchases_never_overdraw(run_db):
+    async def body():
+        await seed(150, works=((1, 100.0), (2, 100.0), (3, 100.0)))
+        results = await asyncio.gather(*(purchase_work(BUYER, work_id, SERVICE) for work_id in (1, 2, 3)))
+        statuses = sorted(r["status"] for r in results)
+        assert statuses == ["no_funds", "no_funds", "ok"]
+        assert await balance(BUYER) == 50
+        # Доли автора и сервиса — только за одну покупку
+        assert await balance(AUTHOR) == 70
+        assert await balance(SERVICE) == 30
+        assert await scalar("SELECT sales_count FROM author_stats WHERE author_id=?", (AUTHOR,)) == 1
+
+    run_db(body)
+
+
+def test_insufficient_balance_changes_nothing(run_db):
+    async def body():
+        await seed(99.99)
+        result = await purchase_work(BUYER, 1, SERVICE)
+        assert result["status"] == "no_funds"
+        assert result["price"] == 100
+        assert await balance(BUYER) == 99.99
+        assert await scalar("SELECT COUNT(*) FROM purchases") == 0
+        assert await scalar("SELECT COUNT(*) FROM transactions") == 0
+
+    run_db(body)
+
+
+def test_unknown_buyer_and_work(run_db):
+    async def body():
+        await seed(500)
+        assert (await purchase_work(12345, 1, SERVICE))["status"] == "no_user"
+        assert (await purchase_work(BUYER, 404, SERVICE))["status"] == "no_work"
+
+    run_db(body)
+
+
+def test_sms_payment_does_not_debit_buyer(run_db):
+    async def body():
+        await seed(0)
+        purchase_id = await create_purchase(1, BUYER, 100.0)
+        sale = await complete_purchase(purchase_id, SERVICE, proof="900: оплата 100 RUB")
+        assert sale["status"] == "ok"
+        assert not sale["work_missing"]
+        assert (sale["author_share"], sale["service_share"]) == (70, 30)
+        assert await balance(BUYER) == 0
+        assert await balance(AUTHOR) == 70
+        assert await balance(SERVICE) == 30
+        assert await scalar("SELECT status FROM purchases WHERE id=?", (purchase_id,)) == "completed"
+        assert await scalar("SELECT payment_proof FROM purchases WHERE id=?", (purchase_id,)) == "900: оплата 100 RUB"
+
+        # Повторное SMS ничего не зачисляет
+        again = await complete_purchase(purchase_id, SERVICE, proof="900: оплата 100 RUB")
+        assert again["status"] == "already_completed"
+        assert await balance(AUTHOR) == 70
+
+    run_db(body)
+
+
+def test_sms_payment_for_removed_work(run_db):
+    async def body():
+        await seed(0)
+        purchase_id = await create_purchase(1, BUYER, 100.0)
+        async with writer() as db:
+            await db.execute("DELETE FROM works WHERE id=1")
+        sale = await complete_purchase(purchase_id, SERVICE, proof="900")
+        assert sale["status"] == "ok"
+        assert sale["work_missing"]
+        assert await balance(AUTHOR) == 0
+        assert await scalar("SELECT status FROM purchases WHERE id=?", (purchase_id,)) == "completed"
+
+    run_db(body)
+
+
+def test_balance_payment_requires_funds(run_db):
+    async def body():
+        await seed(50)
+        purchase_id = await create_purchase(1, BUYER, 100.0)
+        assert (await complete_purchase(purchase_id, SERVICE))["status"] == "no_funds"
+        assert await scalar("SELECT status FROM purchases WHERE id=?", (purchase_id,)) == "pending"
+        assert (await complete_purchase("missing", SERVICE))["status"] == "not_found"
+
+    run_db(body)
@@ -0,0 +1,121 @@
+import asyncio
+from time import monotonic
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from utils.send_scheduler import SendScheduler, TokenBucket, Lane, send_lane
+
+
+def make_scheduler(global_rate: float, **kwargs) -> SendScheduler:
+    scheduler = SendScheduler(**kwargs)
+    # Общий bucket на один токен: каждая отправка ждёт 1 / global_rate секунд
+    scheduler.global_bucket = TokenBucket(global_rate, 1)
+    return scheduler
+
+
+def test_lanes_are_served_by_priority():
+    async def main():
+        scheduler = make_scheduler(global_rate=50)
+        order = []
+
+        async def send(chat_id, lane):
+            await scheduler.acquire(chat_id, lane)
+            order.append(lane)
+
+        await scheduler.acquire(1)  # забирает единственный токен
+        tasks = [asyncio.create_task(send(chat_id, lane)) for chat_id, lane in
+                 ((2, Lane.BROADCAST), (3, Lane.CHANNEL), (4, Lane.NOTIFICATION), (5, Lane.INTERACTIVE))]
+        await asyncio.gather(*tasks)
+        await scheduler.stop()
+        assert order == [Lane.INTERACTIVE, Lane.NOTIFICATION, Lane.CHANNEL, Lane.BROADCAST]
+
+    asyncio.run(main())
+
+
+def test_overdue_lane_goes_first():
+    async def main():
+        # Токен вернётся через 200 мс: к этому времени рассылка ждёт 0.2 с, ответ — 0.1 с
+        scheduler = make_scheduler(global_rate=5, max_delay=0.15)
+        order = []
+
+        async def send(chat_id, lane):
+            await scheduler.acquire(chat_id, lane)
+            order.append(lane)
+
+        await scheduler.acquire(1)
+        broadcast = asyncio.create_task(send(2, Lane.BROADCAST))
+        await asyncio.sleep(0.1)
+        interactive = asyncio.create_task(send(3, Lane.INTERACTIVE))
+        await asyncio.gather(broadcast, interactive)
+        await scheduler.stop()
+        assert order == [Lane.BROADCAST, Lane.INTERACTIVE]
+
+    asyncio.run(main())
+
+
+def test_private_interactive_replies_skip_chat_limit():
+    async def main():
+        scheduler = SendScheduler(global_rate=1000, chat_rate=20, burst=1)
+        started = monotonic()
+        for _ in range(3):
+            await scheduler.acquire(7, Lane.INTERACTIVE)
+        interactive = monotonic() - started
+
+        started = monotonic()
+        for _ in range(3):
+            await scheduler.acquire(8, Lane.NOTIFICATION)
+        notification = monotonic() - started
+        await scheduler.stop()
+        assert interactive < 0.05
+        # burst 1 и 20 сообщений/с: вторая и третья ждут по 50 мс
+        assert notification >= 0.09
+
+    asyncio.run(main())
+
+
+def test_retry_after_blocks_chat_and_retries():
+    async def main():
+        scheduler = SendScheduler(global_rate=1000, chat_rate=1000, burst=10)
+        calls = []
+
+        async def make_request(bot, method):
+            calls.append((method.text, monotonic()))
+            if len(calls) == 1:
+                raise TelegramRetryAfter(method=method, message="Flood control exceeded", retry_after=1)
+            return method.text
+
+        async def notify():
+            await asyncio.sleep(0.1)
+            with send_lane(Lane.NOTIFICATION):
+                return await scheduler(make_request, None, SendMessage(chat_id=42, text="notification"))
+
+        results = await asyncio.gather(scheduler(make_request, None, SendMessage(chat_id=42, text="reply")), notify())
+        await scheduler.stop()
+        assert results == ["reply", "notification"]
+        assert scheduler.metrics["retry_after"] == 1
+        assert sorted(text for text, _ in calls) == ["notification", "reply", "reply"]
+        # И повтор, и отправка из другой очереди в тот же чат ждут retry_after
+        first_try = calls[0][1]
+        assert all(at - first_try >= 0.95 for _, at in calls[1:])
+
+    asyncio.run(main())
+
+
+def test_retry_after_gives_up_after_max_retries():
+    async def main():
+        scheduler = SendScheduler(global_rate=1000, max_retries=1)
+        calls = 0
+
+        async def make_request(bot, method):
+            nonlocal calls
+            calls += 1
+            raise TelegramRetryAfter(method=method, message="Flood control exceeded", retry_after=0)
+
+        with pytest.raises(TelegramRetryAfter):
+            await scheduler(make_request, None, SendMessage(chat_id=42, text="x"))
+        await scheduler.stop()
+        assert calls == 2
+
+    asyncio.run(main())
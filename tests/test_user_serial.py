@@ -0,0 +1,106 @@
+import asyncio
+from types import SimpleNamespace
+
+from utils.middleware import UserSerialMiddleware
+
+
+class FakeCallback:
+    def __init__(self):
+        self.answered = 0
+
+    async def answer(self, *args, **kwargs):
+        self.answered += 1
+
+
+def update(event_type: str = "message"):
+    callback = FakeCallback() if event_type == "callback_query" else None
+    return SimpleNamespace(event_type=event_type, callback_query=callback)
+
+
+def data_for(user_id: int) -> dict:
+    return {"event_from_user": SimpleNamespace(id=user_id)}
+
+
+class GatedHandler:
+    """Хендлер, который не завершается, пока тест не откроет gate; пишет журнал событий."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.log = []
+
+    async def __call__(self, event, data):
+        name = f"{data['event_from_user'].id}:{event.event_type}"
+        self.log.append(("start", name))
+        await self.gate.wait()
+        self.log.append(("end", name))
+        return name
+
+
+def test_same_user_serialized_other_users_parallel():
+    async def main():
+        middleware = UserSerialMiddleware(limit=3)
+        handler = GatedHandler()
+        first = asyncio.create_task(middleware(handler, update("message"), data_for(1)))
+        second = asyncio.create_task(middleware(handler, update("callback_query"), data_for(1)))
+        other = asyncio.create_task(middleware(handler, update("message"), data_for(2)))
+        await asyncio.sleep(0.01)
+        # Второй апдейт пользователя 1 ждёт первый, пользователь 2 — нет
+        assert handler.log == [("start", "1:message"), ("start", "2:message")]
+        handler.gate.set()
+        assert await asyncio.gather(first, second, other) == ["1:message", "1:callback_query", "2:message"]
+        assert handler.log.index(("end", "1:message")) < handler.log.index(("start", "1:callback_query"))
+        assert middleware.metrics["waited"] == 1
+        # Слоты обработанных пользователей не остаются в памяти
+        assert middleware._slots == {}
+
+    asyncio.run(main())
+
+
+def test_updates_past_limit_are_dropped():
+    async def main():
+        middleware = UserSerialMiddleware(limit=2)
+        handler = GatedHandler()
+        running = [asyncio.create_task(middleware(handler, update("message"), data_for(1))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+
+        flood = update("callback_query")
+        assert await middleware(handler, flood, data_for(1)) is None
+        # «Часики» на кнопке убраны, хендлер не вызывался
+        assert flood.callback_query.answered == 1
+        assert middleware.metrics["dropped"] == 1
+        assert len(handler.log) == 1
+
+        handler.gate.set()
+        await asyncio.gather(*running)
+        assert [entry for entry in handler.log if entry[0] == "start"] == [("start", "1:message")] * 2
+
+    asyncio.run(main())
+
+
+def test_pre_checkout_query_is_never_dropped():
+    async def main():
+        middleware = UserSerialMiddleware(limit=1)
+        handler = GatedHandler()
+        busy = asyncio.create_task(middleware(handler, update("message"), data_for(1)))
+        await asyncio.sleep(0.01)
+
+        payment = asyncio.create_task(middleware(handler, update("pre_checkout_query"), data_for(1)))
+        assert await middleware(handler, update("message"), data_for(1)) is None
+        handler.gate.set()
+        assert await asyncio.gather(busy, payment) == ["1:message", "1:pre_checkout_query"]
+        assert middleware.metrics["dropped"] == 1
+
+    asyncio.run(main())
+
+
+def test_updates_without_user_pass_through():
+    async def main():
+        middleware = UserSerialMiddleware(limit=1)
+
+        async def plain(event, data):
+            return "ok"
+
+        assert await middleware(plain, update("channel_post"), {}) == "ok"
+        assert middleware._slots == {}
+
+    asyncio.run(main())
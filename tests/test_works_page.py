@@ -0,0 +1,73 @@
+from database.pool import writer
+from services.work_service import get_works_page, count_works
+
+CATEGORY, SUBCATEGORY, EMPTY = 1, 2, 3
+
+
+async def seed():
+    # Категория 1: работы 1–7 одобрены, 8 на модерации, 9 удалена;
+    # 10 лежит в подкатегории 2 категории 1 и должна попасть в обе выдачи один раз
+    rows = [(work_id, CATEGORY, None, "approved", 0) for work_id in range(1, 8)]
+    rows += [(8, CATEGORY, None, "pending", 0), (9, CATEGORY, None, "approved", 1), (10, CATEGORY, SUBCATEGORY, "approved", 0)]
+    async with writer() as db:
+        await db.executemany(
+            "INSERT INTO works(id, title, price, category_id, subcategory_id, status, is_deleted) VALUES(?, 'w', 10, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+async def ids(**kwargs) -> list[int]:
+    return [work.id for work in await get_works_page(**kwargs)]
+
+
+def test_forward_pages_cover_category_once(run_db):
+    async def body():
+        await seed()
+        pages, after_id = [], None
+        while True:
+            page = await ids(category_id=CATEGORY, limit=3, after_id=after_id)
+            if not page:
+                break
+            pages.append(page)
+            after_id = page[-1]
+        assert pages == [[10, 7, 6], [5, 4, 3], [2, 1]]
+        assert await count_works(CATEGORY) == 8
+
+    run_db(body)
+
+
+def test_backward_page_matches_forward_page(run_db):
+    async def body():
+        await seed()
+        second = await ids(category_id=CATEGORY, limit=3, after_id=6)
+        assert second == [5, 4, 3]
+        # «Назад» от второй страницы — снова первая, в том же порядке (новые сверху)
+        assert await ids(category_id=CATEGORY, limit=3, before_id=second[0]) == [10, 7, 6]
+        # «Назад» от первой страницы — пусто
+        assert await ids(category_id=CATEGORY, limit=3, before_id=10) == []
+
+    run_db(body)
+
+
+def test_page_boundary_on_exact_multiple(run_db):
+    async def body():
+        await seed()
+        # 8 работ по 4 на страницу: вторая страница последняя и полная
+        assert await ids(category_id=CATEGORY, limit=4) == [10, 7, 6, 5]
+        assert await ids(category_id=CATEGORY, limit=4, after_id=5) == [4, 3, 2, 1]
+        assert await ids(category_id=CATEGORY, limit=4, after_id=1) == []
+
+    run_db(body)
+
+
+def test_subcategory_and_empty_category(run_db):
+    async def body():
+        await seed()
+        assert await ids(category_id=SUBCATEGORY, limit=3) == [10]
+        assert await count_works(SUBCATEGORY) == 1
+        assert await ids(category_id=EMPTY, limit=3) == []
+        assert await ids(category_id=EMPTY, limit=3, after_id=5) == []
+        assert await ids(category_id=EMPTY, limit=3, before_id=5) == []
+        assert await count_works(EMPTY) == 0
+
+    run_db(body)
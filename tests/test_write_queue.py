@@ -0,0 +1,80 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from database.pool import reader, writer
+from database.write_queue import write_queue, enqueue_write, enqueue_write_nowait, enqueue_transaction
+
+
+async def user_ids() -> list[int]:
+    async with reader() as db:
+        cursor = await db.execute("SELECT id FROM users ORDER BY id")
+        return [row[0] for row in await cursor.fetchall()]
+
+
+def test_failed_write_does_not_roll_back_batch(run_db):
+    async def body():
+        async with writer() as db:
+            await db.execute("INSERT INTO users(id) VALUES(2)")
+        batches = write_queue.metrics["batches"]
+        results = await asyncio.gather(
+            enqueue_write("INSERT INTO users(id) VALUES(1)"),
+            enqueue_write("INSERT INTO users(id) VALUES(2)"),  # нарушает PRIMARY KEY
+            enqueue_write("INSERT INTO users(id) VALUES(3)"),
+            return_exceptions=True,
+        )
+        assert results[0] == 1 and results[2] == 1
+        assert isinstance(results[1], sqlite3.IntegrityError)
+        # Все три ушли одним коммитом
+        assert write_queue.metrics["batches"] == batches + 1
+        assert await user_ids() == [1, 2, 3]
+
+    run_db(body)
+
+
+def test_failed_transaction_rolls_back_only_itself(run_db):
+    async def body():
+        def half_done(db):
+            db.execute("INSERT INTO users(id) VALUES(10)")
+            raise ValueError("отказ посреди транзакции")
+
+        def complete(db):
+            db.execute("INSERT INTO users(id) VALUES(20)")
+            db.execute("INSERT INTO users(id) VALUES(21)")
+            return "ok"
+
+        results = await asyncio.gather(
+            enqueue_transaction(half_done, "half_done"),
+            enqueue_transaction(complete, "complete"),
+            enqueue_write("INSERT INTO users(id) VALUES(30)"),
+            return_exceptions=True,
+        )
+        assert isinstance(results[0], ValueError)
+        assert results[1:] == ["ok", 1]
+        assert await user_ids() == [20, 21, 30]
+
+    run_db(body)
+
+
+def test_nowait_writes_are_flushed_on_stop(run_db):
+    async def body():
+        for user_id in range(1, 6):
+            enqueue_write_nowait("INSERT INTO users(id) VALUES(?)", (user_id,))
+        enqueue_write_nowait("INSERT INTO users(id) VALUES(1)")  # ошибка только в логе
+        await write_queue.stop()
+        assert await user_ids() == [1, 2, 3, 4, 5]
+        assert write_queue.metrics["failed"] >= 1
+
+    run_db(body)
+
+
+def test_transaction_runs_without_queue(run_db):
+    async def body():
+        await write_queue.stop()
+        assert await enqueue_transaction(lambda db: db.execute("INSERT INTO users(id) VALUES(7)").rowcount, "direct") == 1
+        with pytest.raises(sqlite3.IntegrityError):
+            await enqueue_write("INSERT INTO users(id) VALUES(7)")
+        assert await user_ids() == [7]
+
+    run_db(body)
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Небольшой LRU-кэш с временем жизни записей.
+    get_or_load склеивает одинаковые одновременные запросы в одну загрузку.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+        self.metrics = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_load(self, key, loader):
+        """loader — корутинная функция без аргументов, вызывается только при промахе."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            self.metrics["hits"] += 1
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.metrics["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        self.metrics["misses"] += 1
+        future = asyncio.ensure_future(loader())
+        self._inflight[key] = future
+        try:
+            value = await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+        self.set(key, value)
+        return value
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from config import DELETE_BATCH_WINDOW_MS
+
+logger = logging.getLogger(__name__)
+
+# Ограничение Bot API на число id в одном deleteMessages
+DELETE_BATCH_MAX = 100
+
+
+class DeleteQueue:
+    """
+    Фоновое удаление сообщений. Всё, что накопилось за окно window,
+    группируется по чатам и удаляется вызовами deleteMessages по 100 id.
+    Хендлер только ставит id в очередь и сразу отвечает пользователю.
+    """
+
+    def __init__(self, window: float = 0.05, max_attempts: int = 3):
+        self.window = window
+        self.max_attempts = max_attempts
+        self._pending: dict[tuple[Bot, int], list[int]] = {}
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: asyncio.Task | None = None
+        self._direct: set[asyncio.Task] = set()
+        self.metrics = {"messages": 0, "calls": 0, "retries": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="delete-queue")
+
+    async def stop(self):
+        """Удаляет всё, что уже стоит в очереди, и останавливает задачу."""
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    def schedule(self, bot: Bot, chat_id: int, message_ids):
+        """Ставит сообщения в очередь на удаление. Не ждёт обращения к API."""
+        message_ids = [msg_id for msg_id in message_ids if msg_id]
+        if not message_ids:
+            return
+        if not self.running:
+            # Очередь не запущена (скрипты, тесты) — удаляем в фоне без группировки
+            task = asyncio.create_task(self._delete_chat(bot, chat_id, message_ids))
+            self._direct.add(task)
+            task.add_done_callback(self._direct.discard)
+            return
+        self._pending.setdefault((bot, chat_id), []).extend(message_ids)
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._stopping:
+                await asyncio.sleep(self.window)
+            batch, self._pending = self._pending, {}
+            if batch:
+                await asyncio.gather(*(
+                    self._delete_chat(bot, chat_id, ids) for (bot, chat_id), ids in batch.items()
+                ))
+            if self._stopping and not self._pending:
+                break
+
+    async def _delete_chat(self, bot: Bot, chat_id: int, message_ids: list[int]):
+        ids = sorted(set(message_ids))
+        for start in range(0, len(ids), DELETE_BATCH_MAX):
+            chunk = ids[start:start + DELETE_BATCH_MAX]
+            for attempt in range(self.max_attempts):
+                try:
+                    await bot.delete_messages(chat_id=chat_id, message_ids=chunk)
+                    self.metrics["calls"] += 1
+                    self.metrics["messages"] += len(chunk)
+                    break
+                except TelegramRetryAfter as e:
+                    self.metrics["retries"] += 1
+                    await asyncio.sleep(e.retry_after)
+                except TelegramBadRequest as e:
+                    # Сообщения уже удалены или старше 48 часов — повторять бессмысленно
+                    logger.debug(f"Не удалось удалить сообщения в чате {chat_id}: {e}")
+                    self.metrics["failed"] += len(chunk)
+                    break
+                except Exception as e:
+                    logger.warning(f"⚠️ Ошибка удаления сообщений в чате {chat_id}: {e}")
+                    self.metrics["failed"] += len(chunk)
+                    break
+            else:
+                self.metrics["failed"] += len(chunk)
+
+
+# ===== Глобальная очередь процесса =====
+delete_queue = DeleteQueue(DELETE_BATCH_WINDOW_MS / 1000)
+
+def start_delete_queue():
+    delete_queue.start()
+
+async def stop_delete_queue():
+    await delete_queue.stop()
+
+def enqueue_delete(bot: Bot, chat_id: int, message_ids):
+    delete_queue.schedule(bot, chat_id, message_ids)
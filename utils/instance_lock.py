@@ -0,0 +1,31 @@
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def lock_instance(db_path: str):
+    """
+    Не даёт запустить второй экземпляр бота на той же базе.
+    Кэш FSM (SQLiteStorage) и очередь апдейтов пользователя (UserSerialMiddleware)
+    живут в памяти процесса: два экземпляра за балансировщиком отдают устаревшие
+    состояния и обрабатывают апдейты одного пользователя параллельно.
+    Масштабирование — только через BOT_PROCESSES: супервизор раздаёт апдейты
+    воркерам по id пользователя.
+    Возвращает открытый файл блокировки (его держат до выхода процесса)
+    или None, если база уже занята.
+    """
+    handle = open(f"{db_path}.lock", "w")
+    if fcntl is None:
+        logger.warning("⚠️ Проверка второго экземпляра недоступна на этой платформе")
+        return handle
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        return None
+    return handle
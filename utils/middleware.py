@@ -1,7 +1,16 @@
+import asyncio
+import logging
+
 from aiogram import BaseMiddleware
-from aiogram.types import Message, CallbackQuery
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.types import Message, CallbackQuery, Update
+from config import USER_QUEUE_LIMIT
 from utils.subscription import check_subscription, get_subscribe_keyboard
 
+logger = logging.getLogger(__name__)
+
 class SubscriptionMiddleware(BaseMiddleware):
     """
     Middleware блокирует неподписанных пользователей.
@@ -17,7 +26,9 @@ class SubscriptionMiddleware(BaseMiddleware):
             user_id = event.from_user.id
 
         if user_id is not None:
-            subscribed = await check_subscription(user_id, bot)
+            # «Я подписан» проверяется заново, минуя кэшированный отказ
+            force = isinstance(event, CallbackQuery) and event.data == "subscribed"
+            subscribed = await check_subscription(user_id, bot, force=force)
             if not subscribed:
                 text = "❌ Чтобы пользоваться ботом, подпишитесь на канал!"
                 keyboard = get_subscribe_keyboard()
@@ -29,3 +40,142 @@ class SubscriptionMiddleware(BaseMiddleware):
                 return  # блокируем дальнейшую обработку
 
         return await handler(event, data)
+
+
+class BufferedFSMContext(FSMContext):
+    """
+    FSMContext с буфером на одно событие: данные читаются из хранилища один раз,
+    изменения копятся в памяти и записываются в flush() после хендлера.
+    """
+
+    _UNSET = object()
+
+    def __init__(self, storage: BaseStorage, key: StorageKey, raw_state=_UNSET):
+        super().__init__(storage, key)
+        self._state = raw_state
+        self._data: dict | None = None
+        self._state_changed = False
+        self._data_changed = False
+
+    async def view(self) -> dict:
+        """Изменяемые данные FSM без копирования; будут сохранены после хендлера."""
+        if self._data is None:
+            self._data = await self.storage.get_data(key=self.key)
+        self._data_changed = True
+        return self._data
+
+    async def get_state(self) -> str | None:
+        if self._state is self._UNSET:
+            self._state = await self.storage.get_state(key=self.key)
+        return self._state
+
+    async def set_state(self, state: StateType = None) -> None:
+        self._state = state.state if isinstance(state, State) else state
+        self._state_changed = True
+
+    async def get_data(self) -> dict:
+        if self._data is None:
+            self._data = await self.storage.get_data(key=self.key)
+        return dict(self._data)
+
+    async def set_data(self, data) -> None:
+        self._data = dict(data)
+        self._data_changed = True
+
+    async def get_value(self, key: str, default=None):
+        return (await self.get_data()).get(key, default)
+
+    async def update_data(self, data=None, **kwargs) -> dict:
+        buffer = await self.view()
+        if data:
+            buffer.update(data)
+        buffer.update(kwargs)
+        return dict(buffer)
+
+    async def flush(self):
+        if self._state_changed:
+            await self.storage.set_state(key=self.key, state=self._state)
+            self._state_changed = False
+        if self._data_changed:
+            await self.storage.set_data(key=self.key, data=self._data)
+            self._data_changed = False
+
+
+class FSMBufferMiddleware(BaseMiddleware):
+    """
+    Подменяет state на BufferedFSMContext: одно чтение данных FSM на апдейт
+    и одна запись изменений после хендлера. Регистрируется на dp.update
+    после встроенного FSM middleware.
+    """
+
+    async def __call__(self, handler, event, data):
+        state = data.get("state")
+        if state is None:
+            return await handler(event, data)
+        buffered = BufferedFSMContext(state.storage, state.key, data.get("raw_state"))
+        data["state"] = buffered
+        try:
+            return await handler(event, data)
+        finally:
+            await buffered.flush()
+
+
+class _UserSlot:
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class UserSerialMiddleware(BaseMiddleware):
+    """
+    Апдейты одного пользователя обрабатываются по очереди, разных — параллельно.
+    У пользователя не больше limit апдейтов в работе и ожидании, лишние
+    (двойные нажатия, флуд) отбрасываются. Слот пользователя удаляется,
+    как только его апдейты обработаны. Регистрируется на dp.update
+    до FSMBufferMiddleware, чтобы данные FSM читались уже под замком.
+    """
+
+    # Платёж нельзя потерять: pre_checkout_query ждёт, даже если очередь полна
+    NEVER_DROP = {"pre_checkout_query"}
+
+    def __init__(self, limit: int = 3):
+        self.limit = limit
+        self._slots: dict[int, _UserSlot] = {}
+        self.metrics = {"waited": 0, "dropped": 0, "max_users": 0}
+
+    async def __call__(self, handler, event: Update, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        slot = self._slots.get(user.id)
+        if slot is None:
+            slot = self._slots[user.id] = _UserSlot()
+            self.metrics["max_users"] = max(self.metrics["max_users"], len(self._slots))
+        elif slot.pending >= self.limit and event.event_type not in self.NEVER_DROP:
+            self.metrics["dropped"] += 1
+            if event.callback_query is not None:
+                # Убираем «часики» на кнопке
+                await event.callback_query.answer()
+            return None
+
+        slot.pending += 1
+        if slot.lock.locked():
+            self.metrics["waited"] += 1
+        try:
+            async with slot.lock:
+                state = data.get("state")
+                if state is not None:
+                    # Состояние прочитано до замка — предыдущий апдейт мог его сменить
+                    data["raw_state"] = await state.get_state()
+                return await handler(event, data)
+        finally:
+            slot.pending -= 1
+            if slot.pending == 0:
+                del self._slots[user.id]
+
+
+# ===== Глобальная очередь апдейтов пользователей =====
+user_serial = UserSerialMiddleware(USER_QUEUE_LIMIT)
@@ -0,0 +1,278 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from time import monotonic
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import (
+    CHANNEL_ID,
+    NEWS_CHANNEL,
+    SEND_GLOBAL_RATE,
+    SEND_CHAT_RATE,
+    SEND_GROUP_RATE,
+    SEND_BURST,
+    SEND_MAX_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Lane(IntEnum):
+    """Очереди отправки по убыванию приоритета."""
+    INTERACTIVE = 0   # ответы пользователю на его действие
+    NOTIFICATION = 1  # уведомления другим пользователям
+    CHANNEL = 2       # публикации в канал
+    BROADCAST = 3     # массовые рассылки
+
+
+_current_lane: ContextVar[Lane] = ContextVar("send_lane", default=Lane.INTERACTIVE)
+
+@contextmanager
+def send_lane(lane: Lane):
+    """Отправки внутри блока идут в очередь lane."""
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity; rate <= 0 — без ограничения."""
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float, cost: int = 1) -> float:
+        """Сколько секунд ждать, пока можно будет взять cost токенов."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        cost = min(cost, self.capacity)
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def take(self, cost: int = 1):
+        if self.rate > 0:
+            self.tokens -= min(cost, self.capacity)
+
+    def block(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+
+    def idle(self, now: float) -> bool:
+        return now >= self.blocked_until and (self.rate <= 0 or self.wait_time(now, self.capacity) == 0)
+
+
+class _Pending:
+    __slots__ = ("chat_key", "cost", "future", "queued_at")
+
+    def __init__(self, chat_key, cost: int, future: asyncio.Future):
+        self.chat_key = chat_key
+        self.cost = cost
+        self.future = future
+        self.queued_at = monotonic()
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """
+    Middleware сессии Bot: отправка сообщений с учётом лимитов Telegram.
+    Общий token bucket (global_rate сообщений/с) и свой на каждый чат
+    (chat_rate/с для личных, group_rate/мин для групп и каналов).
+    Свободный общий токен достаётся самой приоритетной очереди, чей чат
+    не упёрся в свой лимит; очередь, ждущая дольше max_delay, обслуживается
+    первой, чтобы уведомления не голодали. Ответы INTERACTIVE в личный чат
+    ограничены только общим лимитом: их темп задаёт сам пользователь, а альбом
+    страницы каталога не должен задерживать клавиатуру под ним. RetryAfter
+    блокирует чат на retry_after секунд (для всех очередей), после чего
+    отправка повторяется.
+    """
+
+    # Методы, которые Telegram считает сообщениями
+    SEND_PREFIXES = ("send", "copyMessage", "forwardMessage")
+    NOT_MESSAGES = {"sendChatAction"}
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, group_rate: float = 20,
+                 burst: int = 3, max_retries: int = 3, max_delay: float = 5.0, max_chats: int = 10_000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate / 60
+        self.burst = burst
+        self.max_retries = max_retries
+        self.max_delay = max_delay
+        self.max_chats = max_chats
+        self.channels = {str(chat) for chat in (CHANNEL_ID, NEWS_CHANNEL) if chat}
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._lanes: dict[Lane, deque[_Pending]] = {lane: deque() for lane in Lane}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.metrics = {
+            "retry_after": 0,
+            "lanes": {lane.name.lower(): {"sent": 0, "wait": 0.0, "max_depth": 0} for lane in Lane},
+        }
+
+    # ===== Middleware =====
+    async def __call__(self, make_request, bot, method):
+        name = getattr(method, "__api_method__", "")
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not name.startswith(self.SEND_PREFIXES) or name in self.NOT_MESSAGES:
+            return await make_request(bot, method)
+
+        lane = self.lane_for(chat_id)
+        # Альбом Telegram считает несколькими сообщениями
+        cost = len(getattr(method, "media", None) or ()) or 1
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(chat_id, lane, cost)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.metrics["retry_after"] += 1
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"⚠️ Flood control в чате {chat_id}: ждём {e.retry_after} с")
+                self._bucket(chat_id).block(monotonic() + e.retry_after)
+
+    def lane_for(self, chat_id) -> Lane:
+        if str(chat_id) in self.channels or str(chat_id).startswith("@"):
+            return Lane.CHANNEL
+        return _current_lane.get()
+
+    # ===== Очереди =====
+    async def acquire(self, chat_id, lane: Lane = Lane.INTERACTIVE, cost: int = 1):
+        """Ждёт, пока лимиты позволят отправить cost сообщений в chat_id."""
+        future = asyncio.get_running_loop().create_future()
+        queue = self._lanes[lane]
+        queue.append(_Pending(chat_id, cost, future))
+        stats = self.metrics["lanes"][lane.name.lower()]
+        stats["max_depth"] = max(stats["max_depth"], len(queue))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="send-scheduler")
+        self._wakeup.set()
+        await future
+
+    @staticmethod
+    def _private(chat_id) -> bool:
+        return isinstance(chat_id, int) and chat_id > 0
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                self._prune()
+            bucket = TokenBucket(self.chat_rate if self._private(chat_id) else self.group_rate, self.burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self):
+        # Полный незаблокированный bucket ничем не отличается от нового
+        now = monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle(now)]:
+            del self._chats[chat_id]
+
+    def _grant(self) -> float | None:
+        """Выдаёт разрешения ожидающим; возвращает, через сколько секунд проверить снова."""
+        now = monotonic()
+        wait = None
+        overdue = [lane for lane, queue in self._lanes.items() if queue and now - queue[0].queued_at > self.max_delay]
+        for lane in overdue + [lane for lane in Lane if lane not in overdue]:
+            queue = self._lanes[lane]
+            stats = self.metrics["lanes"][lane.name.lower()]
+            interactive = lane == Lane.INTERACTIVE
+            blocked = deque()
+            while queue:
+                pending = queue.popleft()
+                if pending.future.done():  # отправитель отменён
+                    continue
+                global_wait = self.global_bucket.wait_time(now, pending.cost)
+                if global_wait > 0:
+                    # Общий лимит исчерпан: остальные ждут в порядке приоритета
+                    queue.appendleft(pending)
+                    queue.extendleft(reversed(blocked))
+                    return global_wait if wait is None else min(wait, global_wait)
+                if interactive and self._private(pending.chat_key):
+                    # Только блокировка после RetryAfter, без лимита чата
+                    bucket = self._chats.get(pending.chat_key)
+                    chat_wait = max(0.0, bucket.blocked_until - now) if bucket is not None else 0.0
+                    bucket = None
+                else:
+                    bucket = self._bucket(pending.chat_key)
+                    chat_wait = bucket.wait_time(now, pending.cost)
+                if chat_wait > 0:
+                    blocked.append(pending)
+                    wait = chat_wait if wait is None else min(wait, chat_wait)
+                    continue
+                self.global_bucket.take(pending.cost)
+                if bucket is not None:
+                    bucket.take(pending.cost)
+                stats["sent"] += 1
+                stats["wait"] += now - pending.queued_at
+                pending.future.set_result(None)
+            queue.extend(blocked)
+        return wait
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            wait = self._grant()
+            if wait is None:  # очереди пусты
+                await self._wakeup.wait()
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self._lanes.values())
+
+    def stats(self) -> dict:
+        lanes = {}
+        for lane in Lane:
+            s = self.metrics["lanes"][lane.name.lower()]
+            lanes[lane.name.lower()] = {
+                "depth": len(self._lanes[lane]),
+                "max_depth": s["max_depth"],
+                "sent": s["sent"],
+                "avg_wait_ms": round(s["wait"] / s["sent"] * 1000, 2) if s["sent"] else 0.0,
+            }
+        return {"lanes": lanes, "retry_after": self.metrics["retry_after"], "chats": len(self._chats)}
+
+    async def stop(self, timeout: float = 10):
+        """Дожидается отправки очереди (не дольше timeout) и останавливает планировщик."""
+        deadline = monotonic() + timeout
+        while self.depth() and monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Не дождавшиеся очереди отправляются без ограничений, чтобы не зависнуть
+        for queue in self._lanes.values():
+            while queue:
+                pending = queue.popleft()
+                if not pending.future.done():
+                    pending.future.set_result(None)
+
+
+# ===== Глобальный планировщик процесса =====
+send_scheduler = SendScheduler(SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_GROUP_RATE, SEND_BURST, SEND_MAX_RETRIES)
+
+async def stop_send_scheduler():
+    await send_scheduler.stop()
@@ -1,18 +1,128 @@
+import asyncio
+import logging
+import time
+
 from aiogram import Bot
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from config import CHANNEL_ID
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ChatMember
+from config import CHANNEL_ID, SUBSCRIPTION_TTL, SUBSCRIPTION_NEGATIVE_TTL, SUBSCRIPTION_GRACE
+from database.pool import reader
+from database.write_queue import enqueue_write_nowait
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBED_STATUSES = {"member", "administrator", "creator"}
 
 
-async def check_subscription(user_id: int, bot: Bot) -> bool:
+def is_member(member: ChatMember) -> bool:
+    return member.status in SUBSCRIBED_STATUSES or (member.status == "restricted" and getattr(member, "is_member", False))
+
+
+def is_subscription_channel(chat) -> bool:
+    """Чат — это канал CHANNEL_ID (в конфиге он может быть @username или числовым id)."""
+    if not CHANNEL_ID:
+        return False
+    return str(chat.id) == str(CHANNEL_ID) or (chat.username is not None and chat.username == CHANNEL_ID.lstrip("@"))
+
+
+class SubscriptionCache:
     """
-    Проверяет, подписан ли пользователь на канал.
+    Кэш проверок подписки на канал.
+    Подписка помнится positive_ttl секунд, отсутствие подписки — negative_ttl.
+    Результаты сохраняются в users.is_subscribed: после перезапуска подписанные
+    пользователи проходят без запроса к API. Апдейты chat_member канала
+    обновляют кэш сразу. Если Telegram отвечает ошибкой, пользователь
+    без известного статуса пропускается на grace секунд.
     """
-    try:
-        member = await bot.get_chat_member(chat_id=CHANNEL_ID, user_id=user_id)
-        return member.status in ["member", "administrator", "creator"]
-    except Exception:
+
+    def __init__(self, positive_ttl: float = 600, negative_ttl: float = 30, grace: float = 300,
+                 max_entries: int = 100_000):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.grace = grace
+        self.max_entries = max_entries
+        # user_id -> (подписан, когда истекает)
+        self._entries: dict[int, tuple[bool, float]] = {}
+        self._checks: dict[int, asyncio.Task] = {}
+        self.metrics = {"hits": 0, "db": 0, "api": 0, "errors": 0, "fail_open": 0, "updates": 0}
+
+    async def is_subscribed(self, user_id: int, bot: Bot, force: bool = False) -> bool:
+        entry = self._entries.get(user_id)
+        if entry is not None and not force and entry[1] > time.monotonic():
+            self.metrics["hits"] += 1
+            return entry[0]
+        # Параллельные апдейты одного пользователя ждут одну проверку
+        task = self._checks.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._resolve(user_id, bot, load=entry is None and not force))
+            self._checks[user_id] = task
+            task.add_done_callback(lambda _: self._checks.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def _resolve(self, user_id: int, bot: Bot, load: bool) -> bool:
+        if load and await self._load(user_id):
+            return True
+        return await self._check(user_id, bot)
+
+    async def _load(self, user_id: int) -> bool:
+        """Подписка из users.is_subscribed; отсутствие подписки всегда перепроверяется."""
+        self.metrics["db"] += 1
+        async with reader("load_subscription") as db:
+            cursor = await db.execute("SELECT is_subscribed FROM users WHERE id = ?", (user_id,))
+            row = await cursor.fetchone()
+        if row and row[0]:
+            self._remember(user_id, True)
+            return True
         return False
 
+    async def _check(self, user_id: int, bot: Bot) -> bool:
+        previous = self._entries.get(user_id)
+        self.metrics["api"] += 1
+        try:
+            member = await bot.get_chat_member(chat_id=CHANNEL_ID, user_id=user_id)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.warning(f"⚠️ Не удалось проверить подписку {user_id}: {e}")
+            if previous is not None:
+                # Последний известный статус продлеваем на время сбоя
+                self._entries[user_id] = (previous[0], time.monotonic() + self.grace)
+                return previous[0]
+            self.metrics["fail_open"] += 1
+            self._entries[user_id] = (True, time.monotonic() + self.grace)
+            return True
+        subscribed = is_member(member)
+        self.set(user_id, subscribed, persist=previous is None or previous[0] != subscribed)
+        return subscribed
+
+    def set(self, user_id: int, subscribed: bool, persist: bool = True):
+        """Запоминает статус (из API или апдейта chat_member) и сохраняет его в users в фоне."""
+        self._remember(user_id, subscribed)
+        if persist:
+            enqueue_write_nowait("UPDATE users SET is_subscribed = ? WHERE id = ?", (int(subscribed), user_id))
+
+    def _remember(self, user_id: int, subscribed: bool):
+        ttl = self.positive_ttl if subscribed else self.negative_ttl
+        if len(self._entries) >= self.max_entries and user_id not in self._entries:
+            self._prune()
+        self._entries[user_id] = (subscribed, time.monotonic() + ttl)
+
+    def _prune(self):
+        now = time.monotonic()
+        self._entries = {user_id: entry for user_id, entry in self._entries.items() if entry[1] > now}
+        # Все записи свежие — убираем самые старые
+        while len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+
+subscription_cache = SubscriptionCache(SUBSCRIPTION_TTL, SUBSCRIPTION_NEGATIVE_TTL, SUBSCRIPTION_GRACE)
+
+
+async def check_subscription(user_id: int, bot: Bot, force: bool = False) -> bool:
+    """
+    Проверяет, подписан ли пользователь на канал (через кэш).
+    force=True идёт в API, минуя кэш.
+    """
+    return await subscription_cache.is_subscribed(user_id, bot, force)
+
 
 def get_subscribe_keyboard() -> InlineKeyboardMarkup:
     """
@@ -0,0 +1,239 @@
+import asyncio
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз подряд перезапускать упавший воркер, прежде чем сдаться
+MAX_RESTARTS = 5
+
+
+def update_user_id(update: dict) -> int:
+    """id пользователя (или чата), от которого пришёл апдейт; 0, если его нет."""
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+    return 0
+
+
+class ShardRouter:
+    """
+    Раскладывает сырые апдейты по очередям воркеров по from_user.id:
+    апдейты одного пользователя всегда попадают в один процесс и идут по порядку.
+    """
+
+    def __init__(self, queues: list):
+        self.queues = queues
+        self.metrics = {"routed": [0] * len(queues), "full": 0}
+
+    def shard(self, update: dict) -> int:
+        return abs(update_user_id(update)) % len(self.queues)
+
+    async def route(self, update: dict):
+        shard = self.shard(update)
+        while True:
+            try:
+                self.queues[shard].put_nowait(update)
+                break
+            except queue.Full:
+                # Воркер не успевает — притормаживаем приём
+                self.metrics["full"] += 1
+                await asyncio.sleep(0.01)
+        self.metrics["routed"][shard] += 1
+
+
+# ===== Воркер =====
+def worker_main(index: int, count: int, updates):
+    # Ctrl+C получает вся группа процессов; воркер останавливает супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format=f"[worker {index}] %(levelname)s:%(name)s:%(message)s", force=True)
+    asyncio.run(_worker(index, count, updates))
+
+async def _worker(index: int, count: int, updates):
+    from bot import create_bot, create_dispatcher, on_startup, on_shutdown
+    from services.broadcast import resume_broadcasts
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    await on_startup()
+    # Каждая рассылка продолжается ровно одним воркером — тем, что её вёл
+    # (в том числе после его перезапуска), иначе сообщения уйдут по несколько раз
+    await resume_broadcasts(bot, index, count)
+
+    async def process(update: dict):
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            logger.exception(f"❌ Ошибка обработки апдейта {update.get('update_id')}: {e}")
+
+    loop = asyncio.get_running_loop()
+    tasks: set[asyncio.Task] = set()
+    try:
+        while True:
+            update = await loop.run_in_executor(None, updates.get)
+            if update is None:
+                break
+            task = asyncio.create_task(process(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await on_shutdown(bot, dp)
+
+
+# ===== Приём апдейтов =====
+async def poll_updates(bot, allowed_updates: list[str], route, stop: asyncio.Event):
+    """
+    Long polling без разбора апдейтов в модели aiogram: JSON сразу уходит воркеру.
+    """
+    url = bot.session.api.api_url(bot.token, "getUpdates")
+    offset = None
+    async with aiohttp.ClientSession() as http:
+        try:
+            while not stop.is_set():
+                # Параметры формой, как их отправляет aiogram
+                payload = {"timeout": "30", "allowed_updates": json.dumps(allowed_updates)}
+                if offset is not None:
+                    payload["offset"] = str(offset)
+                try:
+                    async with http.post(url, data=payload, timeout=aiohttp.ClientTimeout(total=40)) as response:
+                        data = await response.json()
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    logger.error(f"❌ Ошибка getUpdates: {e}")
+                    await asyncio.sleep(5)
+                    continue
+                if not data.get("ok"):
+                    retry_after = (data.get("parameters") or {}).get("retry_after", 5)
+                    logger.error(f"❌ getUpdates: {data.get('description')}")
+                    await asyncio.sleep(retry_after)
+                    continue
+                for update in data["result"]:
+                    await route(update)
+                    offset = update["update_id"] + 1
+        finally:
+            # И при отмене долгого запроса подтверждаем разосланное,
+            # чтобы после перезапуска оно не пришло снова
+            if offset is not None:
+                try:
+                    async with http.post(url, data={"offset": str(offset), "timeout": "0", "limit": "1"},
+                                         timeout=aiohttp.ClientTimeout(total=5)):
+                        pass
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning(f"⚠️ Не удалось подтвердить offset {offset}: {e}")
+
+
+# ===== Супервизор =====
+async def run_supervisor(processes: int):
+    from bot import create_bot, create_dispatcher, wait_for_stop_signal
+    from config import (
+        BOT_MODE, SEND_GLOBAL_RATE, SEND_GROUP_RATE, SHARD_QUEUE_SIZE,
+        WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_QUEUE_SIZE,
+        WEBHOOK_MAX_CONNECTIONS,
+    )
+    from database.db import init_db
+    from database.pool import init_pool, close_pool
+    from utils.webhook import WebhookServer
+
+    # Миграции — один раз до старта воркеров, чтобы процессы не применяли их наперегонки
+    await init_pool()
+    await init_db()
+    await close_pool()
+
+    # Общие лимиты Telegram делятся между процессами; лимиты чатов — нет: чат живёт в одном процессе
+    os.environ["SEND_GLOBAL_RATE"] = str(SEND_GLOBAL_RATE / processes)
+    os.environ["SEND_GROUP_RATE"] = str(SEND_GROUP_RATE / processes)
+
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(processes)]
+
+    def spawn(index: int):
+        process = ctx.Process(target=worker_main, args=(index, processes, queues[index]), name=f"bot-worker-{index}")
+        process.start()
+        return process
+
+    workers = [spawn(i) for i in range(processes)]
+    restarts = [0] * processes
+    router = ShardRouter(queues)
+    logger.info(f"🧩 Супервизор: {processes} воркеров, приём: {BOT_MODE}")
+
+    stop = asyncio.Event()
+
+    async def watch_workers():
+        while not stop.is_set():
+            await asyncio.sleep(1)
+            for i, process in enumerate(workers):
+                if process.is_alive() or stop.is_set():
+                    continue
+                if restarts[i] >= MAX_RESTARTS:
+                    logger.error(f"❌ Воркер {i} падает постоянно, останавливаемся")
+                    stop.set()
+                    break
+                restarts[i] += 1
+                logger.error(f"❌ Воркер {i} завершился с кодом {process.exitcode}, перезапуск")
+                workers[i] = spawn(i)
+
+    async def wait_stop():
+        await wait_for_stop_signal()
+        stop.set()
+
+    bot = create_bot()
+    allowed_updates = create_dispatcher().resolve_used_update_types()
+    server = None
+    background = [asyncio.create_task(watch_workers()), asyncio.create_task(wait_stop())]
+    try:
+        if BOT_MODE == "webhook":
+            # Один «воркер» вебхука только раскладывает апдейты по процессам
+            server = WebhookServer(bot, None, WEBHOOK_PATH, WEBHOOK_SECRET, workers=1,
+                                   queue_size=WEBHOOK_QUEUE_SIZE, feed=router.route)
+            await server.start(WEBHOOK_HOST, WEBHOOK_PORT)
+            if WEBHOOK_URL:
+                await bot.set_webhook(WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                                      allowed_updates=allowed_updates, max_connections=WEBHOOK_MAX_CONNECTIONS)
+            await stop.wait()
+        else:
+            await bot.delete_webhook()
+            poller = asyncio.create_task(poll_updates(bot, allowed_updates, router.route, stop))
+            await stop.wait()
+            # Долгий getUpdates не ждём: offset подтверждается в finally poll_updates
+            poller.cancel()
+            await asyncio.gather(poller, return_exceptions=True)
+    finally:
+        stop.set()
+        for task in background:
+            task.cancel()
+        if server is not None:
+            await server.stop()
+        logger.info(f"⏳ Остановка воркеров, разослано апдейтов: {router.metrics['routed']}")
+        loop = asyncio.get_running_loop()
+        for q, process in zip(queues, workers):
+            try:
+                q.put_nowait(None)
+            except queue.Full:
+                # Живой воркер освободит место; у упавшего очередь так и останется полной
+                if process.is_alive():
+                    try:
+                        await loop.run_in_executor(None, functools.partial(q.put, None, timeout=60))
+                    except queue.Full:
+                        pass
+        for q, process in zip(queues, workers):
+            await loop.run_in_executor(None, process.join, 60)
+            if process.is_alive():
+                logger.warning(f"⚠️ {process.name} не остановился, завершаем принудительно")
+                process.terminate()
+            # Непрочитанные апдейты не держат выход супервизора
+            q.cancel_join_thread()
+        await bot.session.close()
+        logger.info("🛑 Супервизор остановлен.")
@@ -0,0 +1,97 @@
+import asyncio
+import hmac
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Приём апдейтов по вебхуку.
+    HTTP-хендлер проверяет секрет, кладёт апдейт в ограниченную очередь
+    и сразу отвечает 200; апдейты обрабатывают workers воркеров.
+    Если очередь заполнена, отвечаем 503 — Telegram повторит доставку позже.
+    При остановке новые запросы не принимаются, а очередь дообрабатывается.
+    feed заменяет обработку апдейта (супервизор передаёт апдейт воркеру).
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher | None, path: str = "/webhook", secret: str | None = None,
+                 workers: int = 8, queue_size: int = 1000, feed=None):
+        self.bot = bot
+        self.dp = dp
+        self.feed = feed or (lambda update: dp.feed_raw_update(bot, update))
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=queue_size)
+        self._runner: web.AppRunner | None = None
+        self._workers: list[asyncio.Task] = []
+        self.metrics = {"received": 0, "processed": 0, "rejected": 0, "errors": 0, "max_depth": 0}
+
+        self.app = web.Application()
+        self.app.router.add_post(path, self.handle)
+        self.app.router.add_get("/health", self.health)
+
+    # ===== HTTP =====
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.metrics["rejected"] += 1
+            return web.Response(status=503)
+        self.metrics["received"] += 1
+        self.metrics["max_depth"] = max(self.metrics["max_depth"], self.queue.qsize())
+        return web.Response()
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"queue": self.queue.qsize(), **self.metrics})
+
+    # ===== Воркеры =====
+    async def _worker(self):
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.feed(update)
+                self.metrics["processed"] += 1
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.exception(f"❌ Ошибка обработки апдейта {update.get('update_id')}: {e}")
+            finally:
+                self.queue.task_done()
+
+    # ===== Запуск / остановка =====
+    async def start(self, host: str, port: int) -> int:
+        """Запускает воркеры и HTTP-сервер; возвращает фактический порт."""
+        self._workers = [asyncio.create_task(self._worker(), name=f"webhook-worker-{i}") for i in range(self.workers)]
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"🌐 Вебхук слушает {host}:{port}{self.path}, воркеров: {self.workers}")
+        return port
+
+    async def stop(self, timeout: float = 30):
+        """Перестаёт принимать запросы, дообрабатывает очередь (не дольше timeout) и гасит воркеры."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Не обработано апдейтов при остановке: {self.queue.qsize()}")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []